@@ -0,0 +1,4 @@
+"""Benchmarks for slipbox builds on synthetic slipboxes.
+
+Run `python -m benchmarks --help` for options.
+"""
@@ -0,0 +1,111 @@
+"""Run benchmarks and print results as JSON."""
+
+from argparse import ArgumentParser
+from dataclasses import asdict
+import json
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import time
+import typing as t
+
+from slipbox.cache import pandoc_version
+from slipbox.utils import temporary_directory
+
+from .suite import BENCHMARKS, run_benchmarks
+from .synthetic import Parameters, RENDERERS, create_slipbox
+
+
+def parse_args(argv: t.Optional[t.Sequence[str]] = None) -> t.Dict[str, t.Any]:
+    """Returns dict of command-line options."""
+    default = Parameters()
+    parser = ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark build phases on a synthetic slipbox.",
+    )
+    for field, value in asdict(default).items():
+        if field == "formats":
+            continue
+        parser.add_argument(
+            f"--{field.replace('_', '-')}",
+            type=int,
+            default=value,
+            dest=field,
+            help=f"(default: {value})",
+        )
+    parser.add_argument(
+        "--formats",
+        default=",".join(default.formats),
+        help="comma-separated note formats used in turns by note files "
+        f"({', '.join(RENDERERS)}; default: {','.join(default.formats)})",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of runs of each benchmark (default: 3)",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        default=list(BENCHMARKS),
+        metavar="NAME",
+        help="benchmarks to run (default: all)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="save results in JSON file instead of printing them",
+    )
+    return vars(parser.parse_args(argv))
+
+
+def git_commit() -> t.Optional[str]:
+    """Return current commit of the slipbox repo, if there is one."""
+    proc = subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        cwd=Path(__file__).parent,
+        check=False,
+        capture_output=True,
+        text=True,
+    )
+    return proc.stdout.strip() or None
+
+
+def main(argv: t.Optional[t.Sequence[str]] = None) -> None:
+    """Entrypoint."""
+    args = parse_args(argv)
+    fields = set(asdict(Parameters()))
+    params = Parameters(**{
+        key: value for key, value in args.items() if key in fields
+    })
+    params.formats = tuple(args["formats"].split(","))
+
+    with temporary_directory() as root:
+        app = create_slipbox(root, params)
+        try:
+            results = run_benchmarks(app, args["only"], args["repeat"])
+        finally:
+            app.cleanup()
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "pandoc": pandoc_version(app.config.pandoc).split("\n", 1)[0],
+        "parameters": asdict(params),
+        "repeat": args["repeat"],
+        "results": results,
+    }
+    text = json.dumps(report, indent=2) + "\n"
+    if args["output"] is None:
+        sys.stdout.write(text)
+    else:
+        args["output"].write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Benchmarks of build phases."""
+
+from contextlib import ExitStack
+import shutil
+import statistics
+import time
+import typing as t
+
+from slipbox.app import App
+from slipbox.batch import group_by_file_extension
+from slipbox.build import delete_notes, find_notes, find_outdated_notes
+from slipbox.cache import cache_directory
+from slipbox.data import process_csvs
+from slipbox.database import refresh_views
+from slipbox.generator import CytoscapeDataGenerator
+from slipbox.graph import create_note_graph
+from slipbox.objects import objects_directory
+from slipbox.page import generate_index
+from slipbox.processor import process_batch, scan_batch
+from slipbox.utils import temporary_directory
+
+
+# Prepares a run of a benchmark and returns the function to be timed.
+Setup = t.Callable[[App, ExitStack], t.Callable[[], t.Any]]
+
+
+def clear_notes(app: App) -> None:
+    """Delete all notes from the database."""
+    filenames = [name for name, in app.database.execute(
+        "SELECT filename FROM Files"
+    )]
+    delete_notes(app, filenames)
+
+
+def process_all(app: App) -> None:
+    """Process every note file in the slipbox.
+
+    Also refreshes ValidLinks and the other tables that depend on the set
+    of notes, like builds do.
+    """
+    for batch in group_by_file_extension(find_notes(app)):
+        assert process_batch(app, batch).is_ok
+    refresh_views(app.database)
+
+
+def bench_find_notes(app: App, _: ExitStack) -> t.Callable[[], t.Any]:
+    """Find note files."""
+    return lambda: list(find_notes(app))
+
+
+def bench_find_outdated_notes(app: App, _: ExitStack
+                              ) -> t.Callable[[], t.Any]:
+    """Check for modified notes, trusting unchanged stat info."""
+    notes = list(find_notes(app))
+    return lambda: find_outdated_notes(app, notes)
+
+
+def bench_find_outdated_notes_rehash(app: App, _: ExitStack
+                                     ) -> t.Callable[[], t.Any]:
+    """Check for modified notes by rehashing every file."""
+    notes = list(find_notes(app))
+    app.args["verify_hashes"] = True
+
+    def run() -> None:
+        try:
+            find_outdated_notes(app, notes)
+        finally:
+            app.args["verify_hashes"] = False
+    return run
+
+
+def bench_process_batch(app: App, _: ExitStack) -> t.Callable[[], t.Any]:
+    """Scan and save every note without the scan cache."""
+    clear_notes(app)
+    shutil.rmtree(cache_directory(app), ignore_errors=True)
+    return lambda: process_all(app)
+
+
+def bench_process_batch_cached(app: App, _: ExitStack
+                               ) -> t.Callable[[], t.Any]:
+    """Save every note from the scan cache."""
+    clear_notes(app)
+    return lambda: process_all(app)
+
+
+def bench_process_csvs(app: App, stack: ExitStack) -> t.Callable[[], t.Any]:
+    """Load CSV scan data into the database."""
+    scan_format = app.config.scan_format
+    app.config.scan_format = "csv"
+    tempdirs = []
+    try:
+        for batch in group_by_file_extension(find_notes(app)):
+            tempdir = stack.enter_context(temporary_directory())
+            assert scan_batch(app, batch, tempdir)
+            tempdirs.append(tempdir)
+    finally:
+        app.config.scan_format = scan_format
+
+    clear_notes(app)
+    objects = objects_directory(app.root)
+
+    def run() -> None:
+        for tempdir in tempdirs:
+            assert process_csvs(app.database, tempdir, objects)
+    return run
+
+
+def bench_create_note_graph(app: App, _: ExitStack) -> t.Callable[[], t.Any]:
+    """Create note graph from the database."""
+    return lambda: create_note_graph(app.database)
+
+
+def bench_cytoscape_data(app: App, stack: ExitStack) -> t.Callable[[], t.Any]:
+    """Generate graph data with layouts.
+
+    Layouts are cached in the database, so only the first run computes
+    them.
+    """
+    out = stack.enter_context(temporary_directory())
+    return lambda: CytoscapeDataGenerator(app.database).run(out)
+
+
+def bench_generate_index(app: App, stack: ExitStack) -> t.Callable[[], t.Any]:
+    """Generate index.html."""
+    out = stack.enter_context(temporary_directory())
+    return lambda: generate_index(app, out)
+
+
+# Benchmarks by name, in the order they run.
+BENCHMARKS: t.Dict[str, Setup] = {
+    "find_notes": bench_find_notes,
+    "find_outdated_notes": bench_find_outdated_notes,
+    "find_outdated_notes_rehash": bench_find_outdated_notes_rehash,
+    "process_batch": bench_process_batch,
+    "process_batch_cached": bench_process_batch_cached,
+    "process_csvs": bench_process_csvs,
+    "create_note_graph": bench_create_note_graph,
+    "cytoscape_data": bench_cytoscape_data,
+    "generate_index": bench_generate_index,
+}
+
+
+# Benchmarks that leave the database without some notes or their HTML.
+MODIFY_NOTES = {"process_batch", "process_batch_cached", "process_csvs"}
+
+
+def summarize(runs: t.List[float]) -> t.Dict[str, t.Any]:
+    """Summarize run times (in seconds) of a benchmark."""
+    return {
+        "runs": runs,
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.mean(runs),
+    }
+
+
+def process_notes(app: App) -> None:
+    """Replace notes in the database with freshly processed notes."""
+    clear_notes(app)
+    process_all(app)
+    app.database.commit()
+
+
+def run_benchmark(app: App, name: str, repeat: int) -> t.List[float]:
+    """Run benchmark repeat times and return the run times in seconds.
+
+    Every run starts with all notes in the database.
+    """
+    runs = []
+    for _ in range(repeat):
+        with ExitStack() as stack:
+            func = BENCHMARKS[name](app, stack)
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+        if name in MODIFY_NOTES:
+            process_notes(app)
+    return runs
+
+
+def run_benchmarks(app: App,
+                   names: t.Iterable[str],
+                   repeat: int) -> t.Dict[str, t.Dict[str, t.Any]]:
+    """Run benchmarks on the slipbox of app.
+
+    The notes get processed once before the benchmarks run.
+    """
+    process_notes(app)
+    return {
+        name: summarize(run_benchmark(app, name, repeat))
+        for name in names
+    }
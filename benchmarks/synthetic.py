@@ -0,0 +1,179 @@
+"""Generate synthetic slipboxes."""
+
+from dataclasses import dataclass
+from pathlib import Path
+import random
+import typing as t
+
+from slipbox.app import App
+from slipbox.config import Config
+from slipbox.database import migrate, open_database
+
+
+# Flat like Config, so that each field maps to a command-line option and to
+# a key in the saved report.
+@dataclass
+class Parameters:   # pylint: disable=too-many-instance-attributes
+    """Shape of a synthetic slipbox."""
+    notes: int = 1000
+    links_per_note: int = 3
+    tags_per_note: int = 2
+    tags: int = 100     # Number of distinct tags
+    citations_per_note: int = 1     # Only in Markdown notes
+    references: int = 100   # Number of bibliography entries
+    images: int = 20
+    images_per_note: int = 0
+    notes_per_file: int = 1
+    formats: t.Tuple[str, ...] = ("md",)    # Cycled through file by file
+    seed: int = 0
+
+
+# Extension of note files in each format.
+EXTENSIONS = {
+    "md": ".md",
+    "org": ".org",
+    "rst": ".rst",
+}
+
+
+class Note(t.NamedTuple):
+    """Contents of a synthetic note."""
+    id: int
+    tags: t.List[str]
+    links: t.List[int]
+    citations: t.List[str]
+    images: t.List[str]
+
+
+def render_markdown(note: Note) -> str:
+    """Render note in Markdown."""
+    lines = [f"# {note.id} Note {note.id}", "", f"Note {note.id}."]
+    lines.extend(f"#{tag}" for tag in note.tags)
+    lines.extend(f"[Note {dest}](#{dest})" for dest in note.links)
+    lines.extend(f"[@{key}]" for key in note.citations)
+    lines.extend(f"![{image}]({image})" for image in note.images)
+    return "\n\n".join(lines) + "\n\n"
+
+
+def render_org(note: Note) -> str:
+    """Render note in Org."""
+    lines = [f"* {note.id} Note {note.id}", "", f"Note {note.id}."]
+    lines.extend(f"#{tag}" for tag in note.tags)
+    lines.extend(f"[[#{dest}][Note {dest}]]" for dest in note.links)
+    lines.extend(f"[[file:{image}]]" for image in note.images)
+    return "\n\n".join(lines) + "\n\n"
+
+
+def render_rst(note: Note) -> str:
+    """Render note in reStructuredText."""
+    title = f"{note.id} Note {note.id}"
+    lines = [f"{title}\n{'=' * len(title)}", f"Note {note.id}."]
+    lines.extend(f"#{tag}" for tag in note.tags)
+    lines.extend(f"`Note {dest} <#{dest}>`__" for dest in note.links)
+    lines.extend(f".. image:: {image}" for image in note.images)
+    return "\n\n".join(lines) + "\n\n"
+
+
+RENDERERS: t.Dict[str, t.Callable[[Note], str]] = {
+    "md": render_markdown,
+    "org": render_org,
+    "rst": render_rst,
+}
+
+
+def sample(rng: random.Random, population: t.Sequence[t.Any], count: int
+           ) -> t.List[t.Any]:
+    """Sample at most count items from population without replacement."""
+    return rng.sample(population, min(count, len(population)))
+
+
+def create_notes(params: Parameters) -> t.List[Note]:
+    """Create random notes."""
+    rng = random.Random(params.seed)
+    ids = range(params.notes)
+    tags = [f"tag{index}" for index in range(params.tags)]
+    keys = [f"ref{index}" for index in range(params.references)]
+    images = [f"images/{index}.png" for index in range(params.images)]
+    return [
+        Note(
+            id=id_,
+            tags=sample(rng, tags, params.tags_per_note),
+            links=sample(rng, ids, params.links_per_note),
+            citations=sample(rng, keys, params.citations_per_note),
+            images=sample(rng, images, params.images_per_note),
+        )
+        for id_ in ids
+    ]
+
+
+def render_bibliography(params: Parameters) -> str:
+    """Render BibTeX bibliography."""
+    return "".join(
+        f"@book{{ref{index},\n"
+        f"    title = {{Reference {index}}},\n"
+        f"    author = {{Author {index}}},\n"
+        f"    year = {{{2000 + index % 25}}},\n"
+        "}\n"
+        for index in range(params.references)
+    )
+
+
+def write_notes(root: Path, params: Parameters) -> t.List[Path]:
+    """Write note files, images and bibliography into root.
+
+    Returns paths to note files.
+    """
+    notes = create_notes(params)
+    paths = []
+    size = max(1, params.notes_per_file)
+    for index, start in enumerate(range(0, len(notes), size)):
+        fmt = params.formats[index % len(params.formats)]
+        render = RENDERERS[fmt]
+        path = root/f"{index}{EXTENSIONS[fmt]}"
+        path.write_text(
+            "".join(render(note) for note in notes[start:start + size]),
+            encoding="utf-8",
+        )
+        paths.append(path)
+
+    rng = random.Random(params.seed)
+    (root/"images").mkdir(exist_ok=True)
+    for index in range(params.images):
+        data = bytes(rng.getrandbits(8) for _ in range(1024))
+        (root/"images"/f"{index}.png").write_bytes(data)
+
+    if params.references:
+        (root/"references.bib").write_text(render_bibliography(params),
+                                           encoding="utf-8")
+    return paths
+
+
+def create_config(params: Parameters) -> Config:
+    """Create config that includes notes in every format."""
+    config = Config()
+    config.patterns = {f"*{EXTENSIONS[fmt]}": True for fmt in params.formats}
+    if params.references:
+        config.bibliography = Path("references.bib")    # type: ignore
+    return config
+
+
+def create_slipbox(root: Path, params: Parameters) -> App:
+    """Create synthetic slipbox in root.
+
+    Returns app object for the slipbox, which hasn't been built yet.
+    """
+    root = root.resolve()
+    hidden = root/".slipbox"
+    hidden.mkdir(parents=True, exist_ok=True)
+    write_notes(root, params)
+
+    config = create_config(params)
+    config.write(hidden/"config.cfg")
+    app = App(
+        args={"quiet": True},
+        root=root,
+        config=config,
+        database=open_database(hidden/"data.db", config),
+    )
+    migrate(app.database)
+    return app
@@ -14,6 +14,7 @@ local function bundle()
       "src.slipbox",
       "src.utils",
       "src.metadata",
+      "src.ndjson",
       "dkjson",
    }
 
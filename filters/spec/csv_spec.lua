@@ -1,5 +1,16 @@
 local csv = require "src.csv"
 
+local function write_records(count)
+  -- Write count records and return the elapsed CPU time and the data.
+  local start = os.clock()
+  local w = csv.Writer:new{"src", "dest", "direction"}
+  for i = 1, count do
+    w:write{i, i + 1, ">"}
+  end
+  local data = w:data()
+  return os.clock() - start, data
+end
+
 describe("Writer", function()
   describe("write", function()
     describe("with wrong number of fields", function()
@@ -11,5 +22,28 @@ describe("Writer", function()
         assert.falsy(pcall(csv.Writer.write, w, {5}))
       end)
     end)
+
+    describe("with missing fields", function()
+      it("should leave them empty", function()
+        local w = csv.Writer:new{"foo", "bar", "baz"}
+        w:write{'a"b', false, 3}
+        assert.are.equal('"a""b",,"3"\n', w:data())
+      end)
+    end)
+  end)
+
+  describe("data", function()
+    it("should take linear time in the number of records", function()
+      local small = write_records(10000)
+      local large, data = write_records(100000)
+
+      local _, lines = data:gsub("\n", "")
+      assert.are.equal(100000, lines)
+      assert.are.equal('"1","2",">"\n', data:sub(1, 12))
+
+      -- 10x the records should take about 10x the time. Quadratic string
+      -- building takes about 100x.
+      assert.is_true(large < 30 * math.max(small, 0.001))
+    end)
   end)
 end)
@@ -0,0 +1,17 @@
+local ndjson = require "src.ndjson"
+
+describe("Writer", function()
+  describe("data", function()
+    it("should put one JSON value on each line", function()
+      local w = ndjson.Writer:new()
+      assert.are.equal("", w:data())
+
+      w:write{"notes", 0, "Title", "a.md"}
+      w:write{"tags", "#tag", 0}
+      assert.are.equal(
+        '["notes",0,"Title","a.md"]\n["tags","#tag",0]\n',
+        w:data()
+      )
+    end)
+  end)
+end)
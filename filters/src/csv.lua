@@ -4,7 +4,7 @@ function Writer:new(fields)
   return setmetatable({
     header = table.concat(fields, ','),
     columns = #fields,
-    data = "",
+    records = {},
   }, self)
 end
 
@@ -18,19 +18,25 @@ function Writer:record(fields)
     error(string.format("expected %d columns, got %d", self.columns, #fields))
   end
 
-  local record = quoted(fields[1])
-  for i = 2, self.columns do
-    if not fields[i] then
-      record = record .. ','
-    else
-      record = record .. ',' .. quoted(fields[i])
-    end
+  local record = {}
+  for i = 1, self.columns do
+    record[i] = fields[i] and quoted(fields[i]) or ""
   end
-  return record
+  return table.concat(record, ',')
 end
 
 function Writer:write(fields)
-  self.data = string.format("%s%s\n", self.data, self:record(fields))
+  -- Buffer record. Concatenating the data on every write would be
+  -- quadratic in the size of the output.
+  table.insert(self.records, self:record(fields))
+end
+
+function Writer:data()
+  -- Return CSV data.
+  if #self.records == 0 then
+    return ""
+  end
+  return table.concat(self.records, "\n") .. "\n"
 end
 
 return {Writer = Writer}
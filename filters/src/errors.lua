@@ -43,10 +43,20 @@ local function empty_link_target(note)
   table.insert(messages, message)
 end
 
-local function write()
+local function write(format)
   -- Write error and warning messages to json file.
-  local str = json.encode(messages)
-  local ok = utils.write_text("messages.json", str)
+  -- If format is "ndjson", messages get appended to scan.ndjson instead,
+  -- one ["message", <message>] array per line.
+  local ok
+  if format == "ndjson" then
+    local lines = {}
+    for _, message in ipairs(messages) do
+      table.insert(lines, json.encode{"message", message} .. "\n")
+    end
+    ok = utils.append_text("scan.ndjson", table.concat(lines))
+  else
+    ok = utils.write_text("messages.json", json.encode(messages))
+  end
   if ok then
     messages = {}
   end
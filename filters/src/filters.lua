@@ -310,11 +310,17 @@ local function citations(slipbox)
   }
 end
 
+local function scan_format(meta)
+  -- Get output format of scan data from slipbox-scan-format metadata.
+  local format = meta["slipbox-scan-format"]
+  return format and pandoc.utils.stringify(format) or "csv"
+end
+
 local function serialize(slipbox)
   -- Create filter to dump slipbox data into working directory.
   return {
-    Pandoc = function()
-      slipbox:write_data()
+    Pandoc = function(doc)
+      slipbox:write_data(scan_format(doc.meta))
     end
   }
 end
@@ -355,9 +361,9 @@ local function cleanup()
       elem.attributes.hash = nil
       return elem
     end,
-    Pandoc = function()
+    Pandoc = function(doc)
       -- Output all recorded errors.
-      errors.write()
+      errors.write(scan_format(doc.meta))
     end,
   }
 end
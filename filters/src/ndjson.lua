@@ -0,0 +1,24 @@
+-- Newline-delimited JSON writer.
+
+local json = require "dkjson"
+
+local Writer = {}
+function Writer:new()
+  self.__index = self
+  return setmetatable({lines = {}}, self)
+end
+
+function Writer:write(value)
+  -- Add JSON-encoded value as a line.
+  table.insert(self.lines, json.encode(value))
+end
+
+function Writer:data()
+  -- Return NDJSON data.
+  if #self.lines == 0 then
+    return ""
+  end
+  return table.concat(self.lines, "\n") .. "\n"
+end
+
+return {Writer = Writer}
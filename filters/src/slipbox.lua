@@ -1,5 +1,6 @@
 local csv = require "src.csv"
 local errors = require "src.errors"
+local ndjson = require "src.ndjson"
 local utils = require "src.utils"
 
 local SlipBox = {}
@@ -93,94 +94,120 @@ function SlipBox:save_link(link)
   end
 end
 
-local function notes_to_csv(notes)
-  -- Generate CSV data from slipbox notes.
-  local w = csv.Writer:new{"id", "title", "filename"}
+local function note_rows(notes, write)
+  -- Generate rows of note data from slipbox notes.
   for id, note in pairs(notes) do
     if note.filename then
-      w:write{id, note.title, note.filename}
+      write{id, note.title, note.filename}
     end
   end
-  return w.data
 end
 
-local function tags_to_csv(all_tags)
-  -- Create CSV data from tags in slipbox.
-  local w = csv.Writer:new{"tag", "id"}
+local function tag_rows(all_tags, write)
+  -- Generate rows of tag data from tags in slipbox.
   for id, tags in pairs(all_tags) do
     for tag, _ in pairs(tags) do
-      w:write{tag, id}
+      write{tag, id}
     end
   end
-  return w.data
 end
 
-local function links_to_csv(links)
-  -- Create CSV data from direct links in slipbox.
-  local w = csv.Writer:new{"src", "dest", "direction"}
+local function link_rows(links, write)
+  -- Generate rows of direct links in slipbox.
   for src, dests in pairs(links) do
     for _, dest in ipairs(dests) do
-      w:write{src, dest.dest, dest.direction}
+      write{src, dest.dest, dest.direction}
     end
   end
-  return w.data
 end
 
-local function bibliography_to_csv(refs)
-  local w = csv.Writer:new{"key", "html"}
+local function bibliography_rows(refs, write)
   for ref, html in pairs(refs) do
-    w:write{ref, html}
+    write{ref, html}
   end
-  return w.data
 end
 
-local function files_to_csv(files)
-  local w = csv.Writer:new{"filename", "hash"}
+local function file_rows(files, write)
   for filename, hash in pairs(files) do
-    w:write{filename, hash}
+    write{filename, hash}
   end
-  return w.data
 end
 
-local function citations_to_csv(citations)
-  local w = csv.Writer:new{"note", "reference"}
+local function citation_rows(citations, write)
   for id, cites in pairs(citations) do
     for cite in pairs(cites) do
-      w:write{id, cite}
+      write{id, cite}
     end
   end
-  return w.data
 end
 
-local function images_to_csv(images)
-  local w = csv.Writer:new{"filename"}
+local function image_rows(images, write)
   for filename in pairs(images) do
-    w:write{filename}
+    write{filename}
   end
-  return w.data
 end
 
-local function image_links_to_csv(images)
-  local w = csv.Writer:new{"note", "image"}
+local function image_link_rows(images, write)
   for filename, image in pairs(images) do
     for note in pairs(image.notes) do
-      w:write{note, filename}
+      write{note, filename}
     end
   end
-  return w.data
-end
-
-function SlipBox:write_data()
-  -- Create CSV data to files.
-  local write = utils.write_text
-  write("files.csv", files_to_csv(self.files))
-  write("notes.csv", notes_to_csv(self.notes))
-  write("tags.csv", tags_to_csv(self.tags))
-  write("links.csv", links_to_csv(self.links))
-  write("images.csv", images_to_csv(self.images))
-  write("image_links.csv", image_links_to_csv(self.images))
-  write("bibliography.csv", bibliography_to_csv(self.bibliography))
-  write("citations.csv", citations_to_csv(self.citations))
+end
+
+-- Tables written by the filter.
+-- rows: generates the rows of the table from the given slipbox field
+local tables = {
+  {name = "files", columns = {"filename", "hash"}, field = "files",
+   rows = file_rows},
+  {name = "notes", columns = {"id", "title", "filename"}, field = "notes",
+   rows = note_rows},
+  {name = "tags", columns = {"tag", "id"}, field = "tags", rows = tag_rows},
+  {name = "links", columns = {"src", "dest", "direction"}, field = "links",
+   rows = link_rows},
+  {name = "images", columns = {"filename"}, field = "images",
+   rows = image_rows},
+  {name = "image_links", columns = {"note", "image"}, field = "images",
+   rows = image_link_rows},
+  {name = "bibliography", columns = {"key", "html"}, field = "bibliography",
+   rows = bibliography_rows},
+  {name = "citations", columns = {"note", "reference"}, field = "citations",
+   rows = citation_rows},
+}
+
+function SlipBox:write_csv()
+  -- Write data into one CSV file per table.
+  for _, spec in ipairs(tables) do
+    local w = csv.Writer:new(spec.columns)
+    spec.rows(self[spec.field], function(row) w:write(row) end)
+    utils.write_text(spec.name .. ".csv", w:data())
+  end
+end
+
+function SlipBox:write_ndjson()
+  -- Write data into scan.ndjson.
+  -- Each line is a JSON array that contains the table name followed by
+  -- the values in the row.
+  local w = ndjson.Writer:new()
+  for _, spec in ipairs(tables) do
+    spec.rows(self[spec.field], function(row)
+      local record = {spec.name}
+      for i = 1, #spec.columns do
+        record[i + 1] = row[i] or ""
+      end
+      w:write(record)
+    end)
+  end
+  utils.write_text("scan.ndjson", w:data())
+end
+
+function SlipBox:write_data(format)
+  -- Write data to files in the given format ("csv" or "ndjson").
+  if format == "ndjson" then
+    self:write_ndjson()
+  else
+    self:write_csv()
+  end
 end
 
 return {
@@ -34,7 +34,7 @@ if __name__ == "__main__":
         long_description=Path("README.md").read_text(encoding="utf-8"),
         long_description_content_type="text/markdown",
         url="https://github.com/lggruspe/slipbox",
-        packages=setuptools.find_packages(),
+        packages=setuptools.find_packages(exclude=["benchmarks"]),
         package_data={
             "slipbox": [
                 "data/*",
@@ -1,5 +1,6 @@
 """Static site generator for Zettelkasten notes."""
 
+from pathlib import Path
 import sys
 import typing as t
 
@@ -8,7 +9,10 @@ from .app import error, RootlessApp, startup
 from .build import build
 from .cli import parse_args
 from .dependencies import has_dot, has_pandoc
+from .profiler import profile_call
+from .serve import serve
 from .tools.new import new_note
+from .watch import watch
 
 
 Command = t.Callable[[RootlessApp], None]
@@ -21,9 +25,24 @@ handlers: t.Dict[str, Command] = {
     "info": commands.show_info,
     "init": commands.init,
     "new": new_note,
+    "serve": serve,
+    "watch": watch,
 }
 
 
+def run(handler: Command, app: RootlessApp) -> None:
+    """Run command handler, and profile it if --profile is set."""
+    path = app.args.get("profile")
+    if path is None:
+        handler(app)
+    else:
+        profile_call(
+            lambda: handler(app),
+            Path(path),
+            app.args["profile_interval"],
+        )
+
+
 def main() -> None:
     """Entrypoint."""
     app = startup(parse_args())
@@ -42,7 +61,7 @@ https://github.com/lggruspe/slipbox""")
     if command is not None:
         handler = handlers[command]
         if handler is not None:
-            handler(app)
+            run(handler, app)
     app.cleanup()
 
 
@@ -1,6 +1,7 @@
 """App object."""
 
 import configparser
+from contextlib import closing
 from dataclasses import dataclass, field
 from functools import wraps
 from pathlib import Path
@@ -9,8 +10,9 @@ import sys
 import typing as t
 
 from .config import Config
-from .database import migrate
+from .database import migrate, open_database
 from .errors import ErrorFormatter
+from .timings import Timer
 
 
 def is_root(path: Path) -> bool:
@@ -40,6 +42,7 @@ class RootlessApp:
     database: Connection
 
     error_formatter: ErrorFormatter = field(default_factory=ErrorFormatter)
+    timer: Timer = field(default_factory=Timer)
 
     def cleanup(self) -> None:
         """Clean up."""
@@ -57,13 +60,17 @@ class RootlessApp:
         return backup
 
     def restore_database_backup(self) -> None:
-        """Restore database backup."""
+        """Restore database backup.
+
+        The backup gets copied into the open database instead of replacing
+        the database file, which would leave a stale WAL file behind.
+        """
         assert self.root
-        self.cleanup()
-        database = self.root/".slipbox"/"data.db"
         backup = self.root/".slipbox"/"data.db.bak"
-        backup.replace(database)
-        self.database = connect(str(database.resolve()))
+        self.database.rollback()
+        with closing(connect(str(backup.resolve()))) as source:
+            source.backup(self.database)
+        backup.unlink()
 
 
 @dataclass
@@ -91,7 +98,7 @@ def startup(args: t.Dict[str, t.Any]) -> t.Union[App, RootlessApp]:
             app.config = Config.from_file(root/".slipbox"/"config.cfg")
         except configparser.Error:
             error("invalid config file: .slipbox/config.cfg")
-        app.database = connect(root/".slipbox"/"data.db")
+        app.database = open_database(root/".slipbox"/"data.db", app.config)
         app = t.cast(App, app)
 
     migrate(app.database)
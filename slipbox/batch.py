@@ -25,3 +25,20 @@ def group_by_file_extension(files: t.Iterable[Path]) -> t.Iterable[Batch]:
     groups = groupby(sorted(files, key=key), key=key)
     for _key, paths in groups:
         yield Batch(_key[0] or _key[1], tuple(paths))
+
+
+def split_batch(batch: Batch, count: int) -> t.List[Batch]:
+    """Split batch into at most count shards of roughly equal size.
+
+    Shards are contiguous slices of the batch, so concatenating their paths
+    gives back the original batch.
+    """
+    count = max(1, min(count, len(batch.paths)))
+    size, extra = divmod(len(batch.paths), count)
+    shards = []
+    start = 0
+    for index in range(count):
+        end = start + size + (1 if index < extra else 0)
+        shards.append(Batch(batch.extension, tuple(batch.paths[start:end])))
+        start = end
+    return shards
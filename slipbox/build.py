@@ -1,49 +1,299 @@
 """Site builder."""
 
 from hashlib import sha256
-from pathlib import Path
+import os
+from pathlib import Path, PurePosixPath
+import re
+import sys
+import time
 import typing as t
 
+from . import cache, git
 from .app import App, error, require_init
 from .batch import group_by_file_extension
+from .database import refresh_views, Savepoint
 from .generator import compile_site
-from .processor import process_batch
+from .memory import MemoryLimitError, MemorySampler
+from .objects import prune_objects
+from .processor import (
+    BatchResult, build_options, process_batch, store_file_stats,
+)
+from .references import apply_reference_changes, find_reference_changes
+from .utils import file_stat
 
 
-def find_notes(app: App) -> t.Iterable[Path]:
-    """Find notes in slipbox directory."""
-    assert app.root and app.root.is_dir()
+def ignored_directories(app: App) -> t.Tuple[Path, ...]:
+    """Directories that never contain notes."""
+    assert app.root is not None
+    return (
+        app.root/".slipbox",
+        app.root/".git",
+        app.root/app.config.output_directory,
+    )
 
-    include: t.List[str] = []
-    exclude: t.List[str] = []
-    for pattern, true in app.config.patterns.items():
-        (include if true else exclude).append(pattern)
 
-    for path in app.root.rglob("*"):
-        if not path.is_file():
-            continue
-        if not any(path.match(pat) for pat in include):
+def translate_set(chars: str, negated: bool) -> str:
+    """Translate characters inside a glob bracket expression (e.g. "a-z"
+    in "[!a-z]") into a regex that matches a single character other than
+    "/".
+
+    Like fnmatch, reversed ranges (e.g. "z-a") match nothing, and a set
+    with nothing left matches nothing (or anything if it's negated).
+    """
+    items = []
+    index = 0
+    while index < len(chars):
+        if index + 2 < len(chars) and chars[index + 1] == "-":
+            start, end = chars[index], chars[index + 2]
+            if start <= end:
+                items.append(f"{re.escape(start)}-{re.escape(end)}")
+            index += 3
+        else:
+            items.append(re.escape(chars[index]))
+            index += 1
+    if not items:
+        return "[^/]" if negated else "(?!)"
+    return f"[{'^/' if negated else ''}{''.join(items)}]"
+
+
+def translate_glob(part: str) -> str:
+    """Translate glob pattern for a single path component into a regex."""
+    result = []
+    index, size = 0, len(part)
+    while index < size:
+        char = part[index]
+        index += 1
+        if char == "*":
+            result.append("[^/]*")
+        elif char == "?":
+            result.append("[^/]")
+        elif char == "[":
+            end = index
+            if end < size and part[end] == "!":
+                end += 1
+            if end < size and part[end] == "]":
+                end += 1
+            while end < size and part[end] != "]":
+                end += 1
+            if end >= size:
+                result.append(r"\[")
+                continue
+            negated = part[index] == "!"
+            result.append(translate_set(part[index + negated:end], negated))
+            index = end + 1
+        else:
+            result.append(re.escape(char))
+    return "".join(result)
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate glob pattern into a regex that matches POSIX paths the
+    same way as Path.match.
+
+    Relative patterns match from the right, absolute patterns have to match
+    the whole path.
+    """
+    path = PurePosixPath(pattern)
+    parts = path.parts[1:] if path.is_absolute() else path.parts
+    body = "/".join(translate_glob(part) for part in parts)
+    prefix = r"\A/" if path.is_absolute() else r"(?:\A|(?<=/))"
+    return prefix + body + r"\Z"
+
+
+def compile_patterns(patterns: t.Iterable[str]
+                     ) -> t.Optional[t.Pattern[str]]:
+    """Compile glob patterns into a single regex.
+
+    Returns None if there are no patterns.
+    """
+    regexes = [f"(?:{glob_to_regex(pattern)})" for pattern in patterns]
+    if not regexes:
+        return None
+    flags = re.IGNORECASE if os.name == "nt" else 0
+    return re.compile("|".join(regexes), flags)
+
+
+class NoteFilter:
+    """Decides which files are notes and which directories to skip, based
+    on the note patterns in the config.
+
+    Paths are absolute POSIX paths.
+    """
+    def __init__(self, app: App):
+        include: t.List[str] = []
+        exclude: t.List[str] = []
+        prune: t.List[str] = []
+        for pattern, true in app.config.patterns.items():
+            if pattern.endswith("/"):
+                if not true:
+                    prune.append(pattern.rstrip("/"))
+                continue
+            (include if true else exclude).append(pattern)
+
+        self.included = compile_patterns(include)
+        self.excluded = compile_patterns(exclude)
+        self.pruned = compile_patterns(prune)
+        self.skipped = {
+            path.as_posix() for path in ignored_directories(app)
+        }
+
+    def is_note(self, path: str) -> bool:
+        """Check if path matches the note patterns."""
+        if self.included is None or not self.included.search(path):
+            return False
+        return self.excluded is None or not self.excluded.search(path)
+
+    def skips_directory(self, path: str) -> bool:
+        """Check if notes inside the directory should be ignored."""
+        if path in self.skipped:
+            return True
+        return self.pruned is not None and bool(self.pruned.search(path))
+
+
+def walk_notes(root: Path, note_filter: NoteFilter) -> t.Iterable[Path]:
+    """Find notes in root by walking the file system."""
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    path = entry.path.replace(os.sep, "/")
+                    if entry.is_dir(follow_symlinks=False):
+                        if not note_filter.skips_directory(path):
+                            stack.append(entry.path)
+                    elif note_filter.is_note(path) and entry.is_file():
+                        yield Path(entry.path)
+        except OSError:
             continue
-        if any(path.match(pat) for pat in exclude):
+
+
+def filter_notes(root: Path,
+                 filenames: t.Iterable[str],
+                 note_filter: NoteFilter) -> t.Iterable[Path]:
+    """Filter notes from filenames (POSIX paths relative to root)."""
+    base = root.as_posix()
+    skipped: t.Dict[str, bool] = {}
+
+    def is_skipped(directory: str) -> bool:
+        if directory == base:
+            return False
+        if directory not in skipped:
+            parent = directory.rpartition("/")[0]
+            skipped[directory] = note_filter.skips_directory(directory) \
+                or is_skipped(parent)
+        return skipped[directory]
+
+    for filename in filenames:
+        path = f"{base}/{filename}"
+        if not note_filter.is_note(path):
             continue
-        yield path
+        if not is_skipped(path.rpartition("/")[0]):
+            yield root/filename
 
 
-def find_outdated_notes(app: App, notes: t.Iterable[Path]) -> t.Iterable[Path]:
-    """Outdated notes: notes in database whose hash have changed.
+def find_notes(app: App) -> t.Iterable[Path]:
+    """Find notes in slipbox directory.
 
-    NOTE Does not check if the contents of the files changed.
+    Doesn't look inside ignored directories (see ignored_directories) and
+    directories that match excluded patterns that end in "/" (e.g.
+    "node_modules/ = false").
+    If the discovery config is "git", notes are taken from the files listed
+    by git (tracked and untracked, but not ignored) when the slipbox is
+    inside a git work tree.
     """
-    digests = {p: sha256(p.read_bytes()).hexdigest() for p in notes}
+    assert app.root and app.root.is_dir()
+    note_filter = NoteFilter(app)
+    if app.config.discovery == "git":
+        filenames = git.list_files(app.root)
+        if filenames is not None:
+            yield from filter_notes(app.root, filenames, note_filter)
+            return
+    yield from walk_notes(app.root, note_filter)
+
+
+def saved_files(app: App,
+                filenames: t.Optional[t.Iterable[str]] = None,
+                ) -> t.Iterable[t.Tuple[t.Any, ...]]:
+    """Return filename, hash, git blob ID and stat info of files in the
+    database.
+
+    If filenames is given, only those files get returned.
+    """
+    sql = "SELECT filename, hash, oid, mtime_ns, size, inode FROM Files"
+    if filenames is None:
+        return app.database.execute(sql)
+    return (
+        row
+        for filename in filenames
+        for row in app.database.execute(sql + " WHERE filename = ?",
+                                        (filename,))
+    )
+
+
+def find_outdated_notes(app: App,
+                        notes: t.Iterable[Path],
+                        clean: t.Optional[t.Mapping[str, str]] = None,
+                        changed: t.Optional[t.Collection[str]] = None,
+                        ) -> t.List[str]:
+    """Outdated notes: filenames in database whose hash have changed.
+
+    Only files whose stat info (mtime, size, inode) changed get rehashed,
+    unless the --verify-hashes option is set.
+    Files that were touched but not modified get their stat info updated.
+
+    clean: git blob IDs of files that match the git index (see
+    git.clean_files). Files whose blob ID is the same as the one saved in
+    the database are unchanged, so their stat info doesn't get checked.
+
+    changed: if set, only these filenames get checked (see update_database)
+    """
+    assert app.root is not None
+    verify = app.args.get("verify_hashes", False)
+    paths = {str(p.relative_to(app.root)): p for p in notes}
+    clean = clean or {}
+    checked = time.time_ns()
+
     outdated = []
-    sql = "SELECT filename, hash FROM Files"
-    for filename, _hash in app.database.execute(sql):
-        path = app.root/filename
-        if digests.get(path) != _hash:
+    touched = {}
+    for filename, _hash, oid, *cached in saved_files(app, changed):
+        path = paths.get(filename)
+        if path is None:
             outdated.append(filename)
+            continue
+        if not verify and oid is not None and clean.get(filename) == oid:
+            continue
+
+        stat = file_stat(path)
+        if not verify and stat == tuple(cached):
+            continue
+        if sha256(path.read_bytes()).hexdigest() != _hash:
+            outdated.append(filename)
+        else:
+            touched[filename] = stat
+
+    store_file_stats(app.database, touched, checked)
     return outdated
 
 
+def store_git_oids(app: App,
+                   clean: t.Mapping[str, str],
+                   skip: t.Collection[str]) -> None:
+    """Save git blob IDs of files that match the git index.
+
+    Files in skip (e.g. files that were just scanned) are left out until
+    the next build, in case they changed after git checked them.
+    """
+    sql = "UPDATE Files SET oid = ?1 WHERE filename = ?2 AND oid IS NOT ?1"
+    app.database.executemany(
+        sql,
+        (
+            (oid, filename)
+            for filename, oid in clean.items()
+            if filename not in skip
+        ),
+    )
+
+
 def find_new_notes(app: App, notes: t.Iterable[Path]) -> t.Iterable[Path]:
     """Find notes that are not yet in the database."""
     assert app.root is not None
@@ -55,44 +305,186 @@ def find_new_notes(app: App, notes: t.Iterable[Path]) -> t.Iterable[Path]:
             yield path
 
 
+def process_batches(app: App, notes: t.Iterable[Path]) -> BatchResult:
+    """Process note files in batches grouped by file extension.
+
+    Stops at the first batch with errors that should abort the build.
+    """
+    failed = []
+    for batch in group_by_file_extension(notes):
+        result = process_batch(app, batch)
+        failed.extend(result.failed)
+        if not result.is_ok:
+            return BatchResult(False, failed)
+    return BatchResult(True, failed)
+
+
 def process_notes(app: App, notes: t.Iterable[Path]) -> bool:
     """Process new notes (save into database).
 
+    Notes that fail to scan get skipped, but the rest get saved.
+    Doesn't modify the database on other errors.
     Returns False on error.
     """
-    is_ok = True
-    new = find_new_notes(app, notes)
-    for batch in group_by_file_extension(new):
-        is_ok = is_ok and process_batch(app, batch)
-    return is_ok
+    with Savepoint(app.database) as savepoint:
+        result = process_batches(app, find_new_notes(app, notes))
+        if not result.is_ok:
+            savepoint.rollback()
+        else:
+            refresh_views(app.database)
+    return result.is_ok and not result.failed
 
 
-def delete_notes(app: App, notes: t.Iterable[Path]) -> None:
+def delete_notes(app: App, notes: t.Iterable[str]) -> None:
     """Delete notes from database."""
-    cur = app.database.cursor()
-    cur.execute("PRAGMA foreign_keys=ON")
-    cur.executemany(
-        "DELETE FROM Files WHERE filename IN (?)",
-        ((filename,) for filename in notes),
-    )
-    app.database.commit()
+    with Savepoint(app.database):
+        app.database.executemany(
+            "DELETE FROM Files WHERE filename IN (?)",
+            ((filename,) for filename in notes),
+        )
+
+
+def delete_unused_images(app: App) -> None:
+    """Delete images that aren't linked from any note from the database.
+
+    Their files in the object store get deleted by prune_objects.
+    """
+    app.database.execute("""
+        DELETE FROM Images
+            WHERE filename NOT IN (SELECT image FROM ImageLinks)
+    """)
+
+
+class DatabaseUpdate(t.NamedTuple):
+    """Result of update_database."""
+    is_ok: bool
+    deleted: t.List[str]    # Filenames of deleted notes
+    processed: t.List[Path]     # Processed note files
+    failed: t.List[Path]    # Note files that pandoc failed to scan
+
+
+def update_database(app: App,
+                    notes: t.Sequence[Path],
+                    changed: t.Optional[t.Collection[str]] = None,
+                    ) -> DatabaseUpdate:
+    """Delete outdated notes from the database and process new ones.
+
+    Everything runs inside a single transaction, so the database doesn't
+    get modified on error. Notes that pandoc fails to scan don't count as
+    errors here; they're skipped and the rest get saved.
+
+    notes: all note files in the slipbox, or only the ones in changed
+    changed: filenames of files that might have changed (e.g. reported by a
+    watcher); if set, other files are assumed to be unchanged
+    """
+    assert app.root is not None
+    timer = app.timer
+    clean = None
+    if app.config.discovery == "git":
+        with timer.phase("git"):
+            clean = git.clean_files(app.root)
+
+    with Savepoint(app.database) as savepoint:
+        with timer.phase("outdated"):
+            outdated = find_outdated_notes(app, notes, clean, changed)
+        with timer.phase("references"):
+            changes = find_reference_changes(app)
+        if changes is not None:
+            outdated.extend(changes.filenames)
+        with timer.phase("delete"):
+            delete_notes(app, outdated)
+            if changes is not None:
+                apply_reference_changes(app, changes)
+
+        new = list(find_new_notes(app, notes))
+        result = process_batches(app, new)
+        delete_unused_images(app)
+        if not result.is_ok:
+            savepoint.rollback()
+        else:
+            if outdated or new:
+                with timer.phase("views"):
+                    refresh_views(app.database)
+            if clean is not None:
+                store_git_oids(
+                    app,
+                    clean,
+                    {str(path.relative_to(app.root)) for path in new},
+                )
+
+    failed = set(result.failed)
+    processed = [path for path in new if path not in failed]
+    return DatabaseUpdate(result.is_ok, outdated, processed, result.failed)
+
+
+def report_timings(app: App) -> None:
+    """Show and save build timings if the options are set."""
+    if app.args.get("timings") or app.args.get("memory"):
+        print(app.timer.format(), end="", file=sys.stderr)
+    if app.args.get("save_timings"):
+        app.timer.save(app.root/".slipbox"/"timings.json")
 
 
 @require_init
 def build(app: App) -> None:
-    """Build website."""
-    backup = app.backup_database()
-    notes = list(find_notes(app))
-    outdated = find_outdated_notes(app, notes)
-    delete_notes(app, outdated)
-    is_ok = process_notes(app, notes)
+    """Build website.
+
+    The database gets rolled back on error. With the --backup option (or
+    the backup config), the database file also gets copied before the
+    build and restored on error.
+    Notes that pandoc fails to scan are left out of the site, and the
+    build exits with an error after generating the site.
+    With --timings or --save-timings, the time spent in each phase gets
+    reported, even if the build fails. With --memory or a memory-limit
+    config, memory usage gets sampled, and the build stops as soon as it
+    exceeds the limit.
+    """
+    limit = app.config.memory_limit * 2**20
+    memory = None
+    if app.args.get("memory") or limit > 0:
+        memory = MemorySampler(limit)
+        app.timer.memory = memory
+        memory.start()
+    try:
+        with app.timer.phase("total"):
+            build_site(app)
+    except (KeyboardInterrupt, MemoryLimitError):
+        if memory is None or memory.exceeded is None:
+            raise
+        error(memory.exceeded)
+    finally:
+        if memory is not None:
+            memory.stop()
+        report_timings(app)
+
+
+def build_site(app: App) -> None:
+    """Update database and generate site (see build)."""
+    timer = app.timer
+    backup = None
+    if app.args.get("backup") or app.config.backup:
+        with timer.phase("backup"):
+            backup = app.backup_database()
+    with timer.phase("discovery"):
+        notes = list(find_notes(app))
+    update = update_database(app, notes)
     print(app.error_formatter.format(), end="")
 
-    if not is_ok:
-        app.restore_database_backup()
+    if not update.is_ok:
+        if backup is not None:
+            app.restore_database_backup()
         error(1)
     compile_site(app)
-    backup.unlink(missing_ok=True)
+    with timer.phase("prune"):
+        prune_objects(app.database, app.root)
+        cache.prune_cache(
+            app,
+            cache.scan_context(app, build_options(app)),
+        )
+    if backup is not None:
+        backup.unlink(missing_ok=True)
+    if update.failed:
+        error(1)
 
 
 __all__ = ["build", "process_notes"]
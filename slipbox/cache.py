@@ -0,0 +1,206 @@
+"""Content-addressed cache of scan results.
+
+Each cache entry contains the scan results (rows and rendered HTML) of a
+single note file. Entries are keyed by the content hash of the file and by
+everything else that affects the output of pandoc: the pandoc version, the
+slipbox filter, pandoc options and the bibliography and CSL files.
+Filenames aren't part of the key, so entries survive renames and database
+resets.
+"""
+
+from functools import lru_cache
+from hashlib import sha256
+import json
+from pathlib import Path
+import re
+import subprocess
+import typing as t
+
+from . import __version__
+from .app import App
+from .data import Row, ScanResult, Tables
+from .references import bibliography_path, csl_path
+from .utils import digest_file
+
+
+Entry = t.Dict[str, t.Any]
+
+TABLES = (
+    "tags",
+    "links",
+    "citations",
+    "bibliography",
+    "images",
+    "image_links",
+)
+
+
+def cache_directory(app: App) -> Path:
+    """Return path to cache directory."""
+    return app.root/".slipbox"/"cache"
+
+
+@lru_cache(maxsize=None)
+def pandoc_version(pandoc: str) -> str:
+    """Return output of `pandoc --version`."""
+    proc = subprocess.run(
+        [pandoc, "--version"],
+        check=False,
+        capture_output=True,
+    )
+    return proc.stdout.decode(errors="replace")
+
+
+def scan_context(app: App, options: str) -> str:
+    """Digest of everything other than note contents that affects scans.
+
+    options: pandoc options (see `processor.build_options`)
+    """
+    bibliography = bibliography_path(app)
+    parts = [
+        __version__,
+        pandoc_version(app.config.pandoc),
+        digest_file(Path(__file__).parent/"data"/"filter.lua"),
+        options,
+        digest_file(bibliography),
+        digest_file(csl_path(app)) if bibliography else "",
+    ]
+    return sha256("\0".join(parts).encode()).hexdigest()
+
+
+def entry_path(app: App, context: str, digest: str) -> Path:
+    """Return path to cache entry of note file with the given digest."""
+    key = sha256(f"{context}:{digest}".encode()).hexdigest()
+    return cache_directory(app)/key[:2]/f"{key}.json"
+
+
+def load_entry(app: App, context: str, digest: str) -> t.Optional[Entry]:
+    """Load cache entry of note file with the given digest, or None if
+    there's none.
+    """
+    try:
+        text = entry_path(app, context, digest).read_text(encoding="utf-8")
+        entry = json.loads(text)
+    except (OSError, ValueError):
+        return None
+    return t.cast(Entry, entry) if entry.get("hash") == digest else None
+
+
+def save_entry(app: App, context: str, entry: Entry) -> None:
+    """Save cache entry."""
+    path = entry_path(app, context, entry["hash"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(".tmp")
+    temp.write_text(json.dumps(entry), encoding="utf-8")
+    temp.replace(path)
+
+
+def prune_cache(app: App, context: str) -> None:
+    """Delete cache entries that aren't used by any file in the database.
+
+    Entries of older versions of notes and entries of other scan contexts
+    (e.g. other pandoc versions) get deleted.
+    """
+    directory = cache_directory(app)
+    if not directory.is_dir():
+        return
+    sql = "SELECT hash FROM Files WHERE hash IS NOT NULL"
+    used = {
+        entry_path(app, context, digest)
+        for digest, in app.database.execute(sql)
+    }
+    for subdirectory in directory.iterdir():
+        if not subdirectory.is_dir():
+            continue
+        for path in subdirectory.iterdir():
+            if path not in used:
+                path.unlink(missing_ok=True)
+        if not any(subdirectory.iterdir()):
+            subdirectory.rmdir()
+
+
+def split_scan_result(result: ScanResult) -> t.List[Entry]:
+    """Split scan result into cache entries, one for each note file."""
+    tables = result.tables
+    entries: t.Dict[str, Entry] = {}
+    for filename, _hash in tables["files"]:
+        entries[filename] = {
+            "filename": filename,
+            "hash": _hash,
+            "notes": [],
+            "messages": [],
+            **{name: [] for name in TABLES},
+        }
+
+    owners = {}
+    for id_, title, filename in tables["notes"]:
+        entry = entries[filename]
+        entry["notes"].append((id_, title, result.sections.get(id_)))
+        owners[id_] = entry
+
+    def distribute(name: str, rows: t.Iterable[Row]) -> None:
+        for row in rows:
+            entry = owners.get(row[0])
+            if entry is not None:
+                entry[name].append(row)
+
+    distribute("tags", ((id_, tag) for tag, id_ in tables["tags"]))
+    distribute("links", tables["links"])
+    distribute("citations", tables["citations"])
+    distribute("image_links", tables["image_links"])
+
+    bibliography: t.Dict[str, str] = dict(tables["bibliography"])
+    images = {filename for filename, in tables["images"]}
+    for entry in entries.values():
+        references = sorted({ref for _, ref in entry["citations"]})
+        entry["bibliography"] = [
+            (key, bibliography[key])
+            for key in references if key in bibliography
+        ]
+        entry["images"] = sorted(
+            {(image,) for _, image in entry["image_links"] if image in images}
+        )
+
+    for message in result.messages:
+        filename = message["value"].get("filename")
+        if filename in entries:
+            entries[filename]["messages"].append(message)
+    return list(entries.values())
+
+
+def rename_section(html: str, filename: str) -> str:
+    """Replace data-filename attribute of section HTML."""
+    escaped = filename.replace("&", "&amp;").replace('"', "&quot;") \
+        .replace("<", "&lt;").replace(">", "&gt;")
+    return re.sub(
+        r'data-filename="[^"]*"',
+        lambda _: f'data-filename="{escaped}"',
+        html,
+        count=1,
+    )
+
+
+def entry_to_scan_result(entry: Entry, filename: str) -> ScanResult:
+    """Convert cache entry of note file into scan result.
+
+    filename: current filename of the note file, in case it got renamed
+    """
+    renamed = filename != entry["filename"]
+    tables: Tables = {
+        "files": [(filename, entry["hash"])],
+        "notes": [(id_, title, filename) for id_, title, _ in entry["notes"]],
+        "tags": [(tag, id_) for id_, tag in entry["tags"]],
+        **{name: [tuple(row) for row in entry[name]] for name in TABLES[1:]},
+    }
+    sections = {
+        id_: rename_section(html, filename) if renamed else html
+        for id_, _, html in entry["notes"]
+        if html is not None
+    }
+    messages = []
+    for message in entry["messages"]:
+        if renamed:
+            value = dict(message["value"], filename=filename)
+            message = dict(message, value=value)
+        messages.append(message)
+    return ScanResult(tables, sections, messages)
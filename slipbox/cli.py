@@ -1,9 +1,18 @@
 """Slipbox CLI parser."""
 
-from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from argparse import (
+    ArgumentParser, ArgumentTypeError, RawDescriptionHelpFormatter,
+)
 from pathlib import Path
+import sys
 import typing as t
 
+from .profiler import DEFAULT_INTERVAL
+
+
+# Default output file of --profile.
+DEFAULT_PROFILE = "slipbox.pstats"
+
 
 def parse_args(argv: t.Optional[t.Sequence[str]] = None) -> t.Dict[str, t.Any]:
     """Returns dict of command-line options and arguments.
@@ -17,6 +26,8 @@ def parse_args(argv: t.Optional[t.Sequence[str]] = None) -> t.Dict[str, t.Any]:
   info      Show note info.
   init      Initialize notes directory.
   new       Get unused note IDs.
+  serve     Serve website and reload it whenever notes change.
+  watch     Rebuild website whenever notes change.
 """
 
     parser = ArgumentParser(
@@ -31,6 +42,22 @@ def parse_args(argv: t.Optional[t.Sequence[str]] = None) -> t.Dict[str, t.Any]:
         action="store_true",
         help="show version number and exit",
     )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="profile command and save stats in PATH and collapsed stacks "
+        f"for flame graphs in PATH.folded (default: {DEFAULT_PROFILE}); "
+        "PATH has to be attached with '=', as in --profile=PATH",
+    )
+    parser.add_argument(
+        "--profile-interval",
+        type=non_negative_float,
+        default=DEFAULT_INTERVAL,
+        dest="profile_interval",
+        metavar="SECONDS",
+        help="seconds between stack samples, or 0 to not sample stacks "
+        f"(default: {DEFAULT_INTERVAL})",
+    )
 
     # Add subcommands
     subparsers = parser.add_subparsers(
@@ -45,6 +72,46 @@ def parse_args(argv: t.Optional[t.Sequence[str]] = None) -> t.Dict[str, t.Any]:
         dest="output",
         help="update database only; do not generate site in output directory",
     )
+    subparser.add_argument(
+        "--verify-hashes",
+        action="store_true",
+        dest="verify_hashes",
+        help="rehash all notes instead of trusting unchanged file stats",
+    )
+    subparser.add_argument(
+        "--backup",
+        action="store_true",
+        dest="backup",
+        help="also copy the database file before building and restore it "
+        "on error",
+    )
+    subparser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        dest="jobs",
+        help="number of pandoc processes to run in parallel "
+        "(overrides config; 0 means one per CPU core)",
+    )
+    subparser.add_argument(
+        "--timings",
+        action="store_true",
+        dest="timings",
+        help="show wall and CPU time of each build phase",
+    )
+    subparser.add_argument(
+        "--save-timings",
+        action="store_true",
+        dest="save_timings",
+        help="save build phase timings in .slipbox/timings.json",
+    )
+    subparser.add_argument(
+        "--memory",
+        action="store_true",
+        dest="memory",
+        help="also track peak memory usage of each build phase and its "
+        "subprocesses (implies --timings)",
+    )
 
     subparser = subparsers.add_parser(
         "check",
@@ -94,7 +161,108 @@ def parse_args(argv: t.Optional[t.Sequence[str]] = None) -> t.Dict[str, t.Any]:
         default=1,
         help="number of note IDs to generate",
     )
-    return vars(parser.parse_args(argv))
+
+    subparser = subparsers.add_parser(
+        "serve",
+        description="Serve website and reload it whenever notes change.",
+    )
+    subparser.add_argument(
+        "--host",
+        default="localhost",
+        help="address to listen on (default: localhost)",
+    )
+    subparser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=8000,
+        help="port to listen on (default: 8000)",
+    )
+    add_watch_arguments(subparser)
+
+    subparser = subparsers.add_parser(
+        "watch",
+        description="Rebuild website whenever notes change.",
+    )
+    subparser.add_argument(
+        "--no-output",
+        action="store_false",
+        dest="output",
+        help="update database only; do not generate site in output directory",
+    )
+    add_watch_arguments(subparser)
+    args = sys.argv[1:] if argv is None else argv
+    if not profile_option_is_valid(args, subparsers.choices):
+        parser.error("the path of --profile must be passed as --profile=PATH")
+    return vars(parser.parse_args(expand_profile_option(args)))
+
+
+def non_negative_float(arg: str) -> float:
+    """Parse non-negative float argument."""
+    try:
+        value = float(arg)
+    except ValueError as exc:
+        raise ArgumentTypeError(f"invalid number: {arg}") from exc
+    if value < 0:
+        raise ArgumentTypeError(f"must not be negative: {arg}")
+    return value
+
+
+def profile_option_is_valid(args: t.Sequence[str],
+                            commands: t.Collection[str]) -> bool:
+    """Check that a bare --profile isn't followed by its path.
+
+    Only an option or a command can come after a bare --profile. Anything
+    else was probably meant to be the path, which would otherwise get
+    parsed as the command.
+    """
+    for arg, next_arg in zip(args, args[1:]):
+        if arg == "--profile" and not next_arg.startswith("-") and \
+                next_arg not in commands:
+            return False
+    return True
+
+
+def expand_profile_option(args: t.Sequence[str]) -> t.List[str]:
+    """Replace bare --profile with --profile=DEFAULT_PROFILE.
+
+    The path has to be attached to the option, so that the next argument
+    (e.g. the subcommand) doesn't get parsed as the path.
+    """
+    return [
+        f"--profile={DEFAULT_PROFILE}" if arg == "--profile" else arg
+        for arg in args
+    ]
+
+
+def add_watch_arguments(subparser: ArgumentParser) -> None:
+    """Add options for commands that watch notes for changes."""
+    subparser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        dest="jobs",
+        help="number of pandoc processes to run in parallel "
+        "(overrides config; 0 means one per CPU core)",
+    )
+    subparser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        help="seconds to wait for more changes before rebuilding "
+        "(default: 0.2)",
+    )
+    subparser.add_argument(
+        "--poll",
+        action="store_true",
+        help="poll for changes instead of using inotify",
+    )
+    subparser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="seconds between polls (default: 1.0)",
+    )
 
 
 __all__ = ["parse_args"]
@@ -5,10 +5,30 @@ Config overriding strategy:
 command-line args > environment variables > config file > default config.
 """
 
-from configparser import ConfigParser
+from configparser import ConfigParser, Error
 from dataclasses import dataclass
 import os
 from pathlib import Path
+import typing as t
+
+
+# Valid values of config options with a fixed set of choices.
+SCAN_FORMATS = ("csv", "ndjson")
+DISCOVERY_MODES = ("filesystem", "git")
+JOURNAL_MODES = ("delete", "memory", "off", "persist", "truncate", "wal")
+HTML_COMPRESSIONS = ("none", "zlib")    # See database.encode_html.
+
+
+def check_choice(option: str, value: str, choices: t.Sequence[str]) -> str:
+    """Return value if it's one of the choices for the config option.
+
+    Raises configparser.Error otherwise.
+    """
+    if value not in choices:
+        raise Error(
+            f"invalid {option}: {value} (choose from {', '.join(choices)})",
+        )
+    return value
 
 
 @dataclass
@@ -25,8 +45,22 @@ class Config:
         "*.rst": True,
     }
 
+    # [build]
+    jobs = 1
+    backup = False
+    scan_format = "ndjson"
+    discovery = "filesystem"
+    memory_limit = 0
+
+    # [database]
+    journal_mode = "wal"
+    mmap_size = 256
+    cache_size = 64
+    html_compression = "none"
+
     # [paths]
     pandoc = "pandoc"
+    pandoc_server = ""
     dot = "dot"
 
     # [pandoc-options]
@@ -46,7 +80,10 @@ class Config:
 
     @staticmethod
     def from_file(path: Path) -> "Config":
-        """Return Config object from file."""
+        """Return Config object from file.
+
+        Raises configparser.Error if the file is invalid.
+        """
         parser = ConfigParser()
         parser.read_string(path.read_text())
 
@@ -62,8 +99,66 @@ class Config:
         )
         default.title = parser.get("slipbox", "title", fallback=default.title)
 
+        # [build]
+        default.jobs = parser.getint("build", "jobs", fallback=default.jobs)
+        default.backup = parser.getboolean(
+            "build",
+            "backup",
+            fallback=default.backup,
+        )
+        default.scan_format = check_choice(
+            "scan-format",
+            parser.get("build", "scan-format", fallback=default.scan_format),
+            SCAN_FORMATS,
+        )
+        default.discovery = check_choice(
+            "discovery",
+            parser.get("build", "discovery", fallback=default.discovery),
+            DISCOVERY_MODES,
+        )
+        default.memory_limit = parser.getint(
+            "build",
+            "memory-limit",
+            fallback=default.memory_limit,
+        )
+
+        # [database]
+        default.journal_mode = check_choice(
+            "journal-mode",
+            parser.get(
+                "database",
+                "journal-mode",
+                fallback=default.journal_mode,
+            ),
+            JOURNAL_MODES,
+        )
+        default.mmap_size = parser.getint(
+            "database",
+            "mmap-size",
+            fallback=default.mmap_size,
+        )
+        default.cache_size = parser.getint(
+            "database",
+            "cache-size",
+            fallback=default.cache_size,
+        )
+        default.html_compression = check_choice(
+            "html-compression",
+            parser.get(
+                "database",
+                "html-compression",
+                fallback=default.html_compression,
+            ),
+            HTML_COMPRESSIONS,
+        )
+
         # [paths]
         default.pandoc = parser.get("paths", "pandoc", fallback=default.pandoc)
+        default.pandoc_server = parser.get(
+            "paths",
+            "pandoc-server",
+            fallback=default.pandoc_server,
+        )
         default.dot = parser.get("paths", "dot", fallback=default.dot)
 
         # [note-patterns]
@@ -109,6 +204,7 @@ class Config:
     def _update_from_env(self) -> None:
         """Update some config variables from environment variables."""
         self.pandoc = os.getenv("PANDOC", self.pandoc)
+        self.pandoc_server = os.getenv("PANDOC_SERVER", self.pandoc_server)
         self.dot = os.getenv("DOT", self.dot)
 
     def to_config_parser(self) -> ConfigParser:
@@ -118,6 +214,8 @@ class Config:
         sections = [
             "slipbox",
             "note-patterns",
+            "build",
+            "database",
             "paths",
             "pandoc-options",
             "check",
@@ -140,7 +238,19 @@ class Config:
                 "true" if include else "false",
             )
 
+        config.set("build", "jobs", str(self.jobs))
+        config.set("build", "backup", "true" if self.backup else "false")
+        config.set("build", "scan-format", self.scan_format)
+        config.set("build", "discovery", self.discovery)
+        config.set("build", "memory-limit", str(self.memory_limit))
+
+        config.set("database", "journal-mode", self.journal_mode)
+        config.set("database", "mmap-size", str(self.mmap_size))
+        config.set("database", "cache-size", str(self.cache_size))
+        config.set("database", "html-compression", self.html_compression)
+
         config.set("paths", "pandoc", self.pandoc)
+        config.set("paths", "pandoc-server", self.pandoc_server)
         config.set("paths", "dot", self.dot)
 
         if self.bibliography is not None:
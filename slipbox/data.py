@@ -1,40 +1,116 @@
-"""Process CSV data."""
+"""Process scan data."""
 
 import csv
+import json
 from pathlib import Path
 from sqlite3 import Connection, IntegrityError
 import typing as t
 
+from .database import encode_html
+from .errors import MessageSchema
+from .objects import store_object
 from .utils import show_error
 
 
-def run_sql_on_csv(conn: Connection,
-                   path: Path,
-                   sql: str,
-                   types: t.Sequence[t.Type[t.Any]],
-                   callback: t.Optional[t.Callable[..., t.Any]] = None
-                   ) -> None:
-    """Run SQl query on CSV data."""
-    cur = conn.cursor()
+Row = t.Tuple[t.Any, ...]
+
+# Scan data by table name.
+Tables = t.Dict[str, t.List[Row]]
+
+# Column types of the tables written by the slipbox filter.
+COLUMN_TYPES: t.Dict[str, t.Sequence[t.Type[t.Any]]] = {
+    "files": (str, str),
+    "notes": (int, str, str),
+    "tags": (str, int),
+    "links": (int, int, str),
+    "images": (str,),
+    "image_links": (int, str),
+    "bibliography": (str, str),
+    "citations": (int, str),
+}
+
+
+class ScanResult(t.NamedTuple):
+    """Data extracted from a batch of notes."""
+    tables: Tables
+    sections: t.Dict[int, str]  # HTML section of each note by ID
+    messages: t.List[MessageSchema]
+
+
+def read_csv(path: Path, types: t.Sequence[t.Type[t.Any]]) -> t.List[Row]:
+    """Read CSV data with the given column types."""
     with open(path, encoding="utf-8") as file:
         reader = csv.reader(file)
-        for row in reader:
-            args = [t(a) for t, a in zip(types, row)]
-            try:
-                cur.execute(sql, args)
-            except IntegrityError:
-                if callback:
-                    callback(*args)
+        return [tuple(t(a) for t, a in zip(types, row)) for row in reader]
+
 
+def read_csvs(basedir: Path) -> Tables:
+    """Read CSV data in basedir."""
+    return {
+        name: read_csv(basedir/f"{name}.csv", types)
+        for name, types in COLUMN_TYPES.items()
+    }
 
-def process_files(conn: Connection, path: Path) -> None:
-    """Process Files data in path."""
+
+def run_sql_on_rows(conn: Connection,
+                    rows: t.Iterable[Row],
+                    sql: str,
+                    callback: t.Optional[t.Callable[..., t.Any]] = None
+                    ) -> None:
+    """Run SQL query on each row.
+
+    Rows are sent to SQLite with executemany. If a row violates a
+    constraint, callback gets called on it, and executemany resumes from
+    the next row.
+    """
+    iterator = iter(rows)
+    current: Row = ()
+
+    def track() -> t.Iterator[Row]:
+        nonlocal current
+        for current in iterator:
+            yield current
+
+    while True:
+        try:
+            conn.executemany(sql, track())
+            return
+        except IntegrityError:
+            if callback:
+                callback(*current)
+
+
+def read_ndjson(path: Path) -> t.Tuple[Tables, t.List[MessageSchema]]:
+    """Read scan data and messages in NDJSON file.
+
+    Each line is a JSON array that contains the table name followed by the
+    row. Messages are stored as ["message", <message>].
+    The lines are parsed in a single call to json.loads, which is faster
+    than parsing them one at a time.
+    Lines are only split on "\n", because str.splitlines also splits on
+    characters (e.g. U+2028) that can appear unescaped in JSON strings.
+    """
+    text = path.read_text(encoding="utf-8")
+    records = json.loads("[" + ",".join(filter(None, text.split("\n"))) + "]")
+
+    tables: Tables = {name: [] for name in COLUMN_TYPES}
+    messages = []
+    for name, *row in records:
+        if name == "message":
+            messages.append(row[0])
+        else:
+            tables[name].append(tuple(row))
+    return tables, messages
+
+
+def insert_files(conn: Connection, rows: t.Iterable[Row]) -> None:
+    """Insert Files data."""
     sql = "INSERT OR IGNORE INTO Files (filename, hash) VALUES (?, ?)"
-    run_sql_on_csv(conn, path, sql, (str, str))
+    run_sql_on_rows(conn, rows, sql)
 
 
-def process_notes(conn: Connection, path: Path) -> bool:
-    """Process Notes data in path.
+def insert_notes(conn: Connection, rows: t.Iterable[Row]) -> bool:
+    """Insert Notes data.
 
     Returns False on error.
     """
@@ -52,73 +128,98 @@ def process_notes(conn: Connection, path: Path) -> bool:
         show_error("error", message)
 
     sql = "INSERT INTO Notes (id, title, filename) VALUES (?, ?, ?)"
-    run_sql_on_csv(conn, path, sql, (int, str, str), fix)
+    run_sql_on_rows(conn, rows, sql, fix)
     return is_ok
 
 
-def process_tags(conn: Connection, path: Path) -> None:
-    """Process Tags data in path."""
+def insert_tags(conn: Connection, rows: t.Iterable[Row]) -> None:
+    """Insert Tags data."""
     sql = "INSERT OR IGNORE INTO Tags (tag, id) VALUES (?, ?)"
-    run_sql_on_csv(conn, path, sql, (str, int))
+    run_sql_on_rows(conn, rows, sql)
 
 
-def process_links(conn: Connection, path: Path) -> None:
-    """Process Links data in path."""
+def insert_links(conn: Connection, rows: t.Iterable[Row]) -> None:
+    """Insert Links data."""
     sql = "INSERT OR IGNORE INTO Links (src, dest, direction) VALUES (?, ?, ?)"
-    run_sql_on_csv(conn, path, sql, (int, int, str))
+    run_sql_on_rows(conn, rows, sql)
+
 
+def insert_bibliography(conn: Connection,
+                        rows: t.Iterable[Row],
+                        compression: str = "none") -> None:
+    """Insert Bibliography data.
 
-def process_bibliography(conn: Connection, path: Path) -> None:
-    """Process Bibliography data in path."""
+    compression: see encode_html
+    """
     sql = "INSERT OR IGNORE INTO Bibliography (key, html) VALUES (?, ?)"
-    run_sql_on_csv(conn, path, sql, (str, str))
+    run_sql_on_rows(
+        conn,
+        ((key, encode_html(html, compression)) for key, html in rows),
+        sql,
+    )
 
 
-def process_citations(conn: Connection, path: Path) -> None:
-    """Process Citations data in path."""
+def insert_citations(conn: Connection, rows: t.Iterable[Row]) -> None:
+    """Insert Citations data."""
     sql = "INSERT OR IGNORE INTO Citations (note, reference) VALUES (?, ?)"
-    run_sql_on_csv(conn, path, sql, (int, str))
+    run_sql_on_rows(conn, rows, sql)
 
 
-def process_images(conn: Connection, path: Path) -> None:
-    """Process Images data in path."""
-    sql = "INSERT OR IGNORE INTO Images (filename, binary) VALUES (?, ?)"
-    cur = conn.cursor()
-    basedir = path.parent
-    with open(path, encoding="utf-8") as file:
-        reader = csv.reader(file)
-        for row in reader:
-            filename = row[0]
-            image = basedir/filename
-            binary: bytes = b""
+def insert_images(conn: Connection,
+                  rows: t.Iterable[Row],
+                  basedir: Path,
+                  objects: Path) -> None:
+    """Insert Images data.
+
+    Image files are read from basedir and copied into the objects
+    directory. Missing images are skipped.
+    """
+    def store_images() -> t.Iterator[Row]:
+        for filename, in rows:
             try:
-                binary = image.read_bytes()
+                yield filename, store_object(objects, basedir/filename)
             except FileNotFoundError:
                 continue
-            try:
-                cur.execute(sql, (filename, binary))
-            except IntegrityError:
-                pass
+
+    sql = """
+        INSERT INTO Images (filename, hash) VALUES (?, ?)
+            ON CONFLICT (filename) DO UPDATE SET hash = excluded.hash
+    """
+    run_sql_on_rows(conn, store_images(), sql)
 
 
-def process_image_links(conn: Connection, path: Path) -> None:
-    """Process ImageLinks data in path."""
+def insert_image_links(conn: Connection, rows: t.Iterable[Row]) -> None:
+    """Insert ImageLinks data."""
     sql = "INSERT OR IGNORE INTO ImageLinks (note, image) VALUES (?, ?)"
-    run_sql_on_csv(conn, path, sql, (int, str))
+    run_sql_on_rows(conn, rows, sql)
 
 
-def process_csvs(conn: Connection, basedir: Path) -> bool:
-    """Process CSV data in basedir.
+def insert_tables(conn: Connection,
+                  tables: Tables,
+                  basedir: Path,
+                  objects: Path,
+                  compression: str = "none") -> bool:
+    """Insert scan data into the database.
 
+    Image files are read from basedir and stored in the objects directory.
+    Bibliography HTML gets compressed (see encode_html).
     Returns False on error.
     """
-    process_files(conn, basedir/"files.csv")
-    if not process_notes(conn, basedir/"notes.csv"):
+    insert_files(conn, tables["files"])
+    if not insert_notes(conn, tables["notes"]):
         return False
-    process_tags(conn, basedir/"tags.csv")
-    process_links(conn, basedir/"links.csv")
-    process_images(conn, basedir/"images.csv")
-    process_image_links(conn, basedir/"image_links.csv")
-    process_bibliography(conn, basedir/"bibliography.csv")
-    process_citations(conn, basedir/"citations.csv")
+    insert_tags(conn, tables["tags"])
+    insert_links(conn, tables["links"])
+    insert_images(conn, tables["images"], basedir, objects)
+    insert_image_links(conn, tables["image_links"])
+    insert_bibliography(conn, tables["bibliography"], compression)
+    insert_citations(conn, tables["citations"])
     return True
+
+
+def process_csvs(conn: Connection, basedir: Path, objects: Path) -> bool:
+    """Process CSV data in basedir.
+
+    Returns False on error.
+    """
+    return insert_tables(conn, read_csvs(basedir), basedir, objects)
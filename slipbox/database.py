@@ -2,8 +2,36 @@
 
 from pathlib import Path
 import re
+import sqlite3
 from sqlite3 import Connection
+from types import TracebackType
 import typing as t
+import zlib
+
+from .config import Config
+
+
+def open_database(path: Path, config: Config) -> Connection:
+    """Open database file with the settings in the [database] config.
+
+    In WAL mode, readers (e.g. slipbox check) don't block on builds, and
+    synchronous=NORMAL only syncs on checkpoints instead of every commit.
+    """
+    con = sqlite3.connect(str(path))
+    mode, = con.execute(
+        f"PRAGMA journal_mode={config.journal_mode}",
+    ).fetchone()
+    if mode == "wal":
+        con.execute("PRAGMA synchronous=NORMAL")
+    con.execute(f"PRAGMA mmap_size={config.mmap_size * 2**20}")
+    con.execute(f"PRAGMA cache_size={-config.cache_size * 2**10}")
+    con.execute("PRAGMA temp_store=MEMORY")
+    return con
+
+
+# Version of the latest migration in migrations/.
+# Databases at this version get opened without reading any migrations.
+SCHEMA_VERSION = 11
 
 
 def user_version(con: Connection) -> int:
@@ -25,6 +53,7 @@ def schemas() -> t.List[Schema]:
 
     Does not check if there are duplicate versions or if the file versions
     match the user version.
+    Migration scripts don't begin or commit transactions (see migrate).
     """
     migrations = Path(__file__).with_name("migrations")
     pattern = re.compile(r"^(\d+)\..+\.sql$")
@@ -41,12 +70,111 @@ def schemas() -> t.List[Schema]:
 def migrate(con: Connection) -> None:
     """Migrate to latest version of database.
 
-    Does not roll back on error.
+    Pending migrations run in a single transaction, which gets rolled back
+    on error.
+    Foreign key constraints get disabled, so that migrations can rebuild
+    tables without cascading deletes into tables that refer to them.
     """
-    for version, source in schemas():
-        if user_version(con) < version:
-            con.executescript(source)
+    version = user_version(con)
+    if version >= SCHEMA_VERSION:
+        return
+
     con.commit()
+    con.execute("PRAGMA foreign_keys=OFF")
+    script = "\n".join(
+        source for number, source in schemas() if number > version
+    )
+    try:
+        con.executescript(f"BEGIN;\n{script}\nCOMMIT;")
+    except sqlite3.Error:
+        con.rollback()
+        raise
+
+
+def refresh_views(con: Connection) -> None:
+    """Recompute tables that replaced views of Notes, Links and Tags.
+
+    Should be called after notes get added or deleted.
+    """
+    con.execute("DELETE FROM ValidLinks")
+    con.execute("""
+        INSERT INTO ValidLinks (src, dest, direction)
+            SELECT src, dest, direction FROM Links JOIN Notes ON dest = id
+    """)
+    con.execute("DELETE FROM StronglyTagged")
+    con.execute("INSERT INTO StronglyTagged (id) SELECT DISTINCT id FROM Tags")
+    con.execute("DELETE FROM WeaklyTagged")
+    con.execute("""
+        INSERT INTO WeaklyTagged (id)
+            SELECT dest FROM Links JOIN StronglyTagged ON src = id
+            UNION
+            SELECT src FROM Links JOIN StronglyTagged ON dest = id
+    """)
+
+
+# Prefix of zlib-compressed HTML in Notes and Bibliography.
+# Uncompressed HTML gets stored as text.
+ZLIB_MARKER = b"zlib:"
+
+
+def encode_html(html: t.Optional[str],
+                compression: str) -> t.Union[str, bytes, None]:
+    """Encode HTML for Notes.html or Bibliography.html.
+
+    compression: "zlib" or "none" (see html-compression config)
+    """
+    if html is None or compression == "none":
+        return html
+    if compression == "zlib":
+        return ZLIB_MARKER + zlib.compress(html.encode())
+    raise ValueError(f"unknown HTML compression: {compression}")
+
+
+def decode_html(value: t.Union[str, bytes, None]) -> t.Optional[str]:
+    """Decode HTML from Notes.html or Bibliography.html.
+
+    Works regardless of the html-compression config, so that HTML stored
+    with a different config can still be read.
+    """
+    if not isinstance(value, bytes):
+        return value
+    if value.startswith(ZLIB_MARKER):
+        return zlib.decompress(value[len(ZLIB_MARKER):]).decode()
+    raise ValueError("unknown HTML compression")
+
+
+class Savepoint:
+    """Context manager for an SQLite savepoint (a nestable transaction).
+
+    Changes are released on exit (committed if it's the outermost
+    savepoint), unless rollback() got called or the block raised an
+    exception.
+    Enables foreign key constraints when starting a new transaction,
+    because they can't be enabled inside a transaction.
+    """
+    def __init__(self, con: Connection, name: str = "slipbox"):
+        self.con = con
+        self.name = name
+        self.rolled_back = False
+
+    def __enter__(self) -> "Savepoint":
+        if not self.con.in_transaction:
+            self.con.execute("PRAGMA foreign_keys=ON")
+        self.con.execute(f"SAVEPOINT {self.name}")
+        return self
+
+    def rollback(self) -> None:
+        """Undo changes made since the start of the savepoint."""
+        self.con.execute(f"ROLLBACK TO {self.name}")
+        self.rolled_back = True
+
+    def __exit__(self,
+                 exc_type: t.Optional[t.Type[BaseException]],
+                 exc_value: t.Optional[BaseException],
+                 traceback: t.Optional[TracebackType]) -> None:
+        if exc_type is not None and not self.rolled_back:
+            self.rollback()
+        self.con.execute(f"RELEASE {self.name}")
 
 
-__all__ = ["migrate"]
+__all__ = ["migrate", "open_database", "Savepoint", "SCHEMA_VERSION"]
@@ -18,6 +18,7 @@ from .graph import (
     get_tag_cluster,
     get_components,
 )
+from .objects import link_file, objects_directory
 from .page import generate_index
 from .utils import temporary_directory
 
@@ -41,13 +42,18 @@ def clear(directory: Path) -> None:
 
 
 @contextmanager
-def output_directory_proxy(path: Path) -> t.Iterator[Path]:
+def output_directory_proxy(path: Path,
+                           parent: t.Optional[Path] = None,
+                           ) -> t.Iterator[Path]:
     """Create proxy for output directory.
 
     Afterwards path is emptied and all contents of tempdir are moved into path.
+    The tempdir is created inside parent (if set), which should be on the
+    same filesystem as path, so that files can be moved (and hardlinked
+    from the object store) without copying.
     """
     assert not path.exists() or path.is_dir()
-    with temporary_directory() as tempdir:
+    with temporary_directory(parent) as tempdir:
         yield tempdir
         clear(path)
         for child in tempdir.iterdir():
@@ -99,17 +105,34 @@ def copy_mathjax(out: Path) -> None:
 
 
 class ImagesGenerator:
-    """Copies images from database into output directory."""
-    def __init__(self, con: Connection):
+    """Links images from the object store into output directory."""
+    def __init__(self, con: Connection, objects: Path):
         self.con = con
-
-    def run(self, out: Path) -> None:
-        """Copy images into output directory."""
-        (out/"images").mkdir()
-        sql = "SELECT filename, binary FROM Images"
-        for filename, binary in self.con.execute(sql):
+        self.objects = objects
+
+    def run(self,
+            out: Path,
+            filenames: t.Optional[t.Iterable[str]] = None) -> None:
+        """Link images into output directory.
+
+        If filenames is given, only those images get linked.
+        """
+        (out/"images").mkdir(exist_ok=True)
+        sql = "SELECT filename, hash FROM Images"
+        rows: t.Iterable[t.Tuple[str, str]]
+        if filenames is None:
+            rows = self.con.execute(sql)
+        else:
+            rows = (
+                row
+                for filename in filenames
+                for row in self.con.execute(sql + " WHERE filename = ?",
+                                            (filename,))
+            )
+        for filename, digest in rows:
             image = out/filename
-            image.write_bytes(binary)
+            image.parent.mkdir(parents=True, exist_ok=True)
+            link_file(self.objects/digest, image)
 
 
 class CytoscapeDataGenerator:
@@ -122,42 +145,43 @@ class CytoscapeDataGenerator:
         """Write graph data (in cytoscape format) to path."""
         path.write_text(json.dumps(data), encoding="utf-8")
 
-    def run(self, out: Path) -> None:
-        """Generate JSONs for cytoscape.js in out/graph."""
-        (out/"graph").mkdir()
+    def generate(self) -> t.Iterator[t.Tuple[str, t.Dict[str, t.Any]]]:
+        """Generate graph data (in cytoscape format) with their paths
+        relative to the output directory.
+        """
         data = create_graph_data(self.con, self.graph)
-        self.write(out/"graph"/"notes.json", data)
-
-        self.write(
-            out/"graph"/"refs.json",
-            create_plain_graph_data(create_reference_graph(self.con)),
+        yield "graph/notes.json", data
+        yield "graph/refs.json", create_plain_graph_data(
+            create_reference_graph(self.con),
         )
-        self.write(
-            out/"graph"/"tags.json",
-            create_plain_graph_data(create_tag_graph(self.con)),
+        yield "graph/tags.json", create_plain_graph_data(
+            create_tag_graph(self.con),
         )
 
-        (out/"graph"/"ref").mkdir()
         for ref, in self.con.execute("SELECT key FROM Bibliography"):
-            path = out/"graph"/"ref"/f"{ref[4:]}.json"
             subgraph = get_reference_cluster(self.graph, ref)
             data = create_graph_data(self.con, subgraph)
-            self.write(path, data)
+            yield f"graph/ref/{ref[4:]}.json", data
 
-        (out/"graph"/"tag").mkdir()
         for tag, in self.con.execute("SELECT DISTINCT tag FROM Tags"):
-            path = out/"graph"/"tag"/f"{tag[1:]}.json"
             subgraph = get_tag_cluster(self.graph, tag)
             data = create_graph_data(self.con, subgraph)
-            self.write(path, data)
+            yield f"graph/tag/{tag[1:]}.json", data
 
-        (out/"graph"/"note").mkdir()
         for component, subgraph in get_components(self.graph).items():
             data = create_graph_data(self.con, subgraph)
             for note_id in component:
-                self.write(out/"graph"/"note"/f"{note_id}.json", data)
+                yield f"graph/note/{note_id}.json", data
         self.con.commit()
 
+    def run(self, out: Path) -> None:
+        """Generate JSONs for cytoscape.js in out/graph."""
+        (out/"graph").mkdir()
+        for name in ("ref", "tag", "note"):
+            (out/"graph"/name).mkdir()
+        for path, data in self.generate():
+            self.write(out/path, data)
+
 
 def compile_site(app: App) -> None:
     """Copy files into output directory."""
@@ -165,12 +189,49 @@ def compile_site(app: App) -> None:
     con = app.database
     output_directory = app.root/app.config.output_directory
 
-    with output_directory_proxy(output_directory) as tempdir:
+    timer = app.timer
+    with output_directory_proxy(
+        output_directory,
+        app.root/".slipbox",
+    ) as tempdir:
+        with timer.phase("graph"):
+            graph = CytoscapeDataGenerator(con)
+        with timer.phase("layout"):
+            graph.run(tempdir)
+        with timer.phase("images"):
+            ImagesGenerator(con, objects_directory(app.root)).run(tempdir)
+        with timer.phase("index"):
+            IndexGenerator(app).run(tempdir)
+        with timer.phase("assets"):
+            generate_css(tempdir)
+            generate_js(tempdir)
+            generate_favicons(tempdir)
+            copy_boxicons(tempdir)
+            copy_mathjax(tempdir)
+
+
+def update_site(app: App, images: t.Iterable[str]) -> None:
+    """Regenerate files that depend on notes in the output directory.
+
+    Unlike compile_site, this updates the output directory in place and
+    leaves static assets (CSS, JS, favicons, icons and MathJax) alone.
+    Only the given images get copied.
+    If the site hasn't been compiled yet, this compiles the whole site.
+    """
+    assert app.root is not None
+    con = app.database
+    output_directory = app.root/app.config.output_directory
+    if not (output_directory/"index.html").exists():
+        compile_site(app)
+        return
+
+    with temporary_directory(app.root/".slipbox") as tempdir:
         CytoscapeDataGenerator(con).run(tempdir)
-        ImagesGenerator(con).run(tempdir)
         IndexGenerator(app).run(tempdir)
-        generate_css(tempdir)
-        generate_js(tempdir)
-        generate_favicons(tempdir)
-        copy_boxicons(tempdir)
-        copy_mathjax(tempdir)
+        rmtree(output_directory/"graph", ignore_errors=True)
+        move(str(tempdir/"graph"), str(output_directory/"graph"))
+        move(str(tempdir/"index.html"), str(output_directory/"index.html"))
+    ImagesGenerator(con, objects_directory(app.root)).run(
+        output_directory,
+        images,
+    )
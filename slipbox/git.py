@@ -0,0 +1,66 @@
+"""Find notes and detect changes using the git index.
+
+Used when the build discovery config is set to "git". All functions
+return None if the slipbox isn't inside a git work tree, so that the
+caller can fall back to walking the file system.
+"""
+
+from pathlib import Path
+import subprocess
+import typing as t
+
+
+def run_git(root: Path, *args: str) -> t.Optional[bytes]:
+    """Run git command in root and return its output, or None on error."""
+    try:
+        proc = subprocess.run(
+            ["git", *args],
+            cwd=root,
+            check=False,
+            capture_output=True,
+        )
+    except OSError:
+        return None
+    return None if proc.returncode else proc.stdout
+
+
+def split_paths(output: bytes) -> t.List[str]:
+    """Split NUL-separated output of git command."""
+    return [path.decode() for path in output.split(b"\0") if path]
+
+
+def list_files(root: Path) -> t.Optional[t.List[str]]:
+    """List tracked and untracked (but not ignored) files in root.
+
+    Deleted files are left out. Paths are relative to root.
+    """
+    files = run_git(root, "ls-files", "-z", "--cached", "--others",
+                    "--exclude-standard")
+    deleted = run_git(root, "ls-files", "-z", "--deleted")
+    if files is None or deleted is None:
+        return None
+    missing = set(split_paths(deleted))
+    return [path for path in split_paths(files) if path not in missing]
+
+
+def clean_files(root: Path) -> t.Optional[t.Dict[str, str]]:
+    """Return blob IDs of tracked files in root that match the index.
+
+    Files that might differ from the index (according to the stat info
+    cached in the index) and unmerged files are left out.
+    Paths are relative to root.
+    """
+    staged = run_git(root, "ls-files", "-z", "--stage")
+    dirty = run_git(root, "diff-files", "-z", "--name-only", "--relative")
+    if staged is None or dirty is None:
+        return None
+
+    modified = set(split_paths(dirty))
+    oids = {}
+    for entry in split_paths(staged):
+        info, _, path = entry.partition("\t")
+        mode, oid, stage = info.split()
+        # Skip submodules and unmerged files.
+        if mode != "160000" and stage == "0" and path not in modified:
+            oids[path] = oid
+    return oids
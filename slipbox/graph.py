@@ -8,12 +8,16 @@ import typing as t
 import networkx as nx   # type: ignore
 from pyquery import PyQuery     # type: ignore
 
+from .database import decode_html
 from .serializer import serialize
 
 
-def extract_title(html: str) -> str:
-    """Extract note title from its HTML."""
-    doc = PyQuery(html)
+def extract_title(html: t.Union[str, bytes]) -> str:
+    """Extract note title from its HTML.
+
+    html may be compressed (see decode_html).
+    """
+    doc = PyQuery(decode_html(html))
     title = doc("h1:first").outer_html()
     return t.cast(str, title)
 
@@ -153,7 +157,7 @@ def create_reference_graph(con: Connection) -> nx.Graph:
     for ref, title in con.execute(query):
         # Strip "ref-" prefix.
         ref = ref[4:]
-        graph.add_node(ref, title=title, path=f"ref-{ref}")
+        graph.add_node(ref, title=decode_html(title), path=f"ref-{ref}")
 
     # Add edges.
     for (ref_a, ref_b), count in counter.most_common():
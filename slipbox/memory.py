@@ -0,0 +1,221 @@
+"""Sample memory usage of slipbox and its subprocesses.
+
+Memory usage is measured as resident set size (RSS), so that memory used
+by C extensions (e.g. lxml) and by subprocesses (pandoc, dot) gets
+counted. On Linux, RSS is read from /proc. Elsewhere, only the peak RSS
+reported by getrusage is available.
+"""
+
+import _thread
+import os
+from pathlib import Path
+import signal
+import threading
+import typing as t
+
+from .utils import kill_commands
+
+try:
+    import resource
+except ImportError:     # pragma: no cover
+    resource = None     # type: ignore
+
+PROC = Path("/proc")
+
+# Seconds between samples.
+DEFAULT_INTERVAL = 0.1
+
+
+def read_rss(pid: t.Union[int, str] = "self") -> int:
+    """Return RSS of process in bytes.
+
+    Raises OSError if the process doesn't exist or if /proc isn't
+    available.
+    """
+    statm = (PROC/str(pid)/"statm").read_text()
+    return int(statm.split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def descendants(pid: int) -> t.List[int]:
+    """Return PIDs of processes started by process pid (recursively)."""
+    children: t.Dict[int, t.List[int]] = {}
+    for path in PROC.iterdir():
+        if not path.name.isdigit():
+            continue
+        try:
+            stat = (path/"stat").read_text()
+        except OSError:
+            continue
+        # The second field (command name) can contain spaces.
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(path.name))
+
+    result = []
+    stack = list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        result.append(child)
+        stack.extend(children.get(child, []))
+    return result
+
+
+def peak_rusage() -> t.Tuple[int, int]:
+    """Return peak RSS in bytes of slipbox and of its finished
+    subprocesses according to getrusage.
+    """
+    if resource is None:
+        return 0, 0
+    scale = 1 if os.uname().sysname == "Darwin" else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    )
+
+
+def current_usage() -> t.Tuple[int, int]:
+    """Return RSS in bytes of slipbox and the total RSS of its
+    subprocesses.
+    """
+    try:
+        rss = read_rss()
+    except OSError:
+        return peak_rusage()
+
+    children = 0
+    for pid in descendants(os.getpid()):
+        try:
+            children += read_rss(pid)
+        except OSError:
+            pass
+    return rss, children
+
+
+def interrupt_main() -> None:
+    """Raise KeyboardInterrupt in the main thread.
+
+    Sends SIGINT to the main thread where possible, so that blocking calls
+    in the main thread get interrupted too.
+    """
+    ident = threading.main_thread().ident
+    if hasattr(signal, "pthread_kill") and ident is not None:
+        signal.pthread_kill(ident, signal.SIGINT)
+    else:
+        _thread.interrupt_main()
+
+
+class Watermark:
+    """Peak memory usage while a phase runs."""
+    def __init__(self, name: str):
+        self.name = name
+        self.rss = 0
+        self.children = 0
+        self.finished = peak_rusage()[1]
+
+    def update(self, rss: int, children: int) -> None:
+        """Update peaks."""
+        self.rss = max(self.rss, rss)
+        self.children = max(self.children, children)
+
+
+class MemoryLimitError(Exception):
+    """Raised when memory usage exceeds the limit."""
+
+
+class MemorySampler:
+    """Samples memory usage in a background thread.
+
+    If limit (in bytes) is positive and the total RSS of slipbox and its
+    subprocesses exceeds it, commands started by run_command get killed,
+    the main thread gets interrupted, and the next phase check raises
+    MemoryLimitError.
+    Killing the commands keeps threads that wait for pandoc from delaying
+    the interrupted build.
+    """
+    def __init__(self, limit: int = 0, interval: float = DEFAULT_INTERVAL):
+        self.limit = limit
+        self.last = (0, 0)
+        self.watermarks: t.List[Watermark] = []
+        self.exceeded: t.Optional[str] = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(interval,),
+            daemon=True,
+        )
+
+    def sample(self) -> None:
+        """Update watermarks of running phases and check limit."""
+        rss, children = current_usage()
+        with self.lock:
+            self.last = (rss, children)
+            for watermark in self.watermarks:
+                watermark.update(rss, children)
+            if self.limit <= 0 or rss + children <= self.limit:
+                return
+            if self.exceeded is not None:
+                return
+            phase = self.watermarks[-1].name if self.watermarks else "build"
+            self.exceeded = (
+                f"memory limit exceeded during {phase}: "
+                f"{format_mib(rss)} MiB used by slipbox and "
+                f"{format_mib(children)} MiB by subprocesses "
+                f"(memory-limit = {format_mib(self.limit)} MiB)"
+            )
+        kill_commands()
+        if threading.current_thread() is not threading.main_thread():
+            interrupt_main()
+
+    def check(self) -> None:
+        """Raise MemoryLimitError if the limit has been exceeded."""
+        if self.exceeded is not None:
+            raise MemoryLimitError(self.exceeded)
+
+    def enter(self, name: str) -> Watermark:
+        """Start tracking peak usage of phase.
+
+        The watermark starts at the last sample, so that phases shorter
+        than the sampling interval still get a value.
+        """
+        self.check()
+        watermark = Watermark(name)
+        with self.lock:
+            watermark.update(*self.last)
+            self.watermarks.append(watermark)
+        return watermark
+
+    def exit(self, watermark: Watermark) -> None:
+        """Stop tracking peak usage of phase.
+
+        Subprocesses that finish between samples get missed by the
+        sampler. If one of them sets a new peak, it gets counted using
+        getrusage, but only if it's larger than the peak RSS of slipbox,
+        because on Linux the peak of a subprocess also includes the
+        memory of slipbox at the time the subprocess was started.
+        """
+        peak, finished = peak_rusage()
+        with self.lock:
+            self.watermarks.remove(watermark)
+            if finished > max(watermark.finished, peak):
+                watermark.update(0, finished)
+
+    def run(self, interval: float) -> None:
+        """Take samples every interval (in seconds) until stopped."""
+        while not self.stopped.wait(interval):
+            self.sample()
+
+    def start(self) -> None:
+        """Start sampling."""
+        self.sample()
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+
+def format_mib(size: int) -> str:
+    """Format size in bytes as MiB."""
+    return f"{size / 2**20:.1f}"
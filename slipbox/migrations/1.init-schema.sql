@@ -1,4 +1,3 @@
-BEGIN TRANSACTION;
 PRAGMA user_version = 1;
 
 CREATE TABLE Files (
@@ -85,5 +84,3 @@ CREATE VIEW Untagged AS
 SELECT * FROM Notes WHERE id NOT IN (
     SELECT id FROM StronglyTagged UNION SELECT id FROM WeaklyTagged
 );
-
-COMMIT;
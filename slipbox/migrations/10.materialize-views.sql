@@ -0,0 +1,47 @@
+PRAGMA user_version = 10;
+
+-- ValidLinks, StronglyTagged and WeaklyTagged used to be views that got
+-- re-evaluated with nested subqueries on every read. They're now tables
+-- that get refreshed after notes change (see database.refresh_views).
+
+DROP VIEW Untagged;
+DROP VIEW WeaklyTagged;
+DROP VIEW OutTagged;
+DROP VIEW InTagged;
+DROP VIEW StronglyTagged;
+DROP VIEW ValidLinks;
+
+-- Links whose dest is in Notes.
+CREATE TABLE ValidLinks (
+    src NOT NULL,
+    dest NOT NULL,
+    direction
+);
+
+CREATE INDEX ValidLinksBySrc ON ValidLinks (src);
+CREATE INDEX ValidLinksByDest ON ValidLinks (dest);
+
+-- Notes with tags.
+CREATE TABLE StronglyTagged (
+    id PRIMARY KEY
+);
+
+-- Notes that link to or are linked from strongly tagged notes.
+CREATE TABLE WeaklyTagged (
+    id PRIMARY KEY
+);
+
+CREATE VIEW Untagged AS
+SELECT * FROM Notes
+    WHERE id NOT IN (SELECT id FROM StronglyTagged)
+        AND id NOT IN (SELECT id FROM WeaklyTagged);
+
+INSERT INTO ValidLinks (src, dest, direction)
+    SELECT src, dest, direction FROM Links JOIN Notes ON dest = id;
+
+INSERT INTO StronglyTagged (id) SELECT DISTINCT id FROM Tags;
+
+INSERT INTO WeaklyTagged (id)
+    SELECT dest FROM Links JOIN StronglyTagged ON src = id
+    UNION
+    SELECT src FROM Links JOIN StronglyTagged ON dest = id;
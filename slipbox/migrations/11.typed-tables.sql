@@ -0,0 +1,121 @@
+PRAGMA user_version = 11;
+
+-- Rebuild Notes with an INTEGER PRIMARY KEY, so that note IDs are rowid
+-- aliases instead of keys in a separate index, and rebuild the tables that
+-- refer to notes with typed columns.
+-- Tags, Links, Citations and ImageLinks are clustered on their primary keys
+-- (WITHOUT ROWID), so lookups by note don't need an extra index.
+-- Not STRICT, because STRICT tables need SQLite 3.37.
+
+DROP VIEW Untagged;
+
+CREATE TABLE NewNotes (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    filename TEXT NOT NULL REFERENCES Files ON DELETE CASCADE,
+    html TEXT
+);
+
+INSERT INTO NewNotes (id, title, filename, html)
+    SELECT id, title, filename, html FROM Notes;
+
+DROP TABLE Notes;
+ALTER TABLE NewNotes RENAME TO Notes;
+
+CREATE INDEX NotesByFilename ON Notes (filename);
+
+CREATE TABLE NewTags (
+    tag TEXT NOT NULL,
+    id INTEGER NOT NULL REFERENCES Notes ON DELETE CASCADE,
+    PRIMARY KEY (tag, id)
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO NewTags (tag, id) SELECT tag, id FROM Tags;
+
+DROP TABLE Tags;
+ALTER TABLE NewTags RENAME TO Tags;
+
+CREATE INDEX TagsById ON Tags (id);
+
+CREATE TABLE NewLinks (
+    src INTEGER NOT NULL REFERENCES Notes ON DELETE CASCADE,
+    dest INTEGER NOT NULL,  -- not an fk to keep backlink when dest gets
+                            -- deleted and to allow notes to get scanned
+                            -- incrementally
+                            -- ValidLinks gets subset with valid dest
+                            -- dest == -1 means src contains an empty link.
+    direction TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (src, dest, direction)
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO NewLinks (src, dest, direction)
+    SELECT src, dest, coalesce(direction, '') FROM Links;
+
+DROP TABLE Links;
+ALTER TABLE NewLinks RENAME TO Links;
+
+CREATE INDEX LinksByDest ON Links (dest);
+
+CREATE TABLE NewCitations (
+    note INTEGER NOT NULL REFERENCES Notes ON DELETE CASCADE,
+    reference TEXT NOT NULL REFERENCES Bibliography ON DELETE RESTRICT,
+    PRIMARY KEY (note, reference)
+) WITHOUT ROWID;
+
+INSERT INTO NewCitations (note, reference)
+    SELECT note, reference FROM Citations;
+
+DROP TABLE Citations;
+ALTER TABLE NewCitations RENAME TO Citations;
+
+CREATE INDEX CitationsByReference ON Citations (reference);
+
+CREATE TABLE NewImageLinks (
+    note INTEGER NOT NULL REFERENCES Notes ON DELETE CASCADE,
+    image TEXT NOT NULL REFERENCES Images ON DELETE CASCADE,
+    PRIMARY KEY (note, image)
+) WITHOUT ROWID;
+
+INSERT INTO NewImageLinks (note, image) SELECT note, image FROM ImageLinks;
+
+DROP TABLE ImageLinks;
+ALTER TABLE NewImageLinks RENAME TO ImageLinks;
+
+CREATE INDEX ImageLinksByImage ON ImageLinks (image);
+
+-- Tables that replaced views also get rebuilt, since they're only caches.
+DROP TABLE ValidLinks;
+DROP TABLE StronglyTagged;
+DROP TABLE WeaklyTagged;
+
+CREATE TABLE ValidLinks (
+    src INTEGER NOT NULL,
+    dest INTEGER NOT NULL,
+    direction TEXT NOT NULL
+);
+
+CREATE INDEX ValidLinksBySrc ON ValidLinks (src);
+CREATE INDEX ValidLinksByDest ON ValidLinks (dest);
+
+CREATE TABLE StronglyTagged (
+    id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE WeaklyTagged (
+    id INTEGER PRIMARY KEY
+);
+
+INSERT INTO ValidLinks (src, dest, direction)
+    SELECT src, dest, direction FROM Links JOIN Notes ON dest = id;
+
+INSERT INTO StronglyTagged (id) SELECT DISTINCT id FROM Tags;
+
+INSERT INTO WeaklyTagged (id)
+    SELECT dest FROM Links JOIN StronglyTagged ON src = id
+    UNION
+    SELECT src FROM Links JOIN StronglyTagged ON dest = id;
+
+CREATE VIEW Untagged AS
+SELECT * FROM Notes
+    WHERE id NOT IN (SELECT id FROM StronglyTagged)
+        AND id NOT IN (SELECT id FROM WeaklyTagged);
@@ -1,6 +1,3 @@
-BEGIN TRANSACTION;
 PRAGMA user_version = 2;
 
 DROP TABLE Meta;
-
-COMMIT;
@@ -0,0 +1,6 @@
+PRAGMA user_version = 4;
+
+-- Cached stat info. Files are only rehashed when these change.
+ALTER TABLE Files ADD COLUMN mtime_ns;
+ALTER TABLE Files ADD COLUMN size;
+ALTER TABLE Files ADD COLUMN inode;
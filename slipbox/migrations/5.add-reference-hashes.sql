@@ -0,0 +1,14 @@
+PRAGMA user_version = 5;
+
+-- Hashes of the bibliography and CSL files used in the last build.
+CREATE TABLE Resources (
+    name PRIMARY KEY,   -- 'bibliography' or 'csl'
+    hash NOT NULL
+);
+
+-- Hashes of bibliography entries (CSL JSON) by citation key.
+-- Used to find out which keys changed when the bibliography gets edited.
+CREATE TABLE ReferenceHashes (
+    key PRIMARY KEY,
+    hash NOT NULL
+);
@@ -0,0 +1,9 @@
+PRAGMA user_version = 6;
+
+-- Note files that pandoc failed to scan, and their content hash at the
+-- time. Until they change, these get scanned on their own, so they don't
+-- fail the rest of their batch.
+CREATE TABLE FailedScans (
+    filename PRIMARY KEY,
+    hash NOT NULL
+);
@@ -0,0 +1,22 @@
+PRAGMA user_version = 7;
+
+-- Image contents are now stored in .slipbox/objects/<sha256>.
+-- Notes that link to images get rescanned, so that their images get added
+-- into the object store.
+UPDATE Files SET hash = NULL, mtime_ns = NULL WHERE filename IN (
+    SELECT filename FROM Notes JOIN ImageLinks ON id = note
+);
+
+DROP TABLE ImageLinks;
+DROP TABLE Images;
+
+CREATE TABLE Images (
+    filename PRIMARY KEY,
+    hash NOT NULL   -- SHA-256 digest of contents (see objects.py)
+);
+
+CREATE TABLE ImageLinks (
+    note NOT NULL REFERENCES Notes ON DELETE CASCADE,
+    image NOT NULL REFERENCES Images ON DELETE CASCADE,
+    PRIMARY KEY(note, image)
+);
@@ -0,0 +1,6 @@
+PRAGMA user_version = 8;
+
+-- Git blob ID of files that matched the git index when they were last
+-- checked (only with the git discovery config). Files with the same blob
+-- ID in the index don't need to be checked again.
+ALTER TABLE Files ADD COLUMN oid;
@@ -0,0 +1,11 @@
+PRAGMA user_version = 9;
+
+-- Indexes for joins, lookups and ON DELETE CASCADE checks on columns that
+-- aren't the first column of a primary key.
+CREATE INDEX NotesByFilename ON Notes (filename);
+CREATE INDEX TagsByTag ON Tags (tag);
+CREATE INDEX TagsById ON Tags (id);
+CREATE INDEX LinksBySrc ON Links (src);
+CREATE INDEX LinksByDest ON Links (dest);
+CREATE INDEX CitationsByReference ON Citations (reference);
+CREATE INDEX ImageLinksByImage ON ImageLinks (image);
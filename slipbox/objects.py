@@ -0,0 +1,84 @@
+"""Content-addressed store of image files.
+
+Images linked from notes are copied into .slipbox/objects/<sha256>, so
+that the database only needs to store their hashes, and identical images
+get stored once. Objects get hardlinked (or reflinked) into the output
+directory when possible, so unchanged images don't have to be copied.
+"""
+
+from hashlib import sha256
+import os
+from pathlib import Path
+from shutil import copyfile
+from sqlite3 import Connection
+import sys
+
+# See ioctl_ficlone(2).
+FICLONE = 0x40049409
+
+
+def objects_directory(root: Path) -> Path:
+    """Return path to object store of slipbox in root."""
+    return root/".slipbox"/"objects"
+
+
+def store_object(directory: Path, path: Path) -> str:
+    """Copy file into object store directory and return its hash."""
+    content = path.read_bytes()
+    digest = sha256(content).hexdigest()
+    obj = directory/digest
+    if not obj.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        temp = obj.with_suffix(".tmp")
+        temp.write_bytes(content)
+        temp.replace(obj)
+    return digest
+
+
+def reflink(source: Path, dest: Path) -> bool:
+    """Create copy-on-write clone of source in dest (Linux only).
+
+    Returns False if the file system doesn't support it.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl    # pylint: disable=import-outside-toplevel
+    try:
+        with open(source, "rb") as src, open(dest, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        dest.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def link_file(source: Path, dest: Path) -> None:
+    """Make dest have the same contents as source.
+
+    Tries to hardlink source, then to reflink it, before copying it.
+    Does nothing if dest is already a hardlink to source.
+    """
+    try:
+        if dest.samefile(source):
+            return
+    except OSError:
+        pass
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(source, dest)
+        return
+    except OSError:
+        pass
+    if not reflink(source, dest):
+        copyfile(source, dest)
+
+
+def prune_objects(conn: Connection, root: Path) -> None:
+    """Delete objects that aren't used by any image in the database."""
+    directory = objects_directory(root)
+    if not directory.is_dir():
+        return
+    used = {digest for digest, in conn.execute("SELECT hash FROM Images")}
+    for path in directory.iterdir():
+        if path.name not in used:
+            path.unlink(missing_ok=True)
@@ -10,6 +10,8 @@ import typing as t
 from pyquery import PyQuery as pq  # type: ignore
 
 from .app import App
+from .database import decode_html
+from .pandoc_server import convert
 from .templates import Elem, render, render_template
 from .utils import temporary_directory
 
@@ -45,10 +47,14 @@ def note_list(notes: t.Iterable[Note]) -> str:
     return render_template("list.html", items="\n".join(items)).rstrip()
 
 
-def get_section_title(html: str) -> str:
-    """Get innerHTML of section title."""
-    assert html is not None
-    doc = pq(html)
+def get_section_title(html: t.Union[str, bytes]) -> str:
+    """Get innerHTML of section title.
+
+    html may be compressed (see decode_html).
+    """
+    text = decode_html(html)
+    assert text is not None
+    doc = pq(text)
     header = doc("h1")
     return t.cast(str, header.html())
 
@@ -66,7 +72,8 @@ def render_home(conn: Connection, title: str) -> str:
 def generate_active_htmls(conn: Connection) -> t.Iterable[str]:
     """Get HTML stored in the database for active sections."""
     sql = "SELECT html FROM Notes WHERE html IS NOT NULL ORDER BY id ASC"
-    return (html.strip() for html, in conn.execute(sql))
+    for html, in conn.execute(sql):
+        yield t.cast(str, decode_html(html)).strip()
 
 
 def render_references(conn: Connection) -> str:
@@ -74,7 +81,8 @@ def render_references(conn: Connection) -> str:
     sql = "SELECT key, html FROM Bibliography ORDER BY key"
     items = '\n'.join(
         render_template("bibliography__item.html", **dict(
-            href=f"#{key}", term=f"[@{key[4:]}]", description=html
+            href=f"#{key}", term=f"[@{key[4:]}]",
+            description=decode_html(html),
         )).strip()
         for key, html in conn.execute(sql)
     )
@@ -157,7 +165,7 @@ def render_reference_page(conn: Connection, reference: str) -> str:
         notes.append(Note(note, get_section_title(html)))
     section = Elem("section",
                    Elem("h1", '@' + reference[4:]),
-                   Elem("p", text),
+                   Elem("p", decode_html(text) or ""),
                    note_list(notes),
                    id=reference,
                    title=reference,
@@ -172,13 +180,20 @@ def render_reference_pages(conn: Connection) -> str:
     return '\n'.join(render_reference_page(conn, ref) for ref in references)
 
 
-def render_main(conn: Connection, title: str = "Slipbox") -> str:
-    """Main content of index.html."""
+def render_main(conn: Connection,
+                title: str = "Slipbox",
+                sections: t.Optional[str] = None) -> str:
+    """Main content of index.html.
+
+    If sections is set, it gets used instead of the HTML of the notes.
+    """
+    if sections is None:
+        sections = "\n".join(generate_active_htmls(conn))
     return render_template(
         "main.html",
         nav=render_template("nav.html"),
         home=render_home(conn, title),
-        sections="\n".join(generate_active_htmls(conn)),
+        sections=sections,
         tag_pages=render_tag_pages(conn),
         tags=render_tags(conn),
         reference_pages=render_reference_pages(conn),
@@ -186,13 +201,66 @@ def render_main(conn: Connection, title: str = "Slipbox") -> str:
     )
 
 
+def write_main(file: t.TextIO,
+               conn: Connection,
+               title: str = "Slipbox") -> None:
+    """Write main content of index.html (see render_main) into file.
+
+    Note sections get decompressed and written one at a time, instead of
+    getting joined in memory.
+    """
+    placeholder = "\0sections\0"
+    before, after = render_main(conn, title, placeholder).split(placeholder)
+    file.write(before)
+    for index, html in enumerate(generate_active_htmls(conn)):
+        if index:
+            file.write("\n")
+        file.write(html)
+    file.write(after)
+
+
 def _write(path: Path, text: str) -> None:
     """Write text to file in path."""
     path.write_text(text, encoding="utf-8")
 
 
+def generate_index_with_server(app: App, out: Path) -> bool:
+    """Create index.html using the pandoc server in the config.
+
+    Returns False if the server is unavailable.
+    """
+    url = app.config.pandoc_server
+    if not url:
+        return False
+
+    title = app.config.title
+    html = convert(url, {
+        "text": render_dummy(title),
+        "from": "markdown",
+        "to": "html",
+        "standalone": True,
+        "section-divs": True,
+        "metadata": {"title": title},
+        "variables": {
+            "css": ["slipbox.css"],
+            "header-includes": render_template("header.html"),
+            "include-after": render_main(app.database, title),
+        },
+    })
+    if html is None:
+        return False
+    _write(out/"index.html", html)
+    return True
+
+
 def generate_index(app: App, out: Path) -> None:
-    """Create final HTML file with javascript."""
+    """Create final HTML file with javascript.
+
+    Uses the pandoc server in the config if it's available.
+    """
+    if generate_index_with_server(app, out):
+        return
+
     con = app.database
     options = "-s"
     title = app.config.title
@@ -200,7 +268,8 @@ def generate_index(app: App, out: Path) -> None:
     with temporary_directory() as tempdir:
         _write(tempdir/"header.txt", render_template("header.html"))
         _write(tempdir/"Slipbox.md", render_dummy(title))
-        _write(tempdir/"after.txt", render_main(con, title))
+        with open(tempdir/"after.txt", "w", encoding="utf-8") as file:
+            write_main(file, con, title)
 
         cmd = """{pandoc} Slipbox.md -Hheader.txt --metadata title:{title}
                 -Aafter.txt --section-divs {opts} -o {output} -c slipbox.css
@@ -0,0 +1,47 @@
+"""Client for `pandoc server`.
+
+Running conversions on a long-lived pandoc server avoids spawning a pandoc
+process per conversion. The server doesn't support Lua filters, so it can
+only be used for conversions that don't need the slipbox filter.
+"""
+
+import json
+import typing as t
+from urllib.request import Request, urlopen
+
+from .utils import show_error
+
+
+def convert(url: str,
+            options: t.Dict[str, t.Any],
+            timeout: float = 60,
+            ) -> t.Optional[str]:
+    """Convert document using the pandoc server at url.
+
+    options is the JSON request body (see the pandoc-server manual).
+    Returns None if the server can't be reached or if the conversion fails,
+    so that the caller can fall back to running pandoc directly.
+    """
+    request = Request(
+        url,
+        data=json.dumps(options).encode("utf-8"),
+        headers={
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        },
+        method="POST",
+    )
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read().decode("utf-8"))
+    except (OSError, ValueError) as exc:
+        show_error("warning", f"pandoc server failed ({exc}); running pandoc")
+        return None
+
+    if not isinstance(result, dict) or result.get("base64"):
+        return None
+    output = result.get("output")
+    return output if isinstance(output, str) else None
+
+
+__all__ = ["convert"]
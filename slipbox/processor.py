@@ -5,20 +5,27 @@ They are mainly used to pass note metadata to Pandoc filters even when
 the input is the concatenation of several files.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from hashlib import sha256
+from itertools import repeat
+import json
+import os
 from pathlib import Path
 import shlex
 from sqlite3 import Connection
-import sys
+import time
 import typing as t
 
 from lxml.html import HtmlElement  # type: ignore
 from pyquery import PyQuery  # type: ignore
 
-from . import utils
+from . import cache, utils
 from .app import App
-from .batch import Batch
-from .data import process_csvs
+from .batch import Batch, split_batch
+from .data import insert_tables, read_csvs, read_ndjson, ScanResult
+from .database import encode_html
+from .objects import objects_directory
 
 
 DOKUWIKI_TEMPLATE = """
@@ -99,51 +106,91 @@ def preprocess(template: str,
                *sources: Path,
                basedir: Path,
                prefix: str = "",
+               digests: t.Optional[t.Mapping[Path, str]] = None,
                ) -> str:
     """Preprocess notes (sources) by inserting code blocks generated
     using the template.
+
+    digests: content hashes of sources that were already computed
     """
     def preprocess_single(source: Path) -> str:
         """Preprocess a single file."""
         content = source.read_bytes()
         filename = str(source.relative_to(basedir))
-        _hash = sha256(content).hexdigest()
+        _hash = (digests or {}).get(source) or sha256(content).hexdigest()
         metadata = render_metadata(template, prefix, filename=filename,
                                    hash=_hash)
         return metadata + content.decode(encoding="utf-8")
     return "".join(preprocess_single(source) for source in sources)
 
 
-def store_html(conn: Connection,
-               html: str,
-               sources: t.Sequence[Path]) -> None:
-    """Insert HTML sections into Notes table."""
-    if not html.strip() or not sources:
-        return
-    cur = conn.cursor()
-    sql = "UPDATE Notes SET html = ? WHERE id = ?"
+def parse_sections(html: str) -> t.Dict[int, str]:
+    """Extract HTML sections of notes from pandoc output."""
+    sections: t.Dict[int, str] = {}
+    if not html.strip():
+        return sections
 
     def callback(_: int, elem: HtmlElement) -> None:
         id_ = elem.get("id", "")
         if id_.isdigit():
-            cur.execute(sql, (PyQuery(elem).outer_html(), int(id_)))
+            sections[int(id_)] = PyQuery(elem).outer_html()
 
     doc = PyQuery(html)
-    sections = doc("section")
-    sections.map(callback)
+    doc("section").map(callback)
+    return sections
+
+
+def store_html(conn: Connection,
+               sections: t.Mapping[int, str],
+               compression: str = "none") -> None:
+    """Insert HTML sections into Notes table.
+
+    compression: see encode_html
+    """
+    sql = "UPDATE Notes SET html = ? WHERE id = ?"
+    conn.executemany(sql, (
+        (encode_html(html, compression), id_)
+        for id_, html in sections.items()
+    ))
+
+
+def store_file_stats(conn: Connection,
+                     stats: t.Mapping[str, utils.FileStat],
+                     checked_ns: int) -> None:
+    """Save stat info of scanned files into Files table.
+
+    checked_ns is the time before the files were read.
+    """
+    sql = """
+        UPDATE Files SET mtime_ns = ?, size = ?, inode = ? WHERE filename = ?
+    """
+    conn.executemany(
+        sql,
+        (
+            (*utils.cacheable_stat(stat, checked_ns), filename)
+            for filename, stat in stats.items()
+        ),
+    )
 
 
 def create_preprocessed_input(
     tempdir: Path,
     batch: Batch,
-    basedir: Path
+    basedir: Path,
+    digests: t.Optional[t.Mapping[Path, str]] = None,
 ) -> Path:
     """Create preprocessed input to be passed to Pandoc."""
     template = METADATA_TEMPLATES.get(batch.extension, MARKDOWN_TEMPLATE)
     prefix = "    " if batch.extension == ".rst" else ""
     path = tempdir/("input" + batch.extension)
     path.write_text(
-        preprocess(template, *batch.paths, basedir=basedir, prefix=prefix),
+        preprocess(
+            template,
+            *batch.paths,
+            basedir=basedir,
+            prefix=prefix,
+            digests=digests,
+        ),
         encoding="utf-8"
     )
     return path
@@ -189,6 +236,7 @@ def build_command(app: App, input_: Path, output: str) -> str:
     lua_filter = shlex.quote(str((data/"filter.lua").resolve()))
     cmd = f"{app.config.pandoc} {options} -L{lua_filter} --section-divs " \
         f" -Mlink-citations:true --mathjax " \
+        f" -Mslipbox-scan-format:{shlex.quote(app.config.scan_format)} " \
         "--resource-path {} -o {} --extract-media=''".format(
             shlex.quote(str(basedir.resolve())),
             shlex.quote(output),
@@ -196,26 +244,313 @@ def build_command(app: App, input_: Path, output: str) -> str:
     return cmd + ' ' + shlex.quote(str(input_.resolve()))
 
 
-def process_batch(app: App, batch: Batch) -> bool:
-    """Process batch of input notes.
+def scan_batch(app: App,
+               batch: Batch,
+               tempdir: Path,
+               digests: t.Optional[t.Mapping[Path, str]] = None) -> bool:
+    """Run pandoc and the slipbox filter on batch inside tempdir.
 
+    Doesn't touch the database, so it's safe to run in worker threads.
+    Pandoc output isn't shown if the scan of several files fails, because
+    those files get scanned again in smaller shards.
     Returns False on error.
+
+    digests: content hashes of note files that were already computed
     """
     assert app.root is not None
-    with utils.temporary_directory() as tempdir:
-        preprocessed = create_preprocessed_input(tempdir, batch, app.root)
-        html = tempdir/"temp.html"
-        cmd = build_command(app, preprocessed, str(html))
-        retcode = utils.run_command(cmd, cwd=tempdir)
-        if retcode:
-            print("Scan failed.", file=sys.stderr)
-            return False
+    try:
+        preprocessed = create_preprocessed_input(
+            tempdir,
+            batch,
+            app.root,
+            digests,
+        )
+    except UnicodeDecodeError as exc:
+        if len(batch.paths) == 1:
+            utils.show_error("error", str(exc))
+        return False
+    cmd = build_command(app, preprocessed, str(tempdir/"temp.html"))
+    with app.timer.phase("pandoc"):
+        retcode = utils.run_command(
+            cmd,
+            quiet_on_error=len(batch.paths) > 1,
+            cwd=tempdir,
+        )
+    return not retcode
 
-        if app.error_formatter.add_errors(tempdir/"messages.json"):
-            return False
 
-        if not process_csvs(app.database, tempdir):
+def read_scan_result(tempdir: Path) -> ScanResult:
+    """Read results of scan_batch in tempdir.
+
+    The filter writes either scan.ndjson or CSV files and messages.json,
+    depending on the scan-format config.
+    """
+    html = (tempdir/"temp.html").read_text(encoding="utf-8")
+    scan = tempdir/"scan.ndjson"
+    if scan.exists():
+        tables, messages = read_ndjson(scan)
+        return ScanResult(tables, parse_sections(html), messages)
+
+    messages = json.loads(
+        (tempdir/"messages.json").read_text(encoding="utf-8"),
+    )
+    return ScanResult(read_csvs(tempdir), parse_sections(html), messages)
+
+
+def ingest_scan_result(app: App, result: ScanResult, basedir: Path) -> bool:
+    """Save scan result into the database.
+
+    Images are read from basedir and stored in the object store.
+    Returns False on error.
+    """
+    assert app.root is not None
+    errors = [app.error_formatter.add_error(m) for m in result.messages]
+    if any(errors):
+        return False
+
+    objects = objects_directory(app.root)
+    with app.timer.phase("ingest"):
+        if not insert_tables(app.database,
+                             result.tables,
+                             basedir,
+                             objects,
+                             app.config.html_compression):
             return False
-        store_html(app.database, html.read_text(encoding="utf-8"), batch.paths)
-        app.database.commit()
+    with app.timer.phase("store_html"):
+        store_html(app.database,
+                   result.sections,
+                   app.config.html_compression)
     return True
+
+
+def resolve_jobs(app: App) -> int:
+    """Return number of pandoc processes to run in parallel.
+
+    The --jobs option overrides the config. Zero means one per CPU core.
+    """
+    jobs = app.args.get("jobs")
+    if jobs is None:
+        jobs = app.config.jobs
+    return max(1, int(jobs) or os.cpu_count() or 1)
+
+
+class BatchResult(t.NamedTuple):
+    """Result of process_batch."""
+    is_ok: bool     # False on errors that should abort the build
+    failed: t.List[Path]    # Files that pandoc failed to scan
+
+
+def check_scan_options(app: App, extension: str) -> bool:
+    """Check if pandoc can scan an empty note with the current options.
+
+    If it can't (e.g. because of a missing bibliography or an invalid
+    pandoc option), then every scan fails, and there's no point in looking
+    for the notes that fail.
+    Returns False on error.
+    """
+    with utils.temporary_directory() as tempdir:
+        if scan_batch(app, Batch(extension, ()), tempdir):
+            return True
+    utils.show_error(
+        "error",
+        "Scan failed even without notes. Check the pandoc options.",
+    )
+    return False
+
+
+def save_scan_result(app: App, tempdir: Path, context: str) -> bool:
+    """Save results of scan_batch in tempdir into the database and the
+    cache.
+
+    Returns False on error.
+    """
+    with app.timer.phase("parse"):
+        scan = read_scan_result(tempdir)
+    if not ingest_scan_result(app, scan, tempdir):
+        return False
+    with app.timer.phase("cache"):
+        for entry in cache.split_scan_result(scan):
+            cache.save_entry(app, context, entry)
+    return True
+
+
+def scan_shards(app: App,
+                shards: t.Sequence[Batch],
+                context: str,
+                digests: t.Mapping[Path, str],
+                checked: bool = False) -> BatchResult:
+    """Scan shards in parallel and save the results into the database and
+    the cache.
+
+    At most resolve_jobs(app) shards get scanned at a time.
+    Shards that fail to scan get split in half and scanned again after the
+    other shards are done, until the files that fail are found. The rest
+    get saved.
+    Before the first split, the scan options get checked (see
+    check_scan_options), so that failures that affect every note abort
+    the build instead.
+
+    digests: content hashes of note files
+    checked: whether the scan options were already checked
+    """
+    assert app.root is not None
+    failed = []
+    retry = []
+    with ExitStack() as stack:
+        tempdirs = [
+            stack.enter_context(utils.temporary_directory())
+            for _ in shards
+        ]
+        with ThreadPoolExecutor(
+            max_workers=min(len(shards), resolve_jobs(app)),
+        ) as executor:
+            scans = executor.map(
+                scan_batch,
+                repeat(app),
+                shards,
+                tempdirs,
+                repeat(digests),
+            )
+            for shard, tempdir, is_ok in zip(shards, tempdirs, scans):
+                if not is_ok and len(shard.paths) == 1:
+                    failed.append(shard.paths[0])
+                    utils.show_error(
+                        "error",
+                        f"Scan failed: {failed[-1].relative_to(app.root)}",
+                    )
+                elif not is_ok:
+                    retry.append(shard)
+                elif not save_scan_result(app, tempdir, context):
+                    return BatchResult(False, failed)
+
+    if not retry:
+        return BatchResult(True, failed)
+    if not checked and not check_scan_options(app, retry[0].extension):
+        return BatchResult(False, failed)
+    result = scan_shards(
+        app,
+        [half for shard in retry for half in split_batch(shard, 2)],
+        context,
+        digests,
+        True,
+    )
+    return BatchResult(result.is_ok, failed + result.failed)
+
+
+def update_failed_scans(conn: Connection,
+                        digests: t.Mapping[str, str],
+                        failed: t.Collection[str]) -> None:
+    """Save hashes of files that failed to scan, and forget files that were
+    scanned successfully.
+
+    digests: content hashes of scanned files by filename
+    failed: filenames of files that failed to scan
+    """
+    conn.executemany(
+        "INSERT OR REPLACE INTO FailedScans (filename, hash) VALUES (?, ?)",
+        ((filename, digests[filename]) for filename in failed),
+    )
+    conn.executemany(
+        "DELETE FROM FailedScans WHERE filename = ?",
+        ((filename,) for filename in digests if filename not in failed),
+    )
+
+
+def ingest_cached_notes(app: App,
+                        context: str,
+                        digests: t.Mapping[Path, str],
+                        ) -> t.Optional[t.List[Path]]:
+    """Save cached scan results of note files into the database.
+
+    digests: content hashes of note files
+    Returns the note files that aren't in the cache, or None on error.
+    """
+    assert app.root is not None
+    misses = []
+    for path, digest in digests.items():
+        with app.timer.phase("cache"):
+            entry = cache.load_entry(app, context, digest)
+        if entry is None:
+            misses.append(path)
+            continue
+        filename = str(path.relative_to(app.root))
+        scan = cache.entry_to_scan_result(entry, filename)
+        if not ingest_scan_result(app, scan, app.root):
+            return None
+    return misses
+
+
+def shard_batch(app: App,
+                batch: Batch,
+                digests: t.Mapping[Path, str]) -> t.List[Batch]:
+    """Split batch into shards that get scanned in parallel.
+
+    Notes that failed to scan before get their own shards, so that they
+    don't make the rest of the notes fail.
+
+    digests: content hashes of note files
+    """
+    assert app.root is not None
+    known_bad = set(app.database.execute(
+        "SELECT filename, hash FROM FailedScans",
+    ))
+    bad = [
+        path for path in batch.paths
+        if (str(path.relative_to(app.root)), digests[path]) in known_bad
+    ]
+    good = tuple(path for path in batch.paths if path not in bad)
+
+    shards: t.List[Batch] = []
+    if good:
+        shards = split_batch(Batch(batch.extension, good), resolve_jobs(app))
+    shards.extend(Batch(batch.extension, (path,)) for path in bad)
+    return shards
+
+
+def process_batch(app: App, batch: Batch) -> BatchResult:
+    """Process batch of input notes.
+
+    Notes with cached scan results don't get scanned again.
+    Notes that failed to scan before get scanned on their own. The rest of
+    the batch gets split into shards that are scanned in parallel. Scan
+    results are saved into the database in order by a single writer.
+    Notes that fail to scan only get remembered in FailedScans if some of
+    the other notes succeed, because otherwise the failure probably isn't
+    caused by the notes.
+    """
+    assert app.root is not None
+    checked = time.time_ns()
+    stats = {
+        str(path.relative_to(app.root)): utils.file_stat(path)
+        for path in batch.paths
+    }
+    context = cache.scan_context(app, build_options(app))
+    digests = {path: utils.digest_file(path) for path in batch.paths}
+
+    misses = ingest_cached_notes(app, context, digests)
+    if misses is None:
+        return BatchResult(False, [])
+
+    failed: t.List[Path] = []
+    if misses:
+        result = scan_shards(
+            app,
+            shard_batch(app, Batch(batch.extension, misses), digests),
+            context,
+            digests,
+        )
+        if not result.is_ok:
+            return result
+        failed = result.failed
+        if len(failed) < len(misses):
+            update_failed_scans(
+                app.database,
+                {
+                    str(path.relative_to(app.root)): digests[path]
+                    for path in misses
+                },
+                {str(path.relative_to(app.root)) for path in failed},
+            )
+
+    store_file_stats(app.database, stats, checked)
+    return BatchResult(True, failed)
@@ -1,14 +1,22 @@
 """Tools for profiling code."""
 
+from collections import Counter
 import cProfile
 from functools import wraps
 import io
+from pathlib import Path
 import pstats
+import sys
+import threading
+from types import FrameType
 import typing as t
 
 
 AnyFn = t.Any
 
+# Seconds between stack samples.
+DEFAULT_INTERVAL = 0.005
+
 
 def profile(func: AnyFn) -> AnyFn:
     """Decorator that profiles function."""
@@ -27,3 +35,93 @@ def profile(func: AnyFn) -> AnyFn:
         print(stream.getvalue())
         return result
     return wrapper
+
+
+def frame_name(frame: FrameType) -> str:
+    """Return name of frame in collapsed stacks."""
+    code = frame.f_code
+    name = f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+    return name.replace(";", ":")
+
+
+def collapse_stack(frame: t.Optional[FrameType]) -> t.List[str]:
+    """Return names of frames in stack, starting from the outermost."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class StackSampler:
+    """Samples stacks of all threads in a background thread.
+
+    The samples are counted in the collapsed stack format used by flame
+    graph tools: one line per stack, with frames separated by semicolons
+    and followed by the number of samples.
+    """
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples: t.Counter[str] = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self) -> None:
+        """Count current stacks of other threads."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        current = threading.get_ident()
+        # pylint: disable=protected-access
+        for ident, frame in sys._current_frames().items():
+            if ident != current:
+                stack = [names.get(ident, str(ident))]
+                stack.extend(collapse_stack(frame))
+                self.samples[";".join(stack)] += 1
+
+    def run(self) -> None:
+        """Take samples until stopped."""
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self) -> None:
+        """Start sampling."""
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self.stopped.set()
+        self.thread.join()
+
+    def save(self, path: Path) -> None:
+        """Save samples in collapsed stack format."""
+        lines = (f"{stack} {count}\n" for stack, count in self.samples.items())
+        path.write_text("".join(lines), encoding="utf-8")
+
+
+def profile_call(func: t.Callable[[], t.Any],
+                 path: Path,
+                 interval: float = DEFAULT_INTERVAL) -> t.Any:
+    """Profile function call.
+
+    Saves cProfile stats of the calling thread in path, and sampled stacks
+    of all threads in path with ".folded" appended to it. Stacks don't get
+    sampled if interval is 0. The results get saved even if func raises an
+    exception (e.g. SystemExit).
+    """
+    folded = path.with_name(path.name + ".folded")
+    profiler = cProfile.Profile()
+    sampler = StackSampler(interval) if interval > 0 else None
+    if sampler is not None:
+        sampler.start()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        if sampler is None:
+            print(f"Saved profile in {path}.", file=sys.stderr)
+        else:
+            sampler.stop()
+            sampler.save(folded)
+            print(f"Saved profile in {path} and {folded}.", file=sys.stderr)
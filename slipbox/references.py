@@ -0,0 +1,205 @@
+"""Detect changes to the bibliography and CSL files.
+
+Notes that cite changed bibliography entries get re-rendered, so that
+edits to the bibliography don't require a full rebuild.
+"""
+
+from hashlib import sha256
+import json
+from pathlib import Path
+import re
+import subprocess
+import typing as t
+
+from .app import App
+from .utils import digest_file
+
+
+class ReferenceState(t.NamedTuple):
+    """Digests of bibliography and CSL files and of bibliography entries."""
+    bibliography: str
+    csl: str
+    keys: t.Dict[str, str]
+
+
+class ReferenceChanges(t.NamedTuple):
+    """Changes to bibliography since the last build."""
+    filenames: t.Set[str]       # Notes that need to be re-rendered
+    keys: t.Optional[t.Set[str]]    # Outdated citation keys (None = all)
+    state: ReferenceState
+
+
+def bibliography_path(app: App) -> t.Optional[Path]:
+    """Return path to bibliography file, or None if there's none."""
+    if app.config.bibliography is None:
+        return None
+    return app.root/app.config.bibliography
+
+
+def csl_path(app: App) -> Path:
+    """Return path to CSL file."""
+    if app.config.csl is not None:
+        return app.root/app.config.csl
+    return Path(__file__).parent/"data"/"default.csl"
+
+
+def digest_entries(app: App, path: Path) -> t.Optional[t.Dict[str, str]]:
+    """Compute digest of each entry in bibliography file by citation key.
+
+    Returns None if pandoc can't parse the file.
+    """
+    proc = subprocess.run(
+        [app.config.pandoc, str(path), "-t", "csljson"],
+        check=False,
+        capture_output=True,
+    )
+    if proc.returncode:
+        return None
+    try:
+        entries = json.loads(proc.stdout)
+        return {
+            str(entry["id"]): sha256(
+                json.dumps(entry, sort_keys=True).encode()
+            ).hexdigest()
+            for entry in entries
+        }
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def load_state(app: App) -> ReferenceState:
+    """Load reference state of last build from the database."""
+    resources = dict(app.database.execute("SELECT name, hash FROM Resources"))
+    keys = dict(app.database.execute("SELECT key, hash FROM ReferenceHashes"))
+    return ReferenceState(
+        resources.get("bibliography", ""),
+        resources.get("csl", ""),
+        keys,
+    )
+
+
+def citing_notes(app: App, keys: t.Optional[t.Iterable[str]]) -> t.Set[str]:
+    """Return filenames of notes that cite any of the keys.
+
+    If keys is None, returns notes with any citation.
+    """
+    sql = """
+        SELECT DISTINCT filename FROM Notes JOIN Citations ON id = note
+    """
+    if keys is None:
+        return {filename for filename, in app.database.execute(sql)}
+
+    filenames: t.Set[str] = set()
+    for key in keys:
+        rows = app.database.execute(sql + " WHERE reference = ?",
+                                    (f"ref-{key}",))
+        filenames.update(filename for filename, in rows)
+    return filenames
+
+
+def search_notes(app: App,
+                 keys: t.Iterable[str],
+                 exclude: t.Container[str]) -> t.Set[str]:
+    """Return filenames of note files that mention any of the keys.
+
+    Citations of keys that weren't in the bibliography don't get saved in
+    the database, so files that cite newly added keys have to be found by
+    searching through their contents.
+    """
+    keys = sorted(keys, key=len, reverse=True)
+    if not keys:
+        return set()
+
+    pattern = re.compile(
+        b"|".join(re.escape(key.encode()) for key in keys),
+    )
+    filenames = set()
+    for filename, in app.database.execute("SELECT filename FROM Files"):
+        if filename in exclude:
+            continue
+        try:
+            content = (app.root/filename).read_bytes()
+        except OSError:
+            continue
+        if pattern.search(content):
+            filenames.add(filename)
+    return filenames
+
+
+def find_reference_changes(app: App) -> t.Optional[ReferenceChanges]:
+    """Find notes and bibliography entries that need to be re-rendered
+    because the bibliography or CSL file changed.
+
+    Returns None if neither file changed since the last build.
+
+    If the CSL file changed, all notes with citations get re-rendered.
+    If the bibliography can't be parsed, notes with citations of missing
+    entries can't be found, so only notes with resolved citations get
+    re-rendered.
+    """
+    old = load_state(app)
+    bibliography = bibliography_path(app)
+    current = ReferenceState(
+        digest_file(bibliography),
+        digest_file(csl_path(app)) if bibliography is not None else "",
+        old.keys,
+    )
+    if current.bibliography == old.bibliography and current.csl == old.csl:
+        return None
+
+    entries: t.Optional[t.Dict[str, str]] = {}
+    if bibliography is not None and current.bibliography != old.bibliography:
+        entries = digest_entries(app, bibliography)
+    elif bibliography is not None:
+        entries = old.keys
+
+    if entries is None or current.csl != old.csl:
+        filenames = citing_notes(app, None)
+        keys = None
+        if entries is not None:
+            added = entries.keys() - old.keys.keys()
+            filenames |= search_notes(app, added, filenames)
+    else:
+        changed = {
+            key for key, digest in old.keys.items()
+            if entries.get(key) != digest
+        }
+        added = entries.keys() - old.keys.keys()
+        keys = changed | added
+        filenames = citing_notes(app, keys)
+        filenames |= search_notes(app, added, filenames)
+    return ReferenceChanges(
+        filenames,
+        keys,
+        ReferenceState(current.bibliography, current.csl, entries or {}),
+    )
+
+
+def apply_reference_changes(app: App, changes: ReferenceChanges) -> None:
+    """Delete outdated bibliography entries and save new reference state.
+
+    Notes that cite outdated entries should be deleted first.
+    """
+    conn = app.database
+    sql = """
+        DELETE FROM Bibliography
+            WHERE key NOT IN (SELECT reference FROM Citations)
+    """
+    if changes.keys is None:
+        conn.execute(sql)
+    else:
+        conn.executemany(
+            sql + " AND key = ?",
+            ((f"ref-{key}",) for key in changes.keys),
+        )
+
+    state = changes.state
+    conn.executemany(
+        "INSERT OR REPLACE INTO Resources (name, hash) VALUES (?, ?)",
+        [("bibliography", state.bibliography), ("csl", state.csl)],
+    )
+    conn.execute("DELETE FROM ReferenceHashes")
+    conn.executemany(
+        "INSERT INTO ReferenceHashes (key, hash) VALUES (?, ?)",
+        state.keys.items(),
+    )
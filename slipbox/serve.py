@@ -0,0 +1,224 @@
+"""Local preview server.
+
+Serves the site straight from the database and memory instead of writing
+it into the output directory, and tells browsers to reload whenever notes
+change.
+"""
+
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import mimetypes
+from pathlib import Path
+from sqlite3 import connect, Error
+import sys
+import threading
+import typing as t
+from urllib.parse import unquote, urlsplit
+
+from .app import App, require_init
+from .build import find_notes, update_database
+from .generator import CytoscapeDataGenerator, IndexGenerator
+from .objects import objects_directory
+from .utils import temporary_directory
+from .watch import create_watcher, watch_changes
+
+
+data = Path(__file__).parent/"data"
+favicons = Path(__file__).parent/"favicons"
+
+RELOAD_PATH = "__reload"
+
+RELOAD_SCRIPT = f"""<script>
+new EventSource("/{RELOAD_PATH}").onmessage = () => location.reload();
+</script>
+"""
+
+# Static assets by URL path prefix.
+STATIC_DIRECTORIES = {
+    "assets/boxicons/svg/": data/"svg",
+    "es5/": data/"es5",
+}
+
+STATIC_FILES = ("slipbox.js", "slipbox.js.map", "slipbox.css",
+                "slipbox.css.map")
+
+# Seconds between keep-alive messages on the reload event stream.
+KEEP_ALIVE = 15.0
+
+
+class Site:
+    """In-memory copy of generated files that depend on notes."""
+    def __init__(self) -> None:
+        self.files: t.Dict[str, bytes] = {}
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def update(self, files: t.Dict[str, bytes]) -> None:
+        """Replace generated files and notify clients waiting for reload."""
+        with self.condition:
+            self.files = files
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Wait until the site gets updated past version.
+
+        Returns the current version, which is unchanged on timeout.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+def inject_reload_script(html: str) -> str:
+    """Insert live reload script at the end of the HTML body."""
+    index = html.rfind("</body>")
+    if index < 0:
+        return html + RELOAD_SCRIPT
+    return html[:index] + RELOAD_SCRIPT + html[index:]
+
+
+def render_site(app: App) -> t.Dict[str, bytes]:
+    """Generate index.html and graph JSONs in memory."""
+    files = {
+        path: json.dumps(graph).encode()
+        for path, graph in CytoscapeDataGenerator(app.database).generate()
+    }
+    with temporary_directory() as tempdir:
+        IndexGenerator(app).run(tempdir)
+        html = (tempdir/"index.html").read_text(encoding="utf-8")
+    files["index.html"] = inject_reload_script(html).encode()
+    return files
+
+
+def find_static_file(path: str) -> t.Optional[Path]:
+    """Find static asset for URL path.
+
+    Returns None if there's none.
+    """
+    if path in STATIC_FILES:
+        return data/path
+    if "/" not in path and (favicons/path).is_file():
+        return favicons/path
+
+    for prefix, directory in STATIC_DIRECTORIES.items():
+        if path.startswith(prefix):
+            base = directory.resolve()
+            candidate = (base/path[len(prefix):]).resolve()
+            if base in candidate.parents and candidate.is_file():
+                return candidate
+            return None
+    return None
+
+
+def make_handler(app: App, site: Site) -> t.Type[BaseHTTPRequestHandler]:
+    """Create request handler class for the site."""
+    database = app.root/".slipbox"/"data.db"
+    objects = objects_directory(app.root)
+
+    def read_image(filename: str) -> t.Optional[bytes]:
+        """Read image from the object store.
+
+        Looks up the hash of the image using a separate connection,
+        because requests are handled in different threads.
+        """
+        uri = f"{database.resolve().as_uri()}?mode=ro"
+        sql = "SELECT hash FROM Images WHERE filename = ?"
+        try:
+            with closing(connect(uri, uri=True)) as con:
+                row = con.execute(sql, (filename,)).fetchone()
+            return (objects/row[0]).read_bytes() if row else None
+        except (Error, OSError):
+            return None
+
+    class Handler(BaseHTTPRequestHandler):
+        """Serves generated files, images and static assets."""
+        def log_message(self, *args: t.Any) -> None:
+            """Don't log requests."""
+
+        def send_content(self, path: str, content: bytes) -> None:
+            """Send file contents."""
+            mimetype, _ = mimetypes.guess_type(path)
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             mimetype or "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(content)
+
+        def send_events(self) -> None:
+            """Send reload event whenever the site gets updated."""
+            version = site.version
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            try:
+                while True:
+                    current = site.wait(version, KEEP_ALIVE)
+                    if current == version:
+                        self.wfile.write(b": keep-alive\n\n")
+                    else:
+                        self.wfile.write(b"data: reload\n\n")
+                        version = current
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def do_GET(self) -> None:   # pylint: disable=invalid-name
+            """Handle GET request."""
+            path = unquote(urlsplit(self.path).path).lstrip("/")
+            path = path or "index.html"
+            if path == RELOAD_PATH:
+                self.send_events()
+                return
+
+            content = site.files.get(path)
+            if content is None:
+                content = read_image(path)
+            if content is None:
+                static = find_static_file(path)
+                content = static.read_bytes() if static else None
+            if content is None:
+                self.send_error(404)
+                return
+            self.send_content(path, content)
+
+    return Handler
+
+
+@require_init
+def serve(app: App) -> None:
+    """Serve website and reload it whenever notes change."""
+    watcher = create_watcher(app)
+    site = Site()
+    try:
+        app.error_formatter.reset()
+        update_database(app, list(find_notes(app)))
+        print(app.error_formatter.format(), end="")
+        site.update(render_site(app))
+
+        host = app.args.get("host", "localhost")
+        port = app.args.get("port", 8000)
+        server = ThreadingHTTPServer((host, port), make_handler(app, site))
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        print(f"Serving on http://{host}:{server.server_port}/. "
+              "Press Ctrl+C to stop.", file=sys.stderr)
+        try:
+            watch_changes(
+                app,
+                watcher,
+                lambda _: site.update(render_site(app)),
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+    finally:
+        watcher.close()
+
+
+__all__ = ["serve"]
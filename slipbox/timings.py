@@ -0,0 +1,102 @@
+"""Measure wall and CPU time and peak memory usage of build phases."""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+import json
+from pathlib import Path
+import threading
+import time
+import typing as t
+
+from .memory import MemorySampler, format_mib
+
+
+@dataclass
+class Phase:
+    """Accumulated time of a build phase."""
+    calls: int = 0
+    wall: float = 0.0   # Seconds
+    cpu: float = 0.0    # Seconds of CPU time of the threads in the phase
+    rss: int = 0    # Peak RSS of slipbox in bytes
+    children_rss: int = 0   # Peak total RSS of subprocesses in bytes
+
+
+class Timer:
+    """Collects times of named phases.
+
+    Phases can run in several threads at the same time (e.g. pandoc), in
+    which case their times add up.
+    Peak memory usage also gets tracked if there's a memory sampler.
+    """
+    def __init__(self) -> None:
+        self.phases: t.Dict[str, Phase] = {}
+        self.lock = threading.Lock()
+        self.memory: t.Optional[MemorySampler] = None
+
+    @contextmanager
+    def phase(self, name: str) -> t.Iterator[None]:
+        """Add time spent in the with block to phase."""
+        memory = self.memory
+        watermark = memory.enter(name) if memory else None
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            if memory is not None and watermark is not None:
+                memory.exit(watermark)
+            with self.lock:
+                phase = self.phases.setdefault(name, Phase())
+                phase.calls += 1
+                phase.wall += wall
+                phase.cpu += cpu
+                if watermark is not None:
+                    phase.rss = max(phase.rss, watermark.rss)
+                    phase.children_rss = max(phase.children_rss,
+                                             watermark.children)
+            if memory is not None:
+                memory.check()
+
+    def to_dict(self) -> t.Dict[str, t.Dict[str, float]]:
+        """Return phases as a JSON-serializable dict.
+
+        Memory usage (in bytes) is only included if it's tracked.
+        """
+        result: t.Dict[str, t.Dict[str, float]] = {}
+        with self.lock:
+            for name, phase in self.phases.items():
+                result[name] = {
+                    "calls": phase.calls,
+                    "wall": phase.wall,
+                    "cpu": phase.cpu,
+                }
+                if self.memory is not None:
+                    result[name]["rss"] = phase.rss
+                    result[name]["children_rss"] = phase.children_rss
+        return result
+
+    def format(self) -> str:
+        """Format phases as a table."""
+        header = f"{'phase':<16}{'calls':>8}{'wall (s)':>12}{'cpu (s)':>12}"
+        if self.memory is not None:
+            header += f"{'rss (MiB)':>12}{'children (MiB)':>16}"
+        lines = [header]
+        for name, phase in self.to_dict().items():
+            line = (
+                f"{name:<16}{phase['calls']:>8}"
+                f"{phase['wall']:>12.3f}{phase['cpu']:>12.3f}"
+            )
+            if self.memory is not None:
+                line += (
+                    f"{format_mib(int(phase['rss'])):>12}"
+                    f"{format_mib(int(phase['children_rss'])):>16}"
+                )
+            lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    def save(self, path: Path) -> None:
+        """Save phases into JSON file."""
+        path.write_text(json.dumps(self.to_dict(), indent=2) + "\n",
+                        encoding="utf-8")
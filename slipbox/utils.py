@@ -1,49 +1,128 @@
 """Utils."""
 
 import contextlib
+from hashlib import sha256
 import os
 from pathlib import Path
 import shlex
 import subprocess
 import sys
 import tempfile
+import threading
 import typing as t
 
 
+# Files modified this close to the time they were last checked are "racily
+# clean": their mtime can't be trusted to detect later edits, so their stat
+# info isn't cached. The window covers coarse filesystem timestamps.
+RACY_WINDOW_NS = 2_000_000_000
+
+# Subprocesses of run_command that are still running (see kill_commands).
+RUNNING_COMMANDS: t.Set["subprocess.Popen[bytes]"] = set()
+RUNNING_COMMANDS_LOCK = threading.Lock()
+
+
+class FileStat(t.NamedTuple):
+    """Stat info used to detect if a file has changed."""
+    mtime_ns: t.Optional[int]
+    size: int
+    inode: int
+
+
+def file_stat(path: Path) -> FileStat:
+    """Get stat info of file in path."""
+    stat = path.stat()
+    return FileStat(stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def cacheable_stat(stat: FileStat, checked_ns: int) -> FileStat:
+    """Return stat info that is safe to cache.
+
+    checked_ns is the time (in ns) before the file got read. If the file is
+    racily clean, mtime_ns is set to None so that it gets rehashed next time.
+    """
+    if stat.mtime_ns is None or stat.mtime_ns >= checked_ns - RACY_WINDOW_NS:
+        return stat._replace(mtime_ns=None)
+    return stat
+
+
+def digest_file(path: t.Optional[Path]) -> str:
+    """Return SHA-256 digest of file contents, or "" if it doesn't exist."""
+    if path is None:
+        return ""
+    try:
+        return sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return ""
+
+
 @contextlib.contextmanager
-def temporary_directory() -> t.Iterator[Path]:
-    """Path to temporary directory."""
-    with tempfile.TemporaryDirectory() as tempdir:
+def temporary_directory(parent: t.Optional[Path] = None
+                        ) -> t.Iterator[Path]:
+    """Path to temporary directory.
+
+    The directory is created inside parent if it's given.
+    """
+    with tempfile.TemporaryDirectory(dir=parent) as tempdir:
         yield Path(tempdir)
 
 
 def run_command(cmd: str,
                 variables: t.Optional[t.Dict[str, str]] = None,
+                quiet_on_error: bool = False,
                 **kwargs: t.Any) -> int:
     """Run command with additional environment variables in variables.
 
     Output stdout and stderr, and return the error code.
 
+    quiet_on_error
+    : Don't output stdout and stderr if the command fails
+
     kwargs
-    : Additional arguments to subprocess.run
+    : Additional arguments to subprocess.Popen
+
+    The command can get killed by kill_commands while it runs.
     """
     env = os.environ.copy()
     if variables is not None:
         env.update(variables)
-    proc = subprocess.run(
+    with subprocess.Popen(
         shlex.split(cmd),
         env=env,
-        check=False,
-        capture_output=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
         **kwargs,
-    )
-    if proc.stdout:
-        print(proc.stdout.decode())
-    if proc.stderr:
-        print(proc.stderr.decode(), file=sys.stderr)
+    ) as proc:
+        with RUNNING_COMMANDS_LOCK:
+            RUNNING_COMMANDS.add(proc)
+        try:
+            stdout, stderr = proc.communicate()
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            with RUNNING_COMMANDS_LOCK:
+                RUNNING_COMMANDS.discard(proc)
+
+    if quiet_on_error and proc.returncode:
+        return proc.returncode
+    if stdout:
+        print(stdout.decode())
+    if stderr:
+        print(stderr.decode(), file=sys.stderr)
     return proc.returncode
 
 
+def kill_commands() -> None:
+    """Kill commands started by run_command that are still running.
+
+    Threads waiting for the commands get an error code from run_command.
+    """
+    with RUNNING_COMMANDS_LOCK:
+        for proc in RUNNING_COMMANDS:
+            proc.kill()
+
+
 def show_error(verbosity: t.Literal["error", "warning"], message: str) -> None:
     """Print error message to stderr."""
     print(f"[{verbosity}]", message, file=sys.stderr)
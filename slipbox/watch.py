@@ -0,0 +1,358 @@
+"""Watch notes directory and rebuild site incrementally."""
+
+import ctypes
+import ctypes.util
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import time
+import typing as t
+
+from .app import App, require_init
+from .build import (
+    DatabaseUpdate, filter_notes, find_notes, ignored_directories,
+    NoteFilter, update_database,
+)
+from .generator import compile_site, update_site
+from .objects import prune_objects
+from .references import bibliography_path, csl_path
+from .utils import FileStat, file_stat, show_error
+
+
+# See inotify(7).
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+# struct inotify_event {int wd; uint32_t mask, cookie, len; char name[];}
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Watcher(t.Protocol):
+    """Watches files for changes."""
+    def wait(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+        """Wait for changes.
+
+        Returns the set of changed paths, or an empty set on timeout.
+        Blocks until something changes if timeout is None.
+        """
+
+    def close(self) -> None:
+        """Release resources."""
+
+
+class InotifyWatcher:
+    """Watches directory tree for changes using inotify (Linux only)."""
+    def __init__(self,
+                 root: Path,
+                 ignore: t.Callable[[Path], bool]):
+        self.root = root
+        self.ignore = ignore
+        self.directories: t.Dict[int, Path] = {}
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                    ctypes.c_uint32]
+        self.descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.descriptor < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            self.add_directory(root)
+        except OSError:
+            self.close()
+            raise
+
+    def add_directory(self, directory: Path) -> None:
+        """Watch directory and its subdirectories."""
+        for dirpath, dirnames, _ in os.walk(directory):
+            path = Path(dirpath)
+            watch_id = self._add_watch(
+                self.descriptor,
+                os.fsencode(path),
+                WATCH_MASK,
+            )
+            if watch_id < 0:
+                code = ctypes.get_errno()
+                raise OSError(code, os.strerror(code), str(path))
+            self.directories[watch_id] = path
+            dirnames[:] = [
+                name for name in dirnames
+                if not self.ignore(path/name)
+            ]
+
+    def read_events(self) -> t.Set[Path]:
+        """Read pending events and return changed paths."""
+        changed: t.Set[Path] = set()
+        try:
+            data = os.read(self.descriptor, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            watch_id, mask, _, length = EVENT_HEADER.unpack_from(
+                data,
+                offset,
+            )
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                changed.add(self.root)
+                continue
+            directory = self.directories.get(watch_id)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.directories[watch_id]
+                continue
+
+            path = directory/name
+            if self.ignore(path):
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self.add_directory(path)
+                except OSError as exc:
+                    show_error("warning", f"couldn't watch {path}: {exc}")
+            changed.add(path)
+        return changed
+
+    def wait(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+        """Wait for changes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.descriptor], [], [], remaining)
+            changed = self.read_events() if ready else set()
+            if changed or not ready:
+                return changed
+
+    def close(self) -> None:
+        """Stop watching."""
+        if self.descriptor >= 0:
+            os.close(self.descriptor)
+            self.descriptor = -1
+
+
+class PollingWatcher:
+    """Watches files for changes by periodically comparing stat info."""
+    def __init__(self,
+                 snapshot: t.Callable[[], t.Dict[Path, FileStat]],
+                 interval: float):
+        self.snapshot = snapshot
+        self.interval = interval
+        self.state = snapshot()
+
+    def poll(self) -> t.Set[Path]:
+        """Return paths that changed since the last poll."""
+        current = self.snapshot()
+        changed = {
+            path for path in current.keys() | self.state.keys()
+            if current.get(path) != self.state.get(path)
+        }
+        self.state = current
+        return changed
+
+    def wait(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+        """Wait for changes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            time.sleep(delay)
+            changed = self.poll()
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+
+    def close(self) -> None:
+        """Stop watching."""
+
+
+def wait_for_burst(watcher: Watcher, delay: float) -> t.Set[Path]:
+    """Wait for changes, then keep collecting changes until nothing changes
+    for delay seconds.
+    """
+    changed = watcher.wait()
+    while True:
+        more = watcher.wait(delay)
+        if not more:
+            return changed
+        changed |= more
+
+
+def is_ignored(path: Path, directories: t.Sequence[Path]) -> bool:
+    """Check if path is one of the directories or is inside one."""
+    return any(path == d or d in path.parents for d in directories)
+
+
+def take_snapshot(app: App) -> t.Dict[Path, FileStat]:
+    """Get stat info of notes, bibliography and CSL file."""
+    paths = list(find_notes(app))
+    bibliography = bibliography_path(app)
+    if bibliography is not None:
+        paths.extend([bibliography, csl_path(app)])
+
+    snapshot = {}
+    for path in paths:
+        try:
+            snapshot[path] = file_stat(path)
+        except OSError:
+            pass
+    return snapshot
+
+
+def create_watcher(app: App) -> Watcher:
+    """Create inotify watcher if possible, otherwise a polling watcher."""
+    directories = ignored_directories(app)
+    if not app.args.get("poll") and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(
+                app.root,
+                lambda path: is_ignored(path, directories),
+            )
+        except (AttributeError, OSError) as exc:
+            show_error("warning", f"inotify unavailable ({exc}), polling")
+    return PollingWatcher(
+        lambda: take_snapshot(app),
+        app.args.get("interval", 1.0),
+    )
+
+
+def linked_images(app: App, notes: t.Iterable[Path]) -> t.Set[str]:
+    """Return filenames of images linked from notes in the note files."""
+    sql = """
+        SELECT image FROM ImageLinks JOIN Notes ON note = id
+            WHERE filename = ?
+    """
+    images: t.Set[str] = set()
+    for path in notes:
+        filename = str(path.relative_to(app.root))
+        rows = app.database.execute(sql, (filename,))
+        images.update(image for image, in rows)
+    return images
+
+
+def has_notes_inside(app: App, filename: str) -> bool:
+    """Check if there are notes in the database inside the directory."""
+    sql = "SELECT 1 FROM Files WHERE filename > ? AND filename < ? LIMIT 1"
+    start = filename + os.sep
+    end = filename + chr(ord(os.sep) + 1)
+    return app.database.execute(sql, (start, end)).fetchone() is not None
+
+
+def find_changed_notes(app: App,
+                       changed: t.Iterable[Path]) -> t.Optional[t.List[Path]]:
+    """Find existing notes among changed paths.
+
+    Returns None if all notes have to be found again (see find_notes),
+    e.g. when a directory changed or with the git discovery config.
+    Also returns None if the bibliography or the CSL file changed, because
+    notes that cite them get rescanned too.
+    """
+    if app.config.discovery == "git":
+        return None
+    references = {bibliography_path(app), csl_path(app)}
+    filenames = []
+    for path in changed:
+        if path == app.root or path.is_dir() or path in references:
+            return None
+        if app.root not in path.parents:
+            continue
+        filename = str(path.relative_to(app.root))
+        if not path.exists() and has_notes_inside(app, filename):
+            return None
+        filenames.append(Path(filename).as_posix())
+    return [
+        path for path in filter_notes(app.root, filenames, NoteFilter(app))
+        if path.is_file()
+    ]
+
+
+# Called after notes in the database change.
+OnChange = t.Callable[[DatabaseUpdate], None]
+
+
+def rebuild(app: App,
+            on_change: OnChange,
+            changed: t.Optional[t.Set[Path]] = None) -> bool:
+    """Process changed notes and call on_change if the database changed.
+
+    If changed is set, only notes in changed get rescanned, if possible.
+    Images that are no longer used get deleted from the object store, so
+    that it doesn't grow during long watch sessions.
+    Returns False on error.
+    """
+    app.error_formatter.reset()
+    notes = None if changed is None else find_changed_notes(app, changed)
+    if changed is not None and notes is not None:
+        filenames = {
+            str(path.relative_to(app.root))
+            for path in changed if app.root in path.parents
+        }
+        update = update_database(app, notes, filenames)
+    else:
+        update = update_database(app, list(find_notes(app)))
+    print(app.error_formatter.format(), end="")
+    if not update.is_ok:
+        return False
+    if update.deleted or update.processed:
+        on_change(update)
+        prune_objects(app.database, app.root)
+    return True
+
+
+def watch_changes(app: App, watcher: Watcher, on_change: OnChange) -> None:
+    """Rebuild after every burst of changes until interrupted."""
+    try:
+        while True:
+            changed = wait_for_burst(watcher, app.args.get("debounce", 0.2))
+            rebuild(app, on_change, changed)
+    except KeyboardInterrupt:
+        pass
+
+
+def update_output(app: App, update: DatabaseUpdate) -> None:
+    """Regenerate outputs affected by database update."""
+    if app.args.get("output", True):
+        update_site(app, linked_images(app, update.processed))
+
+
+@require_init
+def watch(app: App) -> None:
+    """Rebuild website whenever notes change."""
+    watcher = create_watcher(app)
+    try:
+        app.error_formatter.reset()
+        update_database(app, list(find_notes(app)))
+        print(app.error_formatter.format(), end="")
+        if app.args.get("output", True):
+            compile_site(app)
+
+        print("Watching for changes. Press Ctrl+C to stop.",
+              file=sys.stderr)
+        watch_changes(app, watcher, lambda u: update_output(app, u))
+    finally:
+        watcher.close()
+
+
+__all__ = ["watch"]
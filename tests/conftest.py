@@ -1,6 +1,8 @@
 """Testing fixtures."""
 
+from http.server import HTTPServer
 from pathlib import Path
+from threading import Thread
 import typing as t
 
 import pytest
@@ -30,6 +32,14 @@ def app(app_without_root: App) -> t.Iterable[App]:
     yield app
 
 
+@pytest.fixture
+def note_a(app: App) -> Path:
+    """Note file a.md in the slipbox with a single note."""
+    note = app.root/"a.md"
+    note.write_text("# 0 Foo\n\nFoo.\n", encoding="utf-8")
+    return note
+
+
 @pytest.fixture
 def files_abc(tmp_path: Path) -> t.Iterable[t.List[Path]]:
     """Create files in tmp_path: a.md, b.md, c.md."""
@@ -37,3 +47,16 @@ def files_abc(tmp_path: Path) -> t.Iterable[t.List[Path]]:
     for path in files:
         path.write_text(path.name)
     yield files
+
+
+@pytest.fixture
+def server_url(server: HTTPServer) -> t.Iterable[str]:
+    """URL of HTTP server running in a background thread.
+
+    Test modules that use this need to define a server fixture.
+    """
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
@@ -1,8 +1,12 @@
 """Test app.py."""
 
+from sqlite3 import connect
+
 import pytest
 
 from slipbox.app import App, find_root, startup
+from slipbox.config import Config
+from slipbox.database import open_database
 
 
 def test_find_root_in_current(app: App) -> None:
@@ -67,3 +71,64 @@ def test_startup_with_invalid_config(app: App) -> None:
 
     assert system_exit.value.code != 0
     assert "invalid config file" in system_exit.value.args[0]
+
+
+@pytest.mark.parametrize("option", [
+    "[build]\nscan-format = json\n",
+    "[build]\ndiscovery = gti\n",
+    "[database]\njournal-mode = wal; x\n",
+    "[database]\nhtml-compression = gzip\n",
+])
+def test_startup_with_invalid_choice(app: App, option: str) -> None:
+    """Unknown values of options with fixed choices should be reported as
+    config errors.
+    """
+    config = app.root/".slipbox"/"config.cfg"
+    config.write_text(option, encoding="utf-8")
+
+    with pytest.raises(SystemExit) as system_exit:
+        startup({})
+
+    assert system_exit.value.code != 0
+    assert "invalid config file" in system_exit.value.args[0]
+
+
+def test_open_database_pragmas(app: App) -> None:
+    """Database should be opened with the [database] settings."""
+    con = startup({}).database
+    assert con.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert con.execute("PRAGMA synchronous").fetchone() == (1,)  # NORMAL
+    assert con.execute("PRAGMA cache_size").fetchone() == (-64 * 1024,)
+    assert con.execute("PRAGMA temp_store").fetchone() == (2,)  # MEMORY
+    con.close()
+
+    config = Config()
+    config.journal_mode = "delete"
+    config.cache_size = 1
+    con = open_database(app.root/"other.db", config)
+    assert con.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    assert con.execute("PRAGMA synchronous").fetchone() == (2,)  # FULL
+    assert con.execute("PRAGMA cache_size").fetchone() == (-1024,)
+    con.close()
+
+
+def test_read_during_write(app: App) -> None:
+    """Readers shouldn't block writers and shouldn't see uncommitted
+    changes.
+    """
+    writer = startup({})
+    reader = startup({})
+    reader.database.execute("BEGIN")
+    assert not list(reader.database.execute("SELECT * FROM Files"))
+
+    writer.database.execute("INSERT INTO Files (filename) VALUES ('a.md')")
+    with connect(app.root/".slipbox"/"data.db", timeout=0) as con:
+        assert not list(con.execute("SELECT * FROM Files"))
+    writer.database.commit()
+
+    assert not list(reader.database.execute("SELECT * FROM Files"))
+    reader.database.rollback()
+    assert list(reader.database.execute("SELECT filename FROM Files")) == \
+        [("a.md",)]
+    reader.cleanup()
+    writer.cleanup()
@@ -1,7 +1,7 @@
 # type: ignore
 """Test batch.py."""
 
-from slipbox.batch import group_by_file_extension
+from slipbox.batch import Batch, group_by_file_extension, split_batch
 
 
 def test_group_by_file_extension() -> None:
@@ -28,3 +28,21 @@ def test_group_by_file_extension_on_the_same_type() -> None:
     groups = [batch.paths for batch in batches]
     assert len(groups) == 1
     assert files in groups
+
+
+def test_split_batch() -> None:
+    """split_batch should split the batch into contiguous shards with sizes
+    that differ by at most one.
+    """
+    batch = Batch(".md", tuple(f"{c}.md" for c in "abcdefg"))
+    shards = split_batch(batch, 3)
+    assert [len(shard.paths) for shard in shards] == [3, 2, 2]
+    assert sum((shard.paths for shard in shards), ()) == batch.paths
+    assert all(shard.extension == ".md" for shard in shards)
+
+
+def test_split_batch_with_more_shards_than_files() -> None:
+    """split_batch shouldn't create empty shards."""
+    batch = Batch(".md", ("a.md", "b.md"))
+    assert len(split_batch(batch, 8)) == 2
+    assert len(split_batch(batch, 0)) == 1
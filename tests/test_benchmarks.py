@@ -0,0 +1,72 @@
+"""Test benchmarks package."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from benchmarks.__main__ import main
+from benchmarks.suite import process_notes
+from benchmarks.synthetic import Parameters, create_notes, create_slipbox
+from slipbox.app import startup
+from slipbox.build import find_notes
+from slipbox.dependencies import check_requirements
+from slipbox.graph import create_note_graph
+
+
+def test_create_notes() -> None:
+    """Notes should have the given number of tags, links, etc."""
+    params = Parameters(notes=50, links_per_note=4, tags_per_note=3,
+                        citations_per_note=2, images_per_note=1)
+    notes = create_notes(params)
+    assert [note.id for note in notes] == list(range(50))
+    for note in notes:
+        assert len(set(note.links)) == 4
+        assert len(set(note.tags)) == 3
+        assert len(set(note.citations)) == 2
+        assert len(note.images) == 1
+    assert create_notes(params) == notes
+
+
+def test_create_slipbox(tmp_path: Path) -> None:
+    """Note files should be split by notes per file and alternate formats."""
+    params = Parameters(notes=10, notes_per_file=3, images=2,
+                        formats=("md", "org", "rst"))
+    app = create_slipbox(tmp_path, params)
+    names = sorted(path.name for path in find_notes(app))
+    assert names == ["0.md", "1.org", "2.rst", "3.md"]
+    assert (tmp_path/"0.md").read_text().count("\n# ") == 2
+    assert len(list((tmp_path/"images").iterdir())) == 2
+    assert (tmp_path/"references.bib").exists()
+
+
+@pytest.mark.skipif(
+    not check_requirements(startup({})),
+    reason="missing requirements",
+)
+def test_process_notes(tmp_path: Path) -> None:
+    """Benchmarks should run on a note graph with edges."""
+    app = create_slipbox(tmp_path, Parameters(notes=6, links_per_note=2))
+    process_notes(app)
+    graph = create_note_graph(app.database)
+    assert graph.number_of_nodes() == 6
+    assert graph.number_of_edges() > 0
+
+
+@pytest.mark.skipif(
+    not check_requirements(startup({})),
+    reason="missing requirements",
+)
+def test_main(tmp_path: Path) -> None:
+    """Benchmarks should save results of every run."""
+    output = tmp_path/"results.json"
+    main([
+        "--notes", "6", "--notes-per-file", "2", "--formats", "md,org,rst",
+        "--images-per-note", "1", "--repeat", "2", "-o", str(output),
+    ])
+    report = json.loads(output.read_text())
+    assert report["parameters"]["notes"] == 6
+    assert report["results"]
+    for result in report["results"].values():
+        assert len(result["runs"]) == 2
+        assert result["min"] <= result["mean"]
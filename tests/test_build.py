@@ -2,7 +2,9 @@
 """Test slipbox.py."""
 
 from hashlib import sha256
-from pathlib import Path
+import json
+from pathlib import Path, PurePosixPath
+import re
 from sqlite3 import Connection
 import typing as t
 
@@ -10,9 +12,11 @@ import pytest
 from slipbox.app import App, startup
 from slipbox.build import (
     build, delete_notes, find_notes, find_new_notes, find_outdated_notes,
-    process_notes,
+    glob_to_regex, process_notes,
 )
+from slipbox.database import ZLIB_MARKER
 from slipbox.dependencies import check_requirements
+from slipbox.utils import file_stat
 
 
 def scan(app: App) -> None:
@@ -97,6 +101,62 @@ def test_added_notes_recursive(app: App) -> None:
     assert list(new_notes) == [new]
 
 
+@pytest.mark.parametrize("pattern", [
+    "*.md", "*.draft.md", "notes/*.md", "/root/*.md", "?.md", "[ab].md",
+    "[!ab].md", "*", "a*/b/*.md", "[.md", "*.m[a-z]",
+])
+def test_glob_to_regex(pattern: str) -> None:
+    """Compiled patterns should match paths the same way as Path.match."""
+    paths = [
+        "/root/a.md", "/root/c.md", "/root/x.draft.md", "/root/notes/a.md",
+        "/root/notes/sub/a.md", "/root/a/b/c.md", "/root/abc/b/c.md",
+        "/root/[.md", "/root/.md", "/root/a.txt", "notes/a.md", "a.md",
+    ]
+    regex = re.compile(glob_to_regex(pattern))
+    for path in paths:
+        expected = PurePosixPath(path).match(pattern)
+        assert bool(regex.search(path)) == expected, path
+
+
+@pytest.mark.parametrize("pattern", [
+    "[]].md", "[!]].md", "[]a].md", "[!]a].md", "[z-a].md", "[!z-a].md",
+    "[a-.].md", "[a-c-e].md", "[--a].md", "[a-].md", "[-a].md", "[^a].md",
+    "[&&|~].md", "[\\].md", "[!].md", "[].md",
+])
+def test_glob_to_regex_brackets(pattern: str) -> None:
+    """Bracket expressions should match the same way as Path.match."""
+    regex = re.compile(glob_to_regex(pattern))
+    for char in "]a-bcez.&|~^\\!":
+        path = f"/root/{char}.md"
+        expected = PurePosixPath(path).match(pattern)
+        assert bool(regex.search(path)) == expected, path
+
+
+def test_find_notes_skips_directories(app: App) -> None:
+    """find_notes shouldn't look inside .slipbox, .git, the output
+    directory, and excluded directory patterns.
+    """
+    app.config.patterns = {
+        "*.md": True,
+        "*.draft.md": False,
+        "node_modules/": False,
+    }
+    for name in [
+        ".git/a.md",
+        ".slipbox/a.md",
+        "public/a.md",
+        "node_modules/pkg/a.md",
+        "notes/node_modules/a.md",
+        "notes/b.draft.md",
+        "notes/c.md",
+        "d.md",
+    ]:
+        path = app.root/name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    assert sorted(find_notes(app)) == [app.root/"d.md", app.root/"notes/c.md"]
+
+
 def test_modified_notes(app: App) -> None:
     """find_new_notes must find modified notes after they are deleted from the
     database.
@@ -134,6 +194,42 @@ def test_purge(app: App, files_abc: t.List[Path]) -> None:
     assert len(remaining) == 1
 
 
+def test_find_outdated_notes_trusts_unchanged_stat(app: App) -> None:
+    """Notes with unchanged stat info must not be rehashed, unless
+    --verify-hashes is set.
+    """
+    note = app.root/"note.md"
+    note.write_text("hello")
+    stat = file_stat(note)
+    app.database.execute(
+        """
+        INSERT INTO Files (filename, hash, mtime_ns, size, inode)
+            VALUES ('note.md', 'bogus', ?, ?, ?)
+        """,
+        stat,
+    )
+
+    assert not list(find_outdated_notes(app, find_notes(app)))
+
+    app.args["verify_hashes"] = True
+    assert list(find_outdated_notes(app, find_notes(app))) == ["note.md"]
+
+
+def test_find_outdated_notes_updates_touched_stat(app: App) -> None:
+    """Notes that were touched but not modified must not be outdated, and
+    their stat info must be updated.
+    """
+    note = app.root/"note.md"
+    note.write_text("hello")
+    insert_files(app.database, note, basedir=app.root)
+
+    assert not list(find_outdated_notes(app, find_notes(app)))
+
+    sql = "SELECT size, inode FROM Files WHERE filename = 'note.md'"
+    stat = file_stat(note)
+    assert list(app.database.execute(sql)) == [(stat.size, stat.inode)]
+
+
 @pytest.mark.skipif(
     not check_requirements(startup({})),
     reason="missing requirements",
@@ -146,6 +242,44 @@ class TestsWithRequirements:
         backup = app.root/".slipbox"/"data.db.bak"
         assert not backup.exists()
 
+    def test_build_save_timings(self, app: App) -> None:
+        """--save-timings should save phase timings in .slipbox."""
+        Path("a.md").write_text("# 0 A\n\nA.\n", encoding="utf-8")
+        app.args["save_timings"] = True
+        app.config.dot = "true"
+        build(app)
+
+        path = app.root/".slipbox"/"timings.json"
+        timings = json.loads(path.read_text())
+        for phase in ("discovery", "pandoc", "ingest", "index", "total"):
+            assert timings[phase]["calls"] >= 1
+
+    def test_build_refreshes_views(self, app: App) -> None:
+        """ValidLinks and Untagged should be up to date after each build."""
+        Path("a.md").write_text("# 0 A\n\n#tag [B](#1)\n", encoding="utf-8")
+        Path("b.md").write_text("# 1 B\n\nB.\n", encoding="utf-8")
+        Path("c.md").write_text("# 2 C\n\n[D](#3)\n", encoding="utf-8")
+        app.args["output"] = False
+        build(app)
+
+        sql = "SELECT id FROM Untagged ORDER BY id"
+        assert list(app.database.execute(sql)) == [(2,)]
+        links = "SELECT src, dest FROM ValidLinks ORDER BY src"
+        assert list(app.database.execute(links)) == [(0, 1)]
+
+        Path("a.md").write_text("# 0 A\n\n[B](#1)\n", encoding="utf-8")
+        Path("d.md").write_text("# 3 D\n\nD.\n", encoding="utf-8")
+        build(app)
+        assert list(app.database.execute(sql)) == [(0,), (1,), (2,), (3,)]
+        assert list(app.database.execute(links)) == [(0, 1), (2, 3)]
+
+    def test_build_memory_limit(self, app: App) -> None:
+        """Build should fail with a clear message above the memory limit."""
+        Path("a.md").write_text("# 0 A\n\nA.\n", encoding="utf-8")
+        app.config.memory_limit = 1
+        with pytest.raises(SystemExit, match="memory limit exceeded"):
+            build(app)
+
     def test_run(
         self,
         files_abc: t.List[Path],
@@ -389,6 +523,42 @@ Bar.
         assert "#0" in stdout
         assert not stderr
 
+    def test_build_rolls_back_on_error(self, app: App) -> None:
+        """Failed builds shouldn't delete outdated notes or make backups."""
+        Path("foo.md").write_text("# 0 Foo\n\nFoo.", encoding="utf-8")
+        scan(app)
+        before = "\n".join(app.database.iterdump())
+
+        Path("foo.md").write_text("# 0 Baz\n\nBaz.", encoding="utf-8")
+        Path("bar.md").write_text("# 0 Bar\n\nBar.", encoding="utf-8")
+        with pytest.raises(SystemExit):
+            scan(app)
+
+        assert "\n".join(app.database.iterdump()) == before
+        assert not (app.root/".slipbox"/"data.db.bak").exists()
+
+    def test_build_with_backup(self, app: App) -> None:
+        """The backup database should be deleted after successful builds."""
+        app.args["backup"] = True
+        Path("foo.md").write_text("# 0 Foo\n\nFoo.", encoding="utf-8")
+        build(app)
+        assert not (app.root/".slipbox"/"data.db.bak").exists()
+        sql = "SELECT title FROM Notes"
+        assert list(app.database.execute(sql)) == [("Foo",)]
+
+    def test_build_with_html_compression(self, app: App) -> None:
+        """Note HTML should be stored compressed with the html-compression
+        config, and decompressed in the generated site.
+        """
+        app.config.html_compression = "zlib"
+        Path("foo.md").write_text("# 0 Foo\n\nFoo bar.", encoding="utf-8")
+        build(app)
+
+        html, = app.database.execute("SELECT html FROM Notes").fetchone()
+        assert html.startswith(ZLIB_MARKER)
+        index = app.root/app.config.output_directory/"index.html"
+        assert "Foo bar." in index.read_text(encoding="utf-8")
+
     def test_build_with_duplicate_ids_in_multiple_batches(
         self,
         app: App,
@@ -443,6 +613,18 @@ Bye-bye.
         build(app)
         assert is_quiet(capsys)
 
+    def test_rebuild_modified_note(self, app: App) -> None:
+        """Notes of modified files should be replaced on rebuild, even if
+        their stat info had to be refreshed.
+        """
+        note = Path("test.md")
+        note.write_text("# 0 Foo\n\nFoo.\n", encoding="utf-8")
+        scan(app)
+        note.write_text("# 0 Bar\n\nBar.\n", encoding="utf-8")
+        scan(app)
+        sql = "SELECT id, title FROM Notes"
+        assert list(app.database.execute(sql)) == [(0, "Bar")]
+
     def test_build_with_empty_link_target(
         self,
         app: App,
@@ -570,6 +752,34 @@ Bar.""")
 
         assert is_quiet(capsys)
 
+    def test_process_in_parallel(self, app: App) -> None:
+        """Scanning notes in parallel must give the same results as scanning
+        them serially.
+        """
+        for index in range(6):
+            app.root.joinpath(f"{index}.md").write_text(
+                f"# {index} Note {index}\n\n#tag{index % 2}\n\n"
+                f"[Next](#{index + 1}).\n",
+                encoding="utf-8",
+            )
+
+        def dump() -> t.List[t.Any]:
+            tables = ["Files", "Notes", "Tags", "Links"]
+            return [
+                sorted(app.database.execute(f"SELECT * FROM {table}"))
+                for table in tables
+            ]
+
+        app.args["jobs"] = 1
+        process_notes(app, find_notes(app))
+        serial = dump()
+        delete_notes(app, [f"{index}.md" for index in range(6)])
+        assert not app.database.execute("SELECT * FROM Notes").fetchall()
+
+        app.args["jobs"] = 4
+        process_notes(app, find_notes(app))
+        assert dump() == serial
+
 
 @pytest.mark.skipif(
     not check_requirements(startup({})),
@@ -632,3 +842,37 @@ class TestDirectionalLinks:
 
         cur.execute(sql, (2, 0))
         assert cur.fetchone()[0] == "<"
+
+    def test_build_links_images_from_object_store(self, app: App) -> None:
+        """Identical images should be stored once, linked into the output
+        directory, and pruned once no note links to them.
+        """
+        Path("images").mkdir()
+        Path("images/a.png").write_bytes(b"png")
+        Path("images/b.png").write_bytes(b"png")
+        Path("a.md").write_text(
+            "# 0 A\n\n![A](images/a.png)\n",
+            encoding="utf-8",
+        )
+        Path("b.md").write_text("# 1 B\n\n![B](images/b.png)\n")
+        app.config.dot = "true"
+        build(app)
+
+        digest = sha256(b"png").hexdigest()
+        sql = "SELECT filename, hash FROM Images ORDER BY filename"
+        assert list(app.database.execute(sql)) == [
+            ("images/a.png", digest),
+            ("images/b.png", digest),
+        ]
+        objects = app.root/".slipbox"/"objects"
+        assert [p.name for p in objects.iterdir()] == [digest]
+
+        output = app.root/app.config.output_directory
+        assert (output/"images"/"a.png").read_bytes() == b"png"
+        assert (output/"images"/"b.png").samefile(objects/digest)
+
+        Path("a.md").unlink()
+        Path("b.md").unlink()
+        build(app)
+        assert not list(app.database.execute(sql))
+        assert not list(objects.iterdir())
@@ -0,0 +1,153 @@
+"""Test cache.py."""
+
+from pathlib import Path
+import typing as t
+
+import pytest
+
+from slipbox import cache, utils
+from slipbox.app import App, startup
+from slipbox.build import build, delete_notes, process_notes
+from slipbox.data import ScanResult
+from slipbox.dependencies import check_requirements
+from slipbox.processor import build_options
+
+
+def no_pandoc(*_: t.Any, **__: t.Any) -> int:
+    """Replacement for run_command that fails the test."""
+    raise AssertionError("pandoc shouldn't run")
+
+
+def test_split_scan_result_round_trip() -> None:
+    """Cache entries should contain the rows of only one file each."""
+    result = ScanResult(
+        tables={
+            "files": [("a.md", "hash-a"), ("b.md", "hash-b")],
+            "notes": [(0, "A", "a.md"), (1, "B", "b.md")],
+            "tags": [("#a", 0), ("#b", 1)],
+            "links": [(0, 1, ""), (1, 0, ">")],
+            "images": [("images/a.png",)],
+            "image_links": [(0, "images/a.png")],
+            "bibliography": [("ref-a", "A."), ("ref-b", "B.")],
+            "citations": [(0, "ref-a"), (1, "ref-b")],
+        },
+        sections={
+            0: '<section id="0" data-filename="a.md"></section>',
+            1: '<section id="1" data-filename="b.md"></section>',
+        },
+        messages=[{
+            "name": "empty-link-target",
+            "value": {"id": 1, "title": "B", "filename": "b.md"},
+        }],
+    )
+    entries = {e["filename"]: e for e in cache.split_scan_result(result)}
+    assert sorted(entries) == ["a.md", "b.md"]
+
+    renamed = cache.entry_to_scan_result(entries["b.md"], "c.md")
+    assert renamed.tables == {
+        "files": [("c.md", "hash-b")],
+        "notes": [(1, "B", "c.md")],
+        "tags": [("#b", 1)],
+        "links": [(1, 0, ">")],
+        "citations": [(1, "ref-b")],
+        "bibliography": [("ref-b", "B.")],
+        "images": [],
+        "image_links": [],
+    }
+    assert renamed.sections == {
+        1: '<section id="1" data-filename="c.md"></section>',
+    }
+    assert renamed.messages == [{
+        "name": "empty-link-target",
+        "value": {"id": 1, "title": "B", "filename": "c.md"},
+    }]
+
+    same = cache.entry_to_scan_result(entries["a.md"], "a.md")
+    assert same.tables["images"] == [("images/a.png",)]
+    assert same.tables["image_links"] == [(0, "images/a.png")]
+    assert same.sections == {0: result.sections[0]}
+
+
+@pytest.mark.skipif(
+    not check_requirements(startup({})),
+    reason="missing requirements",
+)
+class TestsWithRequirements:
+    """Tests with external requirements (e.g. pandoc, graphviz, etc.)."""
+    def test_renamed_note_uses_cache(
+        self,
+        app: App,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Renamed but unchanged notes shouldn't get scanned again."""
+        note = app.root/"a.md"
+        note.write_text("# 0 Foo\n\n#foo [Bar](#1)\n", encoding="utf-8")
+        process_notes(app, [note])
+        delete_notes(app, ["a.md"])
+
+        renamed = note.rename(app.root/"b.md")
+        monkeypatch.setattr(utils, "run_command", no_pandoc)
+        assert process_notes(app, [renamed])
+
+        assert list(app.database.execute("SELECT * FROM Tags")) == \
+            [("#foo", 0)]
+        assert list(app.database.execute("SELECT src, dest FROM Links")) == \
+            [(0, 1)]
+        title, filename, html = app.database.execute(
+            "SELECT title, filename, html FROM Notes WHERE id = 0"
+        ).fetchone()
+        assert title == "Foo"
+        assert filename == "b.md"
+        assert 'data-filename="b.md"' in html
+
+    def test_database_reset_uses_cache(
+        self,
+        app: App,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Notes should be re-ingested from the cache after the database
+        gets wiped.
+        """
+        note = Path("a.md")
+        note.write_text(
+            "# 0 Foo\n\nFoo.\n\n# 1 Bar\n\nBar.\n",
+            encoding="utf-8",
+        )
+        process_notes(app, [app.root/"a.md"])
+        sql = "SELECT * FROM Notes ORDER BY id"
+        before = list(app.database.execute(sql))
+
+        delete_notes(app, ["a.md"])
+        assert not list(app.database.execute(sql))
+
+        monkeypatch.setattr(utils, "run_command", no_pandoc)
+        assert process_notes(app, [app.root/"a.md"])
+        assert list(app.database.execute(sql)) == before
+
+    def test_modified_note_gets_scanned(self, app: App, note_a: Path) -> None:
+        """Modified notes shouldn't use stale cache entries."""
+        note = note_a
+        process_notes(app, [note])
+        delete_notes(app, ["a.md"])
+
+        note.write_text("# 0 Bar\n\nBar.\n", encoding="utf-8")
+        process_notes(app, [note])
+        sql = "SELECT title FROM Notes"
+        assert list(app.database.execute(sql)) == [("Bar",)]
+
+    def test_build_prunes_cache(self, app: App, note_a: Path) -> None:
+        """Cache entries of old versions of notes should get deleted after
+        the build.
+        """
+        note = note_a
+        build(app)
+        note.write_text("# 0 Bar\n\nBar.\n", encoding="utf-8")
+        build(app)
+
+        entries = list(cache.cache_directory(app).glob("*/*"))
+        assert len(entries) == 1
+        assert cache.load_entry(
+            app,
+            cache.scan_context(app, build_options(app)),
+            utils.digest_file(note),
+        )
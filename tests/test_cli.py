@@ -1,9 +1,48 @@
 """Test cli.py."""
 
-from slipbox.cli import parse_args
+import pytest
+
+from slipbox.cli import DEFAULT_PROFILE, parse_args
 
 
 def test_parse_args_version() -> None:
     """parse_args should not require subcommand."""
     parse_args(["-v"])
     parse_args(["--version"])
+
+
+def test_parse_args_profile() -> None:
+    """Bare --profile shouldn't consume the subcommand as its path."""
+    args = parse_args(["--profile", "build"])
+    assert args["profile"] == DEFAULT_PROFILE
+    assert args["(command)"] == "build"
+
+    args = parse_args(["--profile=out.pstats", "build"])
+    assert args["profile"] == "out.pstats"
+    assert args["(command)"] == "build"
+
+    assert parse_args(["build"])["profile"] is None
+
+    args = parse_args(["--profile", "--profile-interval", "0.1", "build"])
+    assert args["profile"] == DEFAULT_PROFILE
+
+
+def test_parse_args_profile_interval(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """--profile-interval should accept 0 but not negative numbers."""
+    args = parse_args(["--profile", "--profile-interval=0", "build"])
+    assert args["profile_interval"] == 0
+
+    with pytest.raises(SystemExit):
+        parse_args(["--profile", "--profile-interval=-1", "build"])
+    assert "must not be negative" in capsys.readouterr().err
+
+
+def test_parse_args_profile_with_separate_path(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """--profile PATH should fail instead of parsing PATH as the command."""
+    with pytest.raises(SystemExit):
+        parse_args(["--profile", "out.pstats", "build"])
+    assert "--profile=PATH" in capsys.readouterr().err
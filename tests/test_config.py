@@ -44,3 +44,47 @@ def test_config_from_file_note_patterns() -> None:
 
     default = Config()
     assert config == default
+
+
+def test_config_build_jobs() -> None:
+    """[build] jobs should be read from the config file."""
+    Path("config.cfg").write_text("[build]\njobs = 4\n", encoding="utf-8")
+    assert Config.from_file(Path("config.cfg")).jobs == 4
+    assert Config().jobs == 1
+
+
+def test_config_build_backup() -> None:
+    """[build] backup should be disabled by default."""
+    assert not Config().backup
+    Path("config.cfg").write_text("[build]\nbackup = true\n")
+    assert Config.from_file(Path("config.cfg")).backup
+
+
+def test_config_build_scan_format() -> None:
+    """[build] scan-format should default to NDJSON."""
+    assert Config().scan_format == "ndjson"
+    Path("config.cfg").write_text("[build]\nscan-format = csv\n")
+    assert Config.from_file(Path("config.cfg")).scan_format == "csv"
+
+
+def test_config_build_memory_limit() -> None:
+    """[build] memory-limit should default to no limit."""
+    assert Config().memory_limit == 0
+    Path("config.cfg").write_text("[build]\nmemory-limit = 512\n")
+    assert Config.from_file(Path("config.cfg")).memory_limit == 512
+
+
+def test_config_database() -> None:
+    """[database] settings should be read from the config file."""
+    Path("config.cfg").write_text(
+        "[database]\njournal-mode = delete\nmmap-size = 0\ncache-size = 8\n"
+        "html-compression = zlib\n",
+    )
+    config = Config.from_file(Path("config.cfg"))
+    assert (config.journal_mode, config.mmap_size, config.cache_size) == \
+        ("delete", 0, 8)
+    assert config.html_compression == "zlib"
+    assert Config().html_compression == "none"
+
+    config.write(Path("config.cfg"))
+    assert Config.from_file(Path("config.cfg")).journal_mode == "delete"
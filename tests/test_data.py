@@ -0,0 +1,123 @@
+"""Test data.py."""
+
+from hashlib import sha256
+from pathlib import Path
+from sqlite3 import connect, Connection
+import typing as t
+
+import pytest
+
+from slipbox.data import (
+    insert_citations, insert_files, insert_image_links, insert_images,
+    insert_links, insert_notes, insert_tables, insert_tags, read_ndjson,
+)
+from slipbox.database import migrate, refresh_views
+
+
+@pytest.fixture
+def conn() -> t.Iterable[Connection]:
+    """Database connection with foreign keys enabled."""
+    conn = connect(":memory:")
+    migrate(conn)
+    conn.execute("PRAGMA foreign_keys=ON")
+    yield conn
+    conn.close()
+
+
+def test_insert_notes_with_duplicates(
+    conn: Connection,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Duplicate IDs should be reported in order, and only the first note
+    with the ID should be inserted.
+    """
+    insert_files(conn, [("a.md", ""), ("b.md", "")])
+    assert insert_notes(conn, [(0, "A", "a.md")])
+    assert not insert_notes(conn, [
+        (1, "B", "b.md"),
+        (0, "C", "b.md"),
+        (1, "D", "b.md"),
+        (2, "E", "b.md"),
+    ])
+
+    sql = "SELECT id, title FROM Notes ORDER BY id"
+    assert list(conn.execute(sql)) == [(0, "A"), (1, "B"), (2, "E")]
+
+    _, stderr = capsys.readouterr()
+    assert stderr == """[error] Duplicate note ID (#0). See:
+- A (a.md)
+- C (b.md)
+[error] Duplicate note ID (#1). See:
+- B (b.md)
+- D (b.md)
+"""
+
+
+def test_insert_skips_rows_with_missing_references(
+    conn: Connection,
+    tmp_path: Path,
+) -> None:
+    """Rows that would violate foreign key constraints should be skipped."""
+    insert_files(conn, [("a.md", "")])
+    assert insert_notes(conn, [(0, "A", "a.md")])
+
+    insert_tags(conn, [("#a", 0), ("#b", 1)])
+    insert_links(conn, [(0, 1, ""), (1, 0, "")])
+    insert_citations(conn, [(0, "ref-a")])
+
+    (tmp_path/"a.png").write_bytes(b"png")
+    objects = tmp_path/"objects"
+    insert_images(conn, [("a.png",), ("missing.png",)], tmp_path, objects)
+    insert_image_links(conn, [(0, "a.png"), (0, "missing.png")])
+
+    assert list(conn.execute("SELECT * FROM Tags")) == [("#a", 0)]
+    assert list(conn.execute("SELECT * FROM Links")) == [(0, 1, "")]
+    assert not list(conn.execute("SELECT * FROM Citations"))
+    digest = sha256(b"png").hexdigest()
+    assert list(conn.execute("SELECT * FROM Images")) == [("a.png", digest)]
+    assert (objects/digest).read_bytes() == b"png"
+    assert list(conn.execute("SELECT * FROM ImageLinks")) == [(0, "a.png")]
+
+
+def test_insert_tables(conn: Connection, tmp_path: Path) -> None:
+    """insert_tables should insert all scan data."""
+    assert insert_tables(conn, {
+        "files": [("a.md", "hash")],
+        "notes": [(0, "A", "a.md"), (1, "B", "a.md")],
+        "tags": [("#a", 0)],
+        "links": [(0, 1, ">")],
+        "images": [],
+        "image_links": [],
+        "bibliography": [("ref-a", "A.")],
+        "citations": [(1, "ref-a")],
+    }, tmp_path, tmp_path/"objects")
+    assert list(conn.execute("SELECT * FROM Citations")) == [(1, "ref-a")]
+    refresh_views(conn)
+    assert list(conn.execute("SELECT src, dest FROM ValidLinks")) == [(0, 1)]
+
+
+def test_read_ndjson(tmp_path: Path) -> None:
+    """read_ndjson should split rows by table and collect messages."""
+    path = tmp_path/"scan.ndjson"
+    path.write_text("""["files","a.md","hash"]
+["notes",0,"A","a.md"]
+["tags","#a",0]
+["message",{"name":"empty-link-target","value":{"id":0}}]
+""")
+    tables, messages = read_ndjson(path)
+    assert tables["files"] == [("a.md", "hash")]
+    assert tables["notes"] == [(0, "A", "a.md")]
+    assert tables["tags"] == [("#a", 0)]
+    assert not tables["links"]
+    assert messages == [{"name": "empty-link-target", "value": {"id": 0}}]
+
+
+def test_read_ndjson_line_separators(tmp_path: Path) -> None:
+    """Unescaped line separators in JSON strings should be kept."""
+    path = tmp_path/"scan.ndjson"
+    path.write_text(
+        '["notes",0,"a\u2028b\u0085c","a.md"]\n',
+        encoding="utf-8",
+    )
+    tables, _ = read_ndjson(path)
+    assert tables["notes"] == [(0, "a\u2028b\u0085c", "a.md")]
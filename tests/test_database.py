@@ -0,0 +1,339 @@
+"""Test database.py."""
+
+from sqlite3 import connect, OperationalError
+import random
+import typing as t
+
+import pytest
+
+from slipbox import check, graph, page
+from slipbox.app import App
+from slipbox import database
+from slipbox.database import (
+    decode_html,
+    encode_html,
+    migrate,
+    refresh_views,
+    Savepoint,
+    Schema,
+    SCHEMA_VERSION,
+    schemas,
+    user_version,
+    ZLIB_MARKER,
+)
+
+
+def test_savepoint_commits() -> None:
+    """Changes should be committed after the outermost savepoint."""
+    con = connect(":memory:")
+    migrate(con)
+    with Savepoint(con):
+        assert con.execute("PRAGMA foreign_keys").fetchone() == (1,)
+        con.execute("INSERT INTO Files (filename, hash) VALUES ('a', '')")
+    assert not con.in_transaction
+    assert list(con.execute("SELECT filename FROM Files")) == [("a",)]
+
+
+def test_savepoint_rollback() -> None:
+    """Changes inside rolled back savepoints should be undone."""
+    con = connect(":memory:")
+    migrate(con)
+    with Savepoint(con):
+        con.execute("INSERT INTO Files (filename, hash) VALUES ('a', '')")
+        with Savepoint(con) as savepoint:
+            con.execute("INSERT INTO Files (filename, hash) VALUES ('b', '')")
+            savepoint.rollback()
+    assert list(con.execute("SELECT filename FROM Files")) == [("a",)]
+
+
+def test_savepoint_rolls_back_on_exception() -> None:
+    """Changes should be undone if the block raises an exception."""
+    con = connect(":memory:")
+    migrate(con)
+    with pytest.raises(ValueError):
+        with Savepoint(con):
+            con.execute("INSERT INTO Files (filename, hash) VALUES ('a', '')")
+            raise ValueError
+    assert not con.in_transaction
+    assert not list(con.execute("SELECT filename FROM Files"))
+
+
+def test_schema_version() -> None:
+    """SCHEMA_VERSION should be the version of the latest migration."""
+    assert schemas()[-1].version == SCHEMA_VERSION
+    con = connect(":memory:")
+    migrate(con)
+    assert user_version(con) == SCHEMA_VERSION
+
+
+def test_migrate_up_to_date(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Migrations shouldn't get read if the database is up to date."""
+    con = connect(":memory:")
+    migrate(con)
+
+    def fail() -> t.List[Schema]:
+        raise AssertionError
+    monkeypatch.setattr(database, "schemas", fail)
+    migrate(con)
+
+
+def test_migrate_rolls_back_on_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Pending migrations should all get rolled back if one of them fails."""
+    monkeypatch.setattr(database, "SCHEMA_VERSION", 2)
+    monkeypatch.setattr(database, "schemas", lambda: [
+        Schema(1, "PRAGMA user_version = 1; CREATE TABLE A (a);"),
+        Schema(2, "PRAGMA user_version = 2; INSERT INTO B VALUES (1);"),
+    ])
+    con = connect(":memory:")
+    with pytest.raises(OperationalError):
+        migrate(con)
+    assert not con.in_transaction
+    assert user_version(con) == 0
+    assert not list(con.execute("SELECT * FROM sqlite_master"))
+
+
+def test_migrate_image_blobs() -> None:
+    """Notes with images should get rescanned after image blobs get
+    replaced by hashes.
+    """
+    con = connect(":memory:")
+    for version, source in schemas():
+        if version < 7:
+            con.executescript(source)
+    con.executescript("""
+        INSERT INTO Files (filename, hash) VALUES ('a.md', 'a'), ('b.md', 'b');
+        INSERT INTO Notes (id, title, filename)
+            VALUES (0, 'A', 'a.md'), (1, 'B', 'b.md');
+        INSERT INTO Images (filename, binary) VALUES ('images/a.png', 'png');
+        INSERT INTO ImageLinks (note, image) VALUES (0, 'images/a.png');
+    """)
+    migrate(con)
+
+    sql = "SELECT filename, hash FROM Files ORDER BY filename"
+    assert list(con.execute(sql)) == [("a.md", None), ("b.md", "b")]
+    assert not list(con.execute("SELECT * FROM Images"))
+
+
+def query_plans(app: App) -> t.Dict[str, str]:
+    """Return query plans of SELECT queries run by check.py, page.py and
+    graph.py, keyed by query.
+    """
+    queries: t.List[str] = []
+    con = app.database
+    con.set_trace_callback(queries.append)
+    try:
+        page.render_main(con)
+        graph.create_note_graph(con)
+        graph.create_tag_graph(con)
+        graph.create_reference_graph(con)
+        check.check_empty_links(app)
+        check.check_invalid_links(app)
+        check.check_isolated_notes(app)
+        check.check_unsourced_notes(app)
+    finally:
+        con.set_trace_callback(None)
+
+    return {
+        " ".join(sql.split()): "\n".join(
+            row[3] for row in con.execute(f"EXPLAIN QUERY PLAN {sql}")
+        )
+        for sql in queries
+        if sql.lstrip().startswith("SELECT")
+    }
+
+
+@pytest.mark.parametrize("query,searches", [
+    ("FROM Tags NATURAL JOIN Notes WHERE tag = '#a'", [
+        "SEARCH Tags USING PRIMARY KEY (tag=?)",
+        "SEARCH Notes USING INTEGER PRIMARY KEY (rowid=?)",
+    ]),
+    ("WHERE reference = 'ref-x'", [
+        "SEARCH Citations USING COVERING INDEX CitationsByReference",
+        "SEARCH Notes USING INTEGER PRIMARY KEY (rowid=?)",
+    ]),
+    ("JOIN Tags AS B ON (B.id = dest)", [
+        "SEARCH Links USING PRIMARY KEY (src=?)",
+        "SEARCH B USING COVERING INDEX TagsById",
+    ]),
+    ("JOIN Citations AS B ON (B.note = dest)", [
+        "SEARCH Links USING PRIMARY KEY (src=?)",
+        "SEARCH B USING PRIMARY KEY (note=?)",
+    ]),
+    ("FROM Links JOIN Notes ON src = id WHERE dest < 0", [
+        "SEARCH Links USING COVERING INDEX LinksByDest",
+        "SEARCH Notes USING INTEGER PRIMARY KEY (rowid=?)",
+    ]),
+    ("SELECT src FROM ValidLinks UNION", [
+        "INDEX ValidLinksBySrc",
+        "INDEX ValidLinksByDest",
+    ]),
+    ("SELECT id, html FROM Untagged", [
+        "ROWID SEARCH ON TABLE StronglyTagged",
+        "ROWID SEARCH ON TABLE WeaklyTagged",
+    ]),
+])
+def test_hot_queries_use_indexes(app: App,
+                                 query: str,
+                                 searches: t.List[str]) -> None:
+    """Queries that join or filter on note IDs and non-key columns should
+    use primary keys or indexes.
+    """
+    app.database.executescript("""
+        INSERT INTO Files (filename, hash) VALUES ('a.md', 'a');
+        INSERT INTO Notes (id, title, filename, html) VALUES
+            (0, 'A', 'a.md', '<section title="A"><h1>A</h1></section>'),
+            (1, 'B', 'a.md', '<section title="B"><h1>B</h1></section>');
+        INSERT INTO Tags (tag, id) VALUES ('#a', 0), ('#b', 1);
+        INSERT INTO Links (src, dest, direction)
+            VALUES (0, 1, 'next'), (1, 0, 'prev'), (0, -1, '');
+        INSERT INTO Bibliography (key, html) VALUES ('ref-x', 'X');
+        INSERT INTO Citations (note, reference) VALUES (0, 'ref-x');
+    """)
+    refresh_views(app.database)
+    plans = [
+        plan for sql, plan in query_plans(app).items()
+        if query in sql
+    ]
+    assert plans
+    for plan in plans:
+        for search in searches:
+            assert search in plan
+
+
+@pytest.mark.parametrize("sql,search", [
+    ("SELECT id FROM Notes WHERE filename = ?", "INDEX NotesByFilename"),
+    ("SELECT tag FROM Tags WHERE id = ?", "INDEX TagsById"),
+    ("SELECT dest FROM Links WHERE src = ?", "PRIMARY KEY (src=?)"),
+    ("SELECT note FROM ImageLinks WHERE image = ?", "INDEX ImageLinksByImage"),
+])
+def test_cascade_lookups_use_indexes(sql: str, search: str) -> None:
+    """Child rows that get deleted by ON DELETE CASCADE should be looked up
+    using an index or a primary key.
+    """
+    con = connect(":memory:")
+    migrate(con)
+    plan = con.execute(f"EXPLAIN QUERY PLAN {sql}", (0,)).fetchall()
+    assert search in plan[0][3]
+
+
+# Definitions of the views that got replaced by tables in migration 10.
+VIEW_QUERIES = {
+    "ValidLinks": """
+        SELECT src, dest, direction FROM Links
+            WHERE dest IN (SELECT id FROM Notes)
+    """,
+    "Untagged": """
+        SELECT id FROM Notes WHERE id NOT IN (
+            SELECT id FROM Tags
+            UNION
+            SELECT dest FROM Links JOIN Tags ON src = Tags.id
+            UNION
+            SELECT src FROM Links JOIN Tags ON dest = Tags.id
+        )
+    """,
+}
+
+
+def test_refresh_views() -> None:
+    """Tables that replaced views should match the view definitions after
+    refresh_views.
+    """
+    con = connect(":memory:")
+    migrate(con)
+    rng = random.Random(0)
+    con.execute("INSERT INTO Files (filename) VALUES ('a.md')")
+    con.executemany(
+        "INSERT INTO Notes (id, title, filename) VALUES (?, '', 'a.md')",
+        ((note,) for note in range(0, 20, 2)),
+    )
+    con.executemany(
+        "INSERT INTO Tags (tag, id) VALUES (?, ?)",
+        ((f"#{rng.randrange(3)}", note) for note in range(0, 20, 8)),
+    )
+    con.executemany(
+        "INSERT INTO Links (src, dest, direction) VALUES (?, ?, '')",
+        ((note, rng.randrange(22)) for note in range(0, 20, 2)),
+    )
+    refresh_views(con)
+
+    links = sorted(con.execute(VIEW_QUERIES["ValidLinks"]))
+    assert sorted(con.execute("SELECT * FROM ValidLinks")) == links
+    untagged = sorted(con.execute(VIEW_QUERIES["Untagged"]))
+    assert untagged
+    assert sorted(con.execute("SELECT id FROM Untagged")) == untagged
+
+
+def test_migrate_materialized_views() -> None:
+    """Migration should fill tables that replace views with existing data."""
+    con = connect(":memory:")
+    for version, source in schemas():
+        if version < 10:
+            con.executescript(source)
+    con.executescript("""
+        INSERT INTO Files (filename, hash) VALUES ('a.md', 'a');
+        INSERT INTO Notes (id, title, filename)
+            VALUES (0, 'A', 'a.md'), (1, 'B', 'a.md'), (2, 'C', 'a.md');
+        INSERT INTO Tags (tag, id) VALUES ('#a', 0);
+        INSERT INTO Links (src, dest, direction)
+            VALUES (1, 0, ''), (2, 3, '');
+    """)
+    migrate(con)
+    assert list(con.execute("SELECT src, dest FROM ValidLinks")) == [(1, 0)]
+    assert list(con.execute("SELECT id FROM Untagged")) == [(2,)]
+
+
+def test_migrate_typed_tables() -> None:
+    """Notes and the tables that refer to notes should get rebuilt without
+    losing rows.
+    """
+    con = connect(":memory:")
+    for version, source in schemas():
+        if version < 11:
+            con.executescript(source)
+    con.executescript("""
+        INSERT INTO Files (filename, hash) VALUES ('a.md', 'a');
+        INSERT INTO Notes (id, title, filename, html)
+            VALUES (0, 'A', 'a.md', 'a'), (1, 'B', 'a.md', NULL);
+        INSERT INTO Tags (tag, id) VALUES ('#a', 0), ('#a', 0), ('#b', '1');
+        INSERT INTO Links (src, dest, direction)
+            VALUES (0, 1, 'next'), (1, 2, NULL), (1, 2, NULL);
+        INSERT INTO Bibliography (key, html) VALUES ('ref-x', 'X');
+        INSERT INTO Citations (note, reference) VALUES (1, 'ref-x');
+        INSERT INTO Images (filename, hash) VALUES ('a.png', 'a');
+        INSERT INTO ImageLinks (note, image) VALUES (0, 'a.png');
+    """)
+    con.execute("PRAGMA foreign_keys=ON")
+    migrate(con)
+
+    assert list(con.execute("SELECT rowid, title FROM Notes")) == [
+        (0, "A"),
+        (1, "B"),
+    ]
+    assert list(con.execute("SELECT tag, typeof(id) FROM Tags")) == [
+        ("#a", "integer"),
+        ("#b", "integer"),
+    ]
+    assert list(con.execute("SELECT * FROM Links")) == [
+        (0, 1, "next"),
+        (1, 2, ""),
+    ]
+    assert list(con.execute("SELECT * FROM Citations")) == [(1, "ref-x")]
+    assert list(con.execute("SELECT * FROM ImageLinks")) == [(0, "a.png")]
+    assert list(con.execute("SELECT src, dest FROM ValidLinks")) == [(0, 1)]
+    assert not list(con.execute("SELECT id FROM Untagged"))
+    assert not list(con.execute("PRAGMA foreign_key_check"))
+
+
+def test_encode_html() -> None:
+    """Compressed HTML should start with a marker and decode to the same
+    HTML as uncompressed HTML.
+    """
+    html = "<section><h1>Foo</h1><p>Bar.</p></section>"
+    compressed = encode_html(html, "zlib")
+    assert isinstance(compressed, bytes)
+    assert compressed.startswith(ZLIB_MARKER)
+    assert decode_html(compressed) == html
+    assert encode_html(html, "none") == decode_html(html) == html
+    assert encode_html(None, "zlib") is decode_html(None) is None
+    with pytest.raises(ValueError):
+        encode_html(html, "foo")
@@ -20,6 +20,16 @@ def test_proxy_rolls_back_changes_on_error(tmp_path: Path) -> None:
     assert present.read_text() == "present"
 
 
+def test_proxy_inside_parent(tmp_path: Path) -> None:
+    (tmp_path/"staging").mkdir()
+    with proxy(tmp_path/"out", tmp_path/"staging") as path:
+        assert path.parent == tmp_path/"staging"
+        (path/"hello.txt").write_text("hello", encoding="utf-8")
+
+    assert (tmp_path/"out"/"hello.txt").read_text(encoding="utf-8") == "hello"
+    assert not list((tmp_path/"staging").iterdir())
+
+
 def test_proxy_only_applies_changes_after_block(tmp_path: Path) -> None:
     with proxy(tmp_path) as path:
         (path/"hello.txt").write_text("hello")
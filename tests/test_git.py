@@ -0,0 +1,101 @@
+"""Test git.py."""
+
+from pathlib import Path
+from shutil import which
+import subprocess
+
+import pytest
+
+from slipbox import build
+from slipbox.app import App
+from slipbox.build import find_notes, find_outdated_notes
+from slipbox.git import clean_files, list_files
+
+
+pytestmark = pytest.mark.skipif(not which("git"), reason="missing git")
+
+
+def git(root: Path, *args: str) -> None:
+    """Run git command in root."""
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com",
+         *args],
+        cwd=root,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    """Git repo with committed, modified, deleted, untracked and ignored
+    files.
+    """
+    (tmp_path/"notes").mkdir()
+    for name in ["a.md", "b.md", "c.md", "notes/d.md"]:
+        (tmp_path/name).write_text(name)
+    (tmp_path/".gitignore").write_text("ignored.md\n")
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "Add notes")
+
+    (tmp_path/"b.md").write_text("modified")
+    (tmp_path/"c.md").unlink()
+    (tmp_path/"untracked.md").write_text("untracked")
+    (tmp_path/"ignored.md").write_text("ignored")
+    return tmp_path
+
+
+def test_list_files(repo: Path) -> None:
+    """Deleted and ignored files shouldn't be listed."""
+    assert sorted(list_files(repo) or []) == [
+        ".gitignore", "a.md", "b.md", "notes/d.md", "untracked.md",
+    ]
+    assert list_files(repo/"notes") == ["d.md"]
+
+
+def test_clean_files(repo: Path) -> None:
+    """Only files that match the index should be clean."""
+    clean = clean_files(repo)
+    assert clean is not None
+    assert sorted(clean) == [".gitignore", "a.md", "notes/d.md"]
+
+
+def test_not_a_work_tree(tmp_path: Path) -> None:
+    """Functions should return None outside git work trees."""
+    assert list_files(tmp_path) is None
+    assert clean_files(tmp_path) is None
+
+
+def test_find_notes_with_git_discovery(app: App) -> None:
+    """Notes should come from git if discovery is set to git, and from the
+    file system outside git work trees.
+    """
+    app.config.discovery = "git"
+    (app.root/"a.md").write_text("a")
+    (app.root/"ignored.md").write_text("ignored")
+    assert sorted(find_notes(app)) == [app.root/"a.md", app.root/"ignored.md"]
+
+    (app.root/".gitignore").write_text("ignored.md\n")
+    git(app.root, "init", "-q")
+    assert sorted(find_notes(app)) == [app.root/"a.md"]
+
+
+def test_find_outdated_notes_trusts_clean_files(
+    app: App,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Files with the same blob ID as the saved one shouldn't be stat'ed."""
+    (app.root/"a.md").write_text("a")
+    app.database.execute(
+        "INSERT INTO Files (filename, hash, oid) VALUES ('a.md', '', 'x')",
+    )
+
+    def fail(_: Path) -> None:
+        raise AssertionError
+
+    with monkeypatch.context() as context:
+        context.setattr(build, "file_stat", fail)
+        assert not find_outdated_notes(app, find_notes(app), {"a.md": "x"})
+    assert find_outdated_notes(app, find_notes(app), {"a.md": "y"}) == \
+        ["a.md"]
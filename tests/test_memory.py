@@ -0,0 +1,95 @@
+"""Test memory.py."""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+import pytest
+from slipbox import utils
+from slipbox.memory import (
+    MemoryLimitError, MemorySampler, current_usage, descendants,
+)
+from slipbox.timings import Timer
+
+
+linux = pytest.mark.skipif(
+    not sys.platform.startswith("linux"),
+    reason="requires /proc",
+)
+
+
+@linux
+def test_current_usage_counts_subprocesses() -> None:
+    """Running subprocesses should be counted separately."""
+    cmd = [sys.executable, "-c", "import time; time.sleep(10)"]
+    with subprocess.Popen(cmd) as proc:
+        try:
+            assert proc.pid in descendants(os.getpid())
+            rss, children = current_usage()
+            assert rss > 0
+            assert children > 0
+        finally:
+            proc.kill()
+
+
+def test_timer_tracks_memory() -> None:
+    """Phases should record peak memory usage if there's a sampler."""
+    timer = Timer()
+    timer.memory = MemorySampler(interval=0.01)
+    timer.memory.start()
+    try:
+        with timer.phase("a"):
+            time.sleep(0.05)
+    finally:
+        timer.memory.stop()
+
+    phase = timer.to_dict()["a"]
+    assert phase["rss"] > 0
+    assert "children_rss" in phase
+    assert "rss (MiB)" in timer.format()
+
+
+def test_memory_limit() -> None:
+    """Phases should fail fast once memory usage exceeds the limit."""
+    timer = Timer()
+    memory = MemorySampler(interval=0.01)
+    timer.memory = memory
+    memory.start()
+    try:
+        with pytest.raises(MemoryLimitError, match="during a: "):
+            with timer.phase("a"):
+                memory.limit = 1
+                time.sleep(10)
+        with pytest.raises(MemoryLimitError):
+            with timer.phase("b"):
+                pass
+    finally:
+        memory.stop()
+
+
+def test_memory_limit_kills_commands() -> None:
+    """Commands running in other threads should get killed once memory
+    usage exceeds the limit, so that waiting for them doesn't take long.
+    """
+    timer = Timer()
+    memory = MemorySampler(interval=0.01)
+    timer.memory = memory
+    memory.start()
+    cmd = f"{shlex.quote(sys.executable)} -c 'import time; time.sleep(10)'"
+    try:
+        with ThreadPoolExecutor() as executor:
+            start = time.perf_counter()
+            future = executor.submit(utils.run_command, cmd, None, True)
+            while not utils.RUNNING_COMMANDS:
+                time.sleep(0.01)
+            with pytest.raises(MemoryLimitError):
+                with timer.phase("pandoc"):
+                    memory.limit = 1
+                    future.result()
+            assert future.result()
+        assert time.perf_counter() - start < 5
+    finally:
+        memory.stop()
@@ -0,0 +1,53 @@
+"""Test objects.py."""
+
+from hashlib import sha256
+from pathlib import Path
+from sqlite3 import connect
+
+from slipbox.database import migrate
+from slipbox.objects import link_file, prune_objects, store_object
+
+
+def test_store_object_dedupes_identical_files(tmp_path: Path) -> None:
+    """Identical files should be stored as a single object."""
+    objects = tmp_path/"objects"
+    (tmp_path/"a.png").write_bytes(b"png")
+    (tmp_path/"b.png").write_bytes(b"png")
+
+    digest = store_object(objects, tmp_path/"a.png")
+    assert store_object(objects, tmp_path/"b.png") == digest
+    assert digest == sha256(b"png").hexdigest()
+    assert [p.name for p in objects.iterdir()] == [digest]
+
+
+def test_link_file(tmp_path: Path) -> None:
+    """link_file should hardlink source into dest, replacing old files."""
+    source = tmp_path/"source"
+    dest = tmp_path/"dest"
+    source.write_bytes(b"new")
+    dest.write_bytes(b"old")
+
+    link_file(source, dest)
+    assert dest.read_bytes() == b"new"
+    assert dest.samefile(source)
+
+    # Linking again shouldn't touch the file.
+    inode = dest.stat().st_ino
+    link_file(source, dest)
+    assert dest.stat().st_ino == inode
+
+
+def test_prune_objects(tmp_path: Path) -> None:
+    """Objects that aren't used in the Images table should be deleted."""
+    objects = tmp_path/".slipbox"/"objects"
+    (tmp_path/"a.png").write_bytes(b"a")
+    (tmp_path/"b.png").write_bytes(b"b")
+    used = store_object(objects, tmp_path/"a.png")
+    store_object(objects, tmp_path/"b.png")
+
+    conn = connect(":memory:")
+    migrate(conn)
+    conn.execute("INSERT INTO Images (filename, hash) VALUES (?, ?)",
+                 ("images/a.png", used))
+    prune_objects(conn, tmp_path)
+    assert [p.name for p in objects.iterdir()] == [used]
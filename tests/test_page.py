@@ -1,12 +1,13 @@
 """Test page.py."""
 
+from io import StringIO
 import sqlite3
 import typing as t
 
 import pytest
 from slipbox import page
 from slipbox.app import App, startup
-from slipbox.database import migrate
+from slipbox.database import encode_html, migrate, refresh_views
 from slipbox.dependencies import check_requirements
 
 SQL = """
@@ -59,6 +60,7 @@ def test_render_tags(mock_db: sqlite3.Connection) -> None:
     """Check render_tags output."""
     conn = mock_db
     conn.executescript(SQL)
+    refresh_views(conn)
     html = page.render_tags(conn)
     assert html == """<section id="tags" title="Tags" class="level1">
 <h1>Tags</h1>
@@ -105,6 +107,29 @@ def test_render_reference_page(mock_db: sqlite3.Connection) -> None:
 </section>"""
 
 
+def test_write_main(mock_db: sqlite3.Connection) -> None:
+    """write_main should write the same HTML as render_main, even if the
+    HTML in the database is compressed.
+    """
+    conn = mock_db
+    conn.executescript(SQL)
+    refresh_views(conn)
+    html = page.render_main(conn)
+    conn.execute(
+        "UPDATE Notes SET html = ? WHERE id = 1",
+        (encode_html("<section><h1>1</h1><p>Bar.</p></section>", "zlib"),),
+    )
+    conn.execute(
+        "UPDATE Bibliography SET html = ?",
+        (encode_html("Reference text.", "zlib"),),
+    )
+
+    file = StringIO()
+    page.write_main(file, conn)
+    assert file.getvalue() == html
+    assert "<p>Bar.</p>" in html
+
+
 @pytest.mark.skipif(
     not check_requirements(startup({})),
     reason="missing requirements",
@@ -0,0 +1,69 @@
+"""Test pandoc_server.py."""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import typing as t
+
+import pytest
+
+from slipbox import page
+from slipbox.app import App
+from slipbox.pandoc_server import convert
+
+
+class MockServer(BaseHTTPRequestHandler):
+    """Echoes the conversion options as the output."""
+    requests: t.List[t.Dict[str, t.Any]] = []
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Handle conversion request."""
+        length = int(self.headers["Content-Length"])
+        options = json.loads(self.rfile.read(length))
+        self.requests.append(options)
+
+        body = json.dumps({
+            "output": f"<html>{options['text']}</html>",
+            "base64": False,
+            "messages": [],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: t.Any) -> None:
+        """Don't log requests."""
+
+
+@pytest.fixture
+def server() -> HTTPServer:
+    """Mock pandoc server (see server_url)."""
+    MockServer.requests = []
+    return HTTPServer(("127.0.0.1", 0), MockServer)
+
+
+def test_convert(server_url: str) -> None:
+    """convert should return the server output."""
+    assert convert(server_url, {"text": "foo"}) == "<html>foo</html>"
+
+
+def test_convert_unavailable_server(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """convert should return None if the server is unreachable."""
+    assert convert("http://127.0.0.1:9", {"text": "foo"}, timeout=1) is None
+    _, stderr = capsys.readouterr()
+    assert "pandoc server" in stderr
+
+
+def test_generate_index_with_server(app: App, server_url: str) -> None:
+    """generate_index should use the pandoc server if it's configured."""
+    app.config.pandoc_server = server_url
+    page.generate_index(app, app.root)
+
+    assert (app.root/"index.html").read_text().startswith("<html>")
+    options = MockServer.requests[0]
+    assert options["standalone"]
+    assert options["section-divs"]
+    assert options["metadata"] == {"title": app.config.title}
+    assert 'id="home"' in options["variables"]["include-after"]
@@ -2,12 +2,22 @@
 
 from hashlib import sha256
 from pathlib import Path
+from threading import Lock
+import time
 import typing as t
 
 import pytest
 
-from slipbox.app import App
-from slipbox.processor import build_command, preprocess, MARKDOWN_TEMPLATE
+from slipbox import processor
+from slipbox.app import App, startup
+from slipbox.batch import Batch
+from slipbox.build import build, process_notes
+from slipbox.dependencies import check_requirements
+from slipbox.processor import (
+    build_command, preprocess, read_scan_result, scan_batch,
+    MARKDOWN_TEMPLATE,
+)
+from slipbox.utils import digest_file, temporary_directory
 
 
 def test_preprocess_markdown_with_sources(files_abc: t.List[Path],
@@ -69,3 +79,190 @@ def test_build_command_when_input_file_does_not_exist(app: App) -> None:
     """build_command must fail if input file does not exist."""
     input_file = app.root/"input.md"
     build_command(app, input_file, "output.html")
+
+
+@pytest.mark.skipif(
+    not check_requirements(startup({})),
+    reason="missing requirements",
+)
+class TestsWithRequirements:
+    """Tests with external requirements (e.g. pandoc, graphviz, etc.)."""
+    def test_bisect_failed_batch(
+        self,
+        app: App,
+        monkeypatch: pytest.MonkeyPatch,
+        capsys: pytest.CaptureFixture[str],
+    ) -> None:
+        """Notes in a failed batch should be saved, except for the notes
+        that fail to scan.
+        """
+        for index in range(5):
+            (app.root/f"{index}.md").write_text(f"# {index} Note\n\nHi.\n")
+        bad = app.root/"3.md"
+
+        scans: t.List[t.Sequence[Path]] = []
+        scan_batch = processor.scan_batch
+
+        def fake_scan_batch(app: App,
+                            batch: Batch,
+                            tempdir: Path,
+                            *args: t.Any) -> bool:
+            scans.append(batch.paths)
+            return bad not in batch.paths and \
+                scan_batch(app, batch, tempdir, *args)
+
+        monkeypatch.setattr(processor, "scan_batch", fake_scan_batch)
+        assert not process_notes(app, sorted(app.root.glob("*.md")))
+
+        sql = "SELECT id FROM Notes ORDER BY id"
+        assert list(app.database.execute(sql)) == [(0,), (1,), (2,), (4,)]
+        assert "Scan failed: 3.md" in capsys.readouterr().err
+        assert (bad,) in scans
+
+        sql = "SELECT filename, hash FROM FailedScans"
+        assert list(app.database.execute(sql)) == \
+            [("3.md", sha256(bad.read_bytes()).hexdigest())]
+
+        # Known-bad files should be scanned on their own.
+        scans.clear()
+        assert not process_notes(app, [bad])
+        assert scans == [(bad,)]
+
+    def test_scan_shards_respects_jobs(
+        self,
+        app: App,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Failed and known-bad shards shouldn't run more pandoc processes
+        at a time than --jobs.
+        """
+        for index in range(8):
+            (app.root/f"{index}.md").write_text(f"# {index} Note\n\nHi.\n")
+        bad = {app.root/"1.md", app.root/"6.md"}
+        app.database.executemany(
+            "INSERT INTO FailedScans (filename, hash) VALUES (?, ?)",
+            (
+                (f"{index}.md", digest_file(app.root/f"{index}.md"))
+                for index in (2, 3, 4)
+            ),
+        )
+
+        running = []
+        peak = 0
+        lock = Lock()
+        scan_batch = processor.scan_batch
+
+        def fake_scan_batch(app: App,
+                            batch: Batch,
+                            tempdir: Path,
+                            *args: t.Any) -> bool:
+            nonlocal peak
+            with lock:
+                running.append(batch)
+                peak = max(peak, len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(batch)
+            return not bad.intersection(batch.paths) and \
+                scan_batch(app, batch, tempdir, *args)
+
+        monkeypatch.setattr(processor, "scan_batch", fake_scan_batch)
+        app.args["jobs"] = 2
+        assert not process_notes(app, sorted(app.root.glob("*.md")))
+        assert peak == 2
+
+        sql = "SELECT id FROM Notes ORDER BY id"
+        assert list(app.database.execute(sql)) == \
+            [(0,), (2,), (3,), (4,), (5,), (7,)]
+
+    def test_abort_batch_wide_failure(
+        self,
+        app: App,
+        monkeypatch: pytest.MonkeyPatch,
+        capsys: pytest.CaptureFixture[str],
+    ) -> None:
+        """Scans that fail regardless of the notes shouldn't get bisected,
+        and the notes shouldn't be remembered as failed scans.
+        """
+        for index in range(4):
+            (app.root/f"{index}.md").write_text(f"# {index} Note\n\nHi.\n")
+        app.config.bibliography = Path("missing.bib")   # type: ignore
+
+        scans: t.List[t.Sequence[Path]] = []
+        scan_batch = processor.scan_batch
+
+        def fake_scan_batch(app: App,
+                            batch: Batch,
+                            tempdir: Path,
+                            *args: t.Any) -> bool:
+            scans.append(batch.paths)
+            return scan_batch(app, batch, tempdir, *args)
+
+        monkeypatch.setattr(processor, "scan_batch", fake_scan_batch)
+        app.args["jobs"] = 1
+        assert not process_notes(app, sorted(app.root.glob("*.md")))
+
+        assert len(scans) == 2
+        assert scans[-1] == ()
+        assert "Scan failed even without notes" in capsys.readouterr().err
+        assert not list(app.database.execute("SELECT * FROM Notes"))
+        assert not list(app.database.execute("SELECT * FROM FailedScans"))
+
+    def test_build_with_invalid_utf8(
+        self,
+        app: App,
+        capsys: pytest.CaptureFixture[str],
+    ) -> None:
+        """Build should save valid notes and exit with an error."""
+        (app.root/"a.md").write_text("# 0 A\n\nA.\n")
+        (app.root/"b.md").write_bytes(b"# 1 B\n\n\xff\n")
+        app.args["output"] = False
+        with pytest.raises(SystemExit) as system_exit:
+            build(app)
+        assert system_exit.value.code == 1
+        assert "Scan failed: b.md" in capsys.readouterr().err
+
+        sql = "SELECT title, filename FROM Notes"
+        assert list(app.database.execute(sql)) == [("A", "a.md")]
+
+        # The bad hash should be forgotten after the file gets fixed.
+        (app.root/"b.md").write_text("# 1 B\n\nB.\n")
+        build(app)
+        assert not list(app.database.execute("SELECT * FROM FailedScans"))
+
+    def test_scan_formats(self, app: App) -> None:
+        """NDJSON and CSV scan data should be the same."""
+        (app.root/"a.md").write_text("# 0 A\n\n#tag [B](#1)\n\n# 1 B\n\nB.\n")
+        (app.root/"b.md").write_text("# 1 C\n\nC.\n")
+        batch = Batch(".md", [app.root/"a.md", app.root/"b.md"])
+
+        results = {}
+        for scan_format in ("csv", "ndjson"):
+            app.config.scan_format = scan_format
+            with temporary_directory() as tempdir:
+                assert scan_batch(app, batch, tempdir)
+                assert (tempdir/"scan.ndjson").exists() == \
+                    (scan_format == "ndjson")
+                results[scan_format] = read_scan_result(tempdir)
+
+        csv, ndjson = results["csv"], results["ndjson"]
+        for name, rows in csv.tables.items():
+            assert sorted(rows) == sorted(ndjson.tables[name])
+        assert csv.sections == ndjson.sections
+        assert csv.messages == ndjson.messages
+        assert ndjson.messages[0]["name"] == "duplicate-note-id"
+
+    def test_scan_line_separators(self, app: App) -> None:
+        """Line separators in titles and sections should survive scans."""
+        (app.root/"a.md").write_text(
+            "# 0 A\u2028B\u0085C\n\nD\u2028E\u0085F\n",
+            encoding="utf-8",
+        )
+        batch = Batch(".md", [app.root/"a.md"])
+        with temporary_directory() as tempdir:
+            assert scan_batch(app, batch, tempdir)
+            result = read_scan_result(tempdir)
+
+        assert [row[1] for row in result.tables["notes"]] == \
+            ["A\u2028B\u0085C"]
+        assert "D\u2028E\u0085F" in result.sections[0]
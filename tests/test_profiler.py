@@ -0,0 +1,65 @@
+"""Test profiler.py."""
+
+import io
+from pathlib import Path
+import pstats
+import time
+
+import pytest
+from slipbox.profiler import profile_call
+
+
+def busy_wait(seconds: float) -> int:
+    """Keep CPU busy for some time."""
+    deadline = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < deadline:
+        count += 1
+    return count
+
+
+def test_profile_call(tmp_path: Path) -> None:
+    """profile_call should save stats and collapsed stacks."""
+    path = tmp_path/"out.pstats"
+    result = profile_call(lambda: busy_wait(0.1), path, 0.001)
+    assert result > 0
+
+    stream = io.StringIO()
+    pstats.Stats(str(path), stream=stream).print_stats()
+    assert "(busy_wait)" in stream.getvalue()
+
+    lines = (tmp_path/"out.pstats.folded").read_text().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("MainThread;")
+        assert int(count) > 0
+    assert any("busy_wait (" in line for line in lines)
+
+
+def test_profile_call_saves_on_exit(tmp_path: Path) -> None:
+    """Results should get saved even if the command exits."""
+    def command() -> None:
+        raise SystemExit(1)
+
+    path = tmp_path/"out.pstats"
+    with pytest.raises(SystemExit):
+        profile_call(command, path)
+    assert path.exists()
+    assert (tmp_path/"out.pstats.folded").exists()
+
+
+def test_profile_call_without_sampling(tmp_path: Path) -> None:
+    """Stacks shouldn't be sampled if the interval is 0."""
+    path = tmp_path/"out.pstats"
+    assert profile_call(lambda: busy_wait(0.01), path, 0) > 0
+    assert path.exists()
+    assert not (tmp_path/"out.pstats.folded").exists()
+
+
+@pytest.mark.parametrize("name", ["out", "out.v2.pstats", "out.folded"])
+def test_profile_call_folded_path(tmp_path: Path, name: str) -> None:
+    """Collapsed stacks should be saved in PATH.folded."""
+    profile_call(lambda: None, tmp_path/name)
+    assert (tmp_path/name).exists()
+    assert (tmp_path/f"{name}.folded").exists()
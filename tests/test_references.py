@@ -0,0 +1,125 @@
+"""Test references.py."""
+
+from pathlib import Path
+import typing as t
+
+import pytest
+
+from slipbox.app import App, startup
+from slipbox.build import build
+from slipbox.dependencies import check_requirements
+from slipbox.references import find_reference_changes
+
+
+FOO = """@book{foo2020,
+    title = {Foo},
+    author = {Foo},
+    year = {2020},
+}
+"""
+
+BAR = """@book{bar2020,
+    title = {Bar},
+    author = {Bar},
+    year = {2020},
+}
+"""
+
+BAZ = """@book{baz2020,
+    title = {Baz},
+    author = {Baz},
+    year = {2020},
+}
+"""
+
+
+def scan(app: App) -> None:
+    """Run 'slipbox build --no-output'."""
+    app.args["output"] = False
+    build(app)
+
+
+def bibliography(app: App) -> t.Dict[str, str]:
+    """Return Bibliography table as a dict."""
+    sql = "SELECT key, html FROM Bibliography"
+    return dict(app.database.execute(sql))
+
+
+@pytest.fixture
+def bib_app(app: App) -> t.Iterable[App]:
+    """App with a bibliography and notes that cite its entries."""
+    (app.root/"test.bib").write_text(FOO + BAR)
+    app.config.bibliography = Path("test.bib")   # type: ignore
+    (app.root/"a.md").write_text("# 0 A\n\nA [@foo2020].\n")
+    (app.root/"b.md").write_text("# 1 B\n\nB [@bar2020].\n")
+    (app.root/"c.md").write_text("# 2 C\n\nC [@baz2020].\n")
+    yield app
+
+
+@pytest.mark.skipif(
+    not check_requirements(startup({})),
+    reason="missing requirements",
+)
+class TestsWithRequirements:
+    """Tests with external requirements (e.g. pandoc, graphviz, etc.)."""
+    def test_unchanged(self, bib_app: App) -> None:
+        """There shouldn't be changes if the files didn't change."""
+        scan(bib_app)
+        assert find_reference_changes(bib_app) is None
+
+    def test_edited_entry(self, bib_app: App) -> None:
+        """Only notes that cite edited entries should be re-rendered."""
+        app = bib_app
+        scan(app)
+        assert "Foo" in bibliography(app)["ref-foo2020"]
+
+        (app.root/"test.bib").write_text(FOO.replace("{Foo}", "{Qux}") + BAR)
+        changes = find_reference_changes(app)
+        assert changes is not None
+        assert changes.filenames == {"a.md"}
+        assert changes.keys == {"foo2020"}
+
+        scan(app)
+        assert "Qux" in bibliography(app)["ref-foo2020"]
+        assert "Bar" in bibliography(app)["ref-bar2020"]
+
+    def test_added_entry(self, bib_app: App) -> None:
+        """Notes that cite new entries should be re-rendered."""
+        app = bib_app
+        scan(app)
+        sql = "SELECT note, reference FROM Citations ORDER BY note"
+        assert list(app.database.execute(sql)) == \
+            [(0, "ref-foo2020"), (1, "ref-bar2020")]
+
+        (app.root/"test.bib").write_text(FOO + BAR + BAZ)
+        changes = find_reference_changes(app)
+        assert changes is not None
+        assert changes.filenames == {"c.md"}
+
+        scan(app)
+        assert list(app.database.execute(sql)) == \
+            [(0, "ref-foo2020"), (1, "ref-bar2020"), (2, "ref-baz2020")]
+        assert "Baz" in bibliography(app)["ref-baz2020"]
+
+    def test_removed_entry(self, bib_app: App) -> None:
+        """Removed entries should be deleted from the database."""
+        app = bib_app
+        scan(app)
+        (app.root/"test.bib").write_text(FOO)
+        scan(app)
+        assert sorted(bibliography(app)) == ["ref-foo2020"]
+
+    def test_changed_csl(self, bib_app: App) -> None:
+        """All notes with citations should be re-rendered if the CSL file
+        changes.
+        """
+        app = bib_app
+        scan(app)
+        csl = Path(__file__).parents[1]/"slipbox"/"data"/"default.csl"
+        (app.root/"test.csl").write_bytes(csl.read_bytes() + b"\n")
+        app.config.csl = Path("test.csl")   # type: ignore
+
+        changes = find_reference_changes(app)
+        assert changes is not None
+        assert changes.filenames == {"a.md", "b.md"}
+        assert changes.keys is None
@@ -0,0 +1,124 @@
+"""Test serve.py."""
+
+from http.server import ThreadingHTTPServer
+from sqlite3 import connect
+from threading import Thread
+import typing as t
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from slipbox.app import App, startup
+from slipbox.build import process_notes
+from slipbox.database import migrate
+from slipbox.dependencies import check_requirements
+from slipbox.objects import objects_directory, store_object
+from slipbox.serve import (
+    Site, find_static_file, inject_reload_script, make_handler, render_site,
+)
+
+
+@pytest.fixture
+def site() -> Site:
+    """Site with an index page."""
+    site = Site()
+    site.update({"index.html": b"<html>index</html>"})
+    return site
+
+
+@pytest.fixture
+def server(app: App, site: Site) -> ThreadingHTTPServer:
+    """Preview server (see server_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(app, site))
+    server.daemon_threads = True
+    return server
+
+
+def get(url: str) -> bytes:
+    """Return response body."""
+    with urlopen(url, timeout=5) as response:
+        return t.cast(bytes, response.read())
+
+
+def test_inject_reload_script() -> None:
+    """Reload script should be inserted before the end of the body."""
+    html = inject_reload_script("<html><body>hi</body></html>")
+    assert html.startswith("<html><body>hi<script>")
+    assert html.endswith("</script>\n</body></html>")
+
+
+def test_find_static_file() -> None:
+    """Static files outside of the data directories should be hidden."""
+    assert find_static_file("slipbox.css") is not None
+    assert find_static_file("favicon.ico") is not None
+    assert find_static_file("es5/../../serve.py") is None
+    assert find_static_file("serve.py") is None
+
+
+def test_site_wait(site: Site) -> None:
+    """Site.wait should return the new version after an update."""
+    version = site.version
+    assert site.wait(version, 0.01) == version
+
+    thread = Thread(target=site.update, args=({},))
+    thread.start()
+    assert site.wait(version, 5) == version + 1
+    thread.join()
+
+
+def test_serve_from_memory(server_url: str, site: Site) -> None:
+    """Generated files should be served from memory."""
+    assert get(server_url) == b"<html>index</html>"
+    site.update({"index.html": b"<html>updated</html>"})
+    assert get(server_url + "/index.html") == b"<html>updated</html>"
+    with urlopen(server_url + "/slipbox.css", timeout=5) as response:
+        assert response.status == 200
+
+    with pytest.raises(HTTPError) as exc:
+        get(server_url + "/missing.html")
+    assert exc.value.code == 404
+
+
+@pytest.mark.parametrize("filename", [
+    "images/a.png",
+    "a.png",
+    "sub/a.png",
+])
+def test_serve_images_from_object_store(app: App,
+                                        server_url: str,
+                                        filename: str) -> None:
+    """Images should be read from the object store, wherever they are."""
+    app.database = connect(app.root/".slipbox"/"data.db")
+    migrate(app.database)
+    (app.root/"a.png").write_bytes(b"png")
+    digest = store_object(objects_directory(app.root), app.root/"a.png")
+    app.database.execute(
+        "INSERT INTO Images (filename, hash) VALUES (?, ?)",
+        (filename, digest),
+    )
+    app.database.commit()
+    assert get(f"{server_url}/{filename}") == b"png"
+
+
+def test_reload_event(server_url: str, site: Site) -> None:
+    """Clients should get a reload event when the site gets updated."""
+    with urlopen(server_url + "/__reload", timeout=5) as response:
+        site.update({})
+        assert response.readline() == b"data: reload\n"
+
+
+@pytest.mark.skipif(
+    not check_requirements(startup({})),
+    reason="missing requirements",
+)
+def test_render_site(app: App) -> None:
+    """Index and graph data should be generated in memory."""
+    (app.root/"a.md").write_text("# 0 Foo\n\nFoo.\n")
+    process_notes(app, [app.root/"a.md"])
+    files = render_site(app)
+    assert b"Foo" in files["index.html"]
+    assert b"/__reload" in files["index.html"]
+    assert "graph/notes.json" in files
+    assert "graph/note/0.json" in files
+    assert not (app.root/app.config.output_directory).exists()
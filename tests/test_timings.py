@@ -0,0 +1,49 @@
+"""Test timings.py."""
+
+import json
+from pathlib import Path
+
+from slipbox.timings import Timer
+
+
+def test_timer_accumulates_phases() -> None:
+    """Repeated phases should add up calls and time."""
+    timer = Timer()
+    for _ in range(3):
+        with timer.phase("a"):
+            sum(range(1000))
+    with timer.phase("b"):
+        pass
+
+    phases = timer.to_dict()
+    assert list(phases) == ["a", "b"]
+    assert phases["a"]["calls"] == 3
+    assert phases["b"]["calls"] == 1
+    assert phases["a"]["wall"] > 0
+    assert phases["a"]["cpu"] >= 0
+
+
+def test_timer_records_failed_phase() -> None:
+    """Phases that raise an exception should still get recorded."""
+    timer = Timer()
+    try:
+        with timer.phase("a"):
+            raise ValueError
+    except ValueError:
+        pass
+    assert timer.to_dict()["a"]["calls"] == 1
+
+
+def test_timer_format_and_save(tmp_path: Path) -> None:
+    """Formatted table and saved JSON should contain every phase."""
+    timer = Timer()
+    with timer.phase("pandoc"):
+        pass
+
+    lines = timer.format().splitlines()
+    assert lines[0].split() == ["phase", "calls", "wall", "(s)", "cpu", "(s)"]
+    assert lines[1].split()[:2] == ["pandoc", "1"]
+
+    path = tmp_path/"timings.json"
+    timer.save(path)
+    assert json.loads(path.read_text()) == timer.to_dict()
@@ -0,0 +1,213 @@
+"""Test watch.py."""
+
+import os
+from pathlib import Path
+import sys
+import typing as t
+
+import pytest
+
+from slipbox.app import App, startup
+from slipbox.build import build, DatabaseUpdate
+from slipbox.database import decode_html
+from slipbox.dependencies import check_requirements
+from slipbox.objects import objects_directory
+from slipbox.utils import file_stat
+from slipbox.watch import (
+    find_changed_notes, InotifyWatcher, PollingWatcher, is_ignored, rebuild,
+    take_snapshot, update_output, wait_for_burst,
+)
+
+
+class FakeWatcher:
+    """Watcher that replays a list of changes."""
+    def __init__(self, changes: t.List[t.Set[Path]]):
+        self.changes = changes
+        self.timeouts: t.List[t.Optional[float]] = []
+
+    def wait(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+        """Return next set of changes."""
+        self.timeouts.append(timeout)
+        return self.changes.pop(0) if self.changes else set()
+
+    def close(self) -> None:
+        """Do nothing."""
+
+
+def test_wait_for_burst_collects_changes() -> None:
+    """Changes should be collected until the watcher times out."""
+    watcher = FakeWatcher([{Path("a")}, {Path("b")}, {Path("a")}, set()])
+    assert wait_for_burst(watcher, 0.5) == {Path("a"), Path("b")}
+    assert watcher.timeouts == [None, 0.5, 0.5, 0.5]
+
+
+def test_is_ignored(tmp_path: Path) -> None:
+    """Paths inside ignored directories should be ignored."""
+    directories = [tmp_path/".slipbox", tmp_path/"public"]
+    assert is_ignored(tmp_path/".slipbox", directories)
+    assert is_ignored(tmp_path/"public"/"graph"/"notes.json", directories)
+    assert not is_ignored(tmp_path/"publication.md", directories)
+    assert not is_ignored(tmp_path/"notes"/"public.md", directories)
+
+
+def test_polling_watcher(app: App) -> None:
+    """Polling watcher should detect new and modified notes."""
+    note = app.root/"a.md"
+    note.write_text("# 0 A\n\nA.\n")
+    watcher = PollingWatcher(lambda: take_snapshot(app), 0.01)
+    assert not watcher.wait(0.05)
+
+    stat = file_stat(note)
+    assert stat.mtime_ns is not None
+    os.utime(note, ns=(stat.mtime_ns + 10**9, stat.mtime_ns + 10**9))
+    assert watcher.wait(1) == {note}
+
+    (app.root/"b.md").write_text("# 1 B\n\nB.\n")
+    (app.root/"b.txt").write_text("B.")
+    assert watcher.wait(1) == {app.root/"b.md"}
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"),
+    reason="inotify is only available on Linux",
+)
+def test_inotify_watcher(tmp_path: Path) -> None:
+    """Inotify watcher should detect changes in new subdirectories and
+    skip ignored directories.
+    """
+    (tmp_path/"ignored").mkdir()
+    watcher = InotifyWatcher(tmp_path, lambda p: p.name == "ignored")
+    try:
+        assert not watcher.wait(0.01)
+
+        (tmp_path/"ignored"/"a.md").write_text("A")
+        assert not watcher.wait(0.05)
+
+        (tmp_path/"sub").mkdir()
+        assert watcher.wait(1) == {tmp_path/"sub"}
+
+        (tmp_path/"sub"/"b.md").write_text("B")
+        assert tmp_path/"sub"/"b.md" in wait_for_burst(watcher, 0.05)
+    finally:
+        watcher.close()
+
+
+def test_find_changed_notes(app: App, note_a: Path) -> None:
+    """Only existing notes should be found, unless a directory changed."""
+    (app.root/"a.txt").write_text("A", encoding="utf-8")
+    deleted = app.root/"b.md"
+    assert find_changed_notes(
+        app,
+        {note_a, app.root/"a.txt", deleted},
+    ) == [note_a]
+
+    (app.root/"sub").mkdir()
+    assert find_changed_notes(app, {app.root/"sub"}) is None
+    assert find_changed_notes(app, {app.root}) is None
+
+    app.database.execute(
+        "INSERT INTO Files (filename) VALUES (?)",
+        (str(Path("old", "c.md")),),
+    )
+    assert find_changed_notes(app, {app.root/"old"}) is None
+
+    app.config.bibliography = Path("refs.bib")  # type: ignore
+    (app.root/"refs.bib").touch()
+    assert find_changed_notes(app, {app.root/"refs.bib"}) is None
+
+
+@pytest.mark.skipif(
+    not check_requirements(startup({})),
+    reason="missing requirements",
+)
+class TestsWithRequirements:
+    """Tests with external requirements (e.g. pandoc, graphviz, etc.)."""
+    def test_rebuild_updates_site_in_place(self,
+                                           app: App,
+                                           note_a: Path) -> None:
+        """Rebuild should regenerate the index but not static assets."""
+        public = app.root/app.config.output_directory
+        build(app)
+        assert sorted(path.name for path in app.root.iterdir()) == \
+            [".slipbox", "a.md", "public"]
+
+        css = file_stat(public/"slipbox.css")
+        index = file_stat(public/"index.html")
+
+        assert rebuild(app, lambda u: update_output(app, u))
+        assert file_stat(public/"index.html") == index
+
+        note_a.write_text("# 0 Bar\n\nBar.\n", encoding="utf-8")
+        assert rebuild(app, lambda u: update_output(app, u))
+        assert "Bar" in (public/"index.html").read_text(encoding="utf-8")
+        assert (public/"graph"/"note"/"0.json").exists()
+        assert file_stat(public/"slipbox.css") == css
+
+    def test_rebuild_prunes_objects(self, app: App, note_a: Path) -> None:
+        """Images that are no longer used should be deleted from the object
+        store after each rebuild.
+        """
+        app.args["output"] = False
+        (app.root/"a.png").write_bytes(b"png")
+        note_a.write_text("# 0 Foo\n\n![A](a.png)\n", encoding="utf-8")
+        assert rebuild(app, lambda _: None)
+        objects = objects_directory(app.root)
+        assert len(list(objects.iterdir())) == 1
+
+        note_a.write_text("# 0 Foo\n\nFoo.\n", encoding="utf-8")
+        assert rebuild(app, lambda _: None, {note_a})
+        assert not list(objects.iterdir())
+
+    @pytest.mark.usefixtures("note_a")
+    def test_rebuild_without_output(self, app: App) -> None:
+        """--no-output should only update the database."""
+        app.args["output"] = False
+        assert rebuild(app, lambda u: update_output(app, u))
+        sql = "SELECT title FROM Notes"
+        assert list(app.database.execute(sql)) == [("Foo",)]
+        assert not (app.root/app.config.output_directory).exists()
+
+    def test_rebuild_changed_notes(self, app: App, note_a: Path) -> None:
+        """Only changed notes should get rescanned."""
+        app.args["output"] = False
+        note_b = app.root/"b.md"
+        note_b.write_text("# 1 Bar\n\nBar.\n", encoding="utf-8")
+        assert rebuild(app, lambda _: None)
+
+        note_a.write_text("# 0 Baz\n\nBaz.\n", encoding="utf-8")
+        note_b.write_text("# 1 Qux\n\nQux.\n", encoding="utf-8")
+        assert rebuild(app, lambda _: None, {note_a})
+        sql = "SELECT title FROM Notes ORDER BY id"
+        assert list(app.database.execute(sql)) == [("Baz",), ("Bar",)]
+
+        note_a.unlink()
+        updates: t.List[DatabaseUpdate] = []
+        assert rebuild(app, updates.append, {note_a, note_b})
+        assert list(app.database.execute(sql)) == [("Qux",)]
+        assert sorted(updates[0].deleted) == ["a.md", "b.md"]
+
+    def test_rebuild_changed_bibliography(self, app: App) -> None:
+        """Notes that cite the bibliography should get rescanned when only
+        the bibliography changes.
+        """
+        app.args["output"] = False
+        bibliography = app.root/"refs.bib"
+        bibliography.write_text(
+            "@book{foo2020,\n  title = {Foo},\n  year = {2020},\n}\n",
+            encoding="utf-8",
+        )
+        app.config.bibliography = Path("refs.bib")  # type: ignore
+        (app.root/"a.md").write_text("# 0 A\n\n[@foo2020]\n",
+                                     encoding="utf-8")
+        assert rebuild(app, lambda _: None)
+
+        bibliography.write_text(
+            "@book{foo2020,\n  title = {Bar},\n  year = {2020},\n}\n",
+            encoding="utf-8",
+        )
+        assert rebuild(app, lambda _: None, {bibliography})
+        sql = "SELECT id, filename FROM Notes"
+        assert list(app.database.execute(sql)) == [(0, "a.md")]
+        sql = "SELECT html FROM Bibliography WHERE key = 'ref-foo2020'"
+        html, = app.database.execute(sql).fetchone()
+        assert "Bar" in str(decode_html(html))